@@ -14,4 +14,101 @@ AUTH_SECRET = os.environ.get("AUTH_SECRET", "dev-secret-change-me")
 if not MONGO_URL:
     raise RuntimeError("MONGO_URL is not set in backend/.env")
 if not DB_NAME:
-    raise RuntimeError("DB_NAME is not set in backend/.env")
\ No newline at end of file
+    raise RuntimeError("DB_NAME is not set in backend/.env")
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# LLM response cache (in-process LRU + Mongo tier)
+LLM_CACHE_ENABLED = _env_bool("LLM_CACHE_ENABLED", True)
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_SECONDS", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "256"))
+
+# Background jobs (Mongo-backed queue)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))  # in-process workers; 0 to run them separately
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+
+# Per-provider/model LLM limits. LLM_LIMITS is JSON keyed by "provider/model" or
+# "provider", e.g. {"openai": {"concurrency": 8, "rpm": 500, "tpm": 200000}}
+LLM_DEFAULT_CONCURRENCY = int(os.environ.get("LLM_DEFAULT_CONCURRENCY", "4"))
+LLM_DEFAULT_RPM = int(os.environ.get("LLM_DEFAULT_RPM", "60"))
+LLM_DEFAULT_TPM = int(os.environ.get("LLM_DEFAULT_TPM", "100000"))
+LLM_LIMITS = os.environ.get("LLM_LIMITS", "")
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+
+# Per-provider/model circuit breaker
+LLM_BREAKER_WINDOW = int(os.environ.get("LLM_BREAKER_WINDOW", "20"))  # most recent calls considered
+LLM_BREAKER_MIN_CALLS = int(os.environ.get("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_FAILURE_RATE = float(os.environ.get("LLM_BREAKER_FAILURE_RATE", "0.5"))
+LLM_BREAKER_SLOW_SECONDS = float(os.environ.get("LLM_BREAKER_SLOW_SECONDS", "45"))
+LLM_BREAKER_OPEN_SECONDS = float(os.environ.get("LLM_BREAKER_OPEN_SECONDS", "30"))
+LLM_BREAKER_ALTERNATE = _env_bool("LLM_BREAKER_ALTERNATE", True)  # try the other provider before the stub
+
+# Hedged LLM requests: after the primary's latency percentile, race the alternate provider
+LLM_HEDGE_ENABLED = _env_bool("LLM_HEDGE_ENABLED", False)
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))  # below this use the default delay
+LLM_HEDGE_DEFAULT_DELAY = float(os.environ.get("LLM_HEDGE_DEFAULT_DELAY", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", "2"))
+LLM_HEDGE_MAX_RATE = float(os.environ.get("LLM_HEDGE_MAX_RATE", "0.1"))  # share of recent requests allowed to hedge
+
+# Chat context sent with generation prompts (estimated tokens)
+LLM_CONTEXT_TOKENS = int(os.environ.get("LLM_CONTEXT_TOKENS", "1500"))  # summary + recent messages
+LLM_CONTEXT_MESSAGE_TOKENS = int(os.environ.get("LLM_CONTEXT_MESSAGE_TOKENS", "500"))  # cap per message
+LLM_CONTEXT_SUMMARY_TOKENS = int(os.environ.get("LLM_CONTEXT_SUMMARY_TOKENS", "300"))
+
+# Manifest-then-files generation pipeline
+LLM_PIPELINE_CONCURRENCY = int(os.environ.get("LLM_PIPELINE_CONCURRENCY", "4"))  # files generated at once
+LLM_PIPELINE_MAX_FILES = int(os.environ.get("LLM_PIPELINE_MAX_FILES", "8"))
+LLM_PIPELINE_FILE_RETRIES = int(os.environ.get("LLM_PIPELINE_FILE_RETRIES", "2"))
+
+# LLM backend: "emergent" (real providers) or "mock" (local, see app/llm/mock.py)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "emergent").strip().lower()
+LLM_MOCK_PROFILE = os.environ.get("LLM_MOCK_PROFILE", "realistic")  # preset name or JSON overrides
+
+# Record/replay of LLM calls (see app/llm/cassette.py)
+LLM_CASSETTE_MODE = os.environ.get("LLM_CASSETTE_MODE", "off").strip().lower()  # off | record | replay
+LLM_CASSETTE_PATH = os.environ.get("LLM_CASSETTE_PATH", str(ROOT_BACKEND / "cassettes" / "llm.jsonl.gz"))
+LLM_CASSETTE_SPEED = float(os.environ.get("LLM_CASSETTE_SPEED", "1.0"))  # replay time scale; 0 = no delays
+LLM_CASSETTE_MATCH = os.environ.get("LLM_CASSETTE_MATCH", "exact").strip().lower()  # exact | sequential
+
+# Pool of configured LLM sessions per project/provider/model (see app/llm/sessions.py)
+LLM_SESSION_POOL_SIZE = int(os.environ.get("LLM_SESSION_POOL_SIZE", "128"))
+LLM_SESSION_IDLE_SECONDS = float(os.environ.get("LLM_SESSION_IDLE_SECONDS", "900"))  # evict sessions unused this long
+LLM_PROMPT_CACHE_TTL = float(os.environ.get("LLM_PROMPT_CACHE_TTL", "300"))  # how long providers keep a prompt prefix warm
+
+# Speculative planning: start compute_plan when a project is created (see app/projects/speculation.py)
+SPECULATIVE_PLANNING = _env_bool("SPECULATIVE_PLANNING", False)  # default for POST /projects?speculate=
+SPECULATIVE_PLAN_PROVIDER = os.environ.get("SPECULATIVE_PLAN_PROVIDER", "auto")  # guess for the scaffold request
+SPECULATIVE_PLAN_CONCURRENCY = int(os.environ.get("SPECULATIVE_PLAN_CONCURRENCY", "4"))  # skip speculation beyond this
+SPECULATIVE_PLAN_TTL = float(os.environ.get("SPECULATIVE_PLAN_TTL", "600"))  # pending plans older than this are not adopted
+
+# POST /projects/scaffold:batch
+SCAFFOLD_BATCH_CONCURRENCY = int(os.environ.get("SCAFFOLD_BATCH_CONCURRENCY", "8"))  # max plans in flight per batch
+SCAFFOLD_BATCH_MAX_ITEMS = int(os.environ.get("SCAFFOLD_BATCH_MAX_ITEMS", "500"))
+SCAFFOLD_BATCH_WRITE_SIZE = int(os.environ.get("SCAFFOLD_BATCH_WRITE_SIZE", "25"))  # results per bulk write
+
+# POST /projects/{id}/compare-providers
+COMPARE_MAX_VARIANTS = int(os.environ.get("COMPARE_MAX_VARIANTS", "8"))  # LLM calls one request may fan out to
+COMPARE_MAX_TIMEOUT_S = float(os.environ.get("COMPARE_MAX_TIMEOUT_S", "300"))  # upper bound for timeout_s
+
+# Schema migrations and index bootstrap at startup (see app/core/migrations.py)
+DB_MIGRATE_ON_STARTUP = _env_bool("DB_MIGRATE_ON_STARTUP", True)
+DB_EXPLAIN_ON_STARTUP = _env_bool("DB_EXPLAIN_ON_STARTUP", False)  # log the plan of each hot query
+
+# Write path (see app/core/uow.py and the round-trip middleware in server.py)
+DB_TRANSACTIONS = os.environ.get("DB_TRANSACTIONS", "auto").strip().lower()  # auto | on | off
+DB_ROUND_TRIP_BUDGET = int(os.environ.get("DB_ROUND_TRIP_BUDGET", "0"))  # warn when a request exceeds this (0: off)
+
+# Write-behind buffer for run history and telemetry (see app/core/writebehind.py)
+WRITE_BEHIND_ENABLED = _env_bool("WRITE_BEHIND_ENABLED", True)  # off: insert in the request path
+WRITE_BEHIND_MAX_ITEMS = int(os.environ.get("WRITE_BEHIND_MAX_ITEMS", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "100"))  # documents per insert_many
+WRITE_BEHIND_INTERVAL = float(os.environ.get("WRITE_BEHIND_INTERVAL", "0.5"))  # max seconds a document waits for a batch
+WRITE_BEHIND_BLOCK_SECONDS = float(os.environ.get("WRITE_BEHIND_BLOCK_SECONDS", "1.0"))  # wait for room when full, then drop (0: drop at once)
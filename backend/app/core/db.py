@@ -1,8 +1,80 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
 from .config import MONGO_URL, DB_NAME
 
+
+class RoundTrips:
+    """Commands sent to the server on behalf of one request, by command name."""
+
+    def __init__(self) -> None:
+        self.by_command: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, command: str) -> None:
+        # Motor runs commands on executor threads
+        with self._lock:
+            self.by_command[command] = self.by_command.get(command, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.by_command.values())
+
+
+_round_trips: ContextVar[Optional[RoundTrips]] = ContextVar("db_round_trips", default=None)
+
+
+class _RoundTripListener(monitoring.CommandListener):
+    # Motor copies the caller's context onto the executor thread, so the
+    # counter of the request that issued the command is visible here
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        trips = _round_trips.get()
+        if trips is not None:
+            trips.add(event.command_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+@contextmanager
+def count_round_trips() -> Iterator[RoundTrips]:
+    """Count the database commands issued inside the block (including in tasks it starts)."""
+    trips = RoundTrips()
+    token = _round_trips.set(trips)
+    try:
+        yield trips
+    finally:
+        _round_trips.reset(token)
+
+
+# Per-route totals since startup, for /api/health/db
+_route_round_trips: Dict[str, Dict[str, int]] = {}
+
+
+def note_route_round_trips(route: str, trips: int) -> None:
+    stats = _route_round_trips.setdefault(route, {"requests": 0, "round_trips": 0, "max": 0})
+    stats["requests"] += 1
+    stats["round_trips"] += trips
+    stats["max"] = max(stats["max"], trips)
+
+
+def round_trip_stats() -> Dict[str, Any]:
+    return {
+        route: {**s, "mean": round(s["round_trips"] / s["requests"], 2)}
+        for route, s in sorted(_route_round_trips.items())
+    }
+
+
 # Create a single global client and db for the app lifecycle
-client = AsyncIOMotorClient(MONGO_URL)
+client = AsyncIOMotorClient(MONGO_URL, event_listeners=[_RoundTripListener()])
 db = client[DB_NAME]
 
 def init_db_client():
@@ -13,4 +85,4 @@ def close_db_client():
     try:
         client.close()
     except Exception:
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,209 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from pymongo import ASCENDING, DESCENDING
+
+from .db import db
+
+logger = logging.getLogger("webmatic")
+
+# Applied steps are recorded in db.migrations as {_id: version, name, applied_at, duration_s}.
+# Steps must be idempotent: two processes starting together may both run a pending step.
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Any], Awaitable[None]]
+
+
+async def _users_email_unique(database) -> None:
+    # Login and registration look users up by email
+    await database.users.create_index([("email", ASCENDING)], unique=True, name="email_unique")
+
+
+async def _runs_by_project(database) -> None:
+    # list_runs: find({"project_id"}).sort("created_at", -1)
+    await database.runs.create_index([("project_id", ASCENDING), ("created_at", DESCENDING)], name="project_created")
+
+
+async def _projects_by_created(database) -> None:
+    # list_projects: find().sort("created_at", -1)
+    await database.projects.create_index([("created_at", DESCENDING)], name="created_at")
+
+
+async def _projects_keyset(database) -> None:
+    # list_projects pages on (created_at, _id); this index also serves the plain created_at sort
+    await database.projects.create_index([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_id")
+    if "created_at" in await database.projects.index_information():
+        await database.projects.drop_index("created_at")
+
+
+async def _jobs_claim(database) -> None:
+    # claim_job: runnable jobs oldest first
+    await database.jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created")
+
+
+async def _llm_cache_ttl(database) -> None:
+    # Let MongoDB delete expired cache entries instead of keeping them forever
+    await database.llm_cache.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl")
+
+
+async def _artifact_versions_by_project(database) -> None:
+    await database.artifact_versions.create_index(
+        [("project_id", ASCENDING), ("created_at", DESCENDING)], name="project_created",
+    )
+
+
+async def _artifact_versions_by_blob(database) -> None:
+    # delete_unreferenced_blobs looks up versions by the blobs they refer to
+    await database.artifact_versions.create_index([("files.hash", ASCENDING)], name="files_hash")
+    await database.artifact_versions.create_index([("html_preview_hash", ASCENDING)], name="html_preview_hash", sparse=True)
+
+
+async def _externalize_artifacts(database) -> None:
+    # Projects generated before the artifact store carry their bodies inline
+    from ..projects.artifacts import externalize_inline_artifacts
+
+    legacy = database.projects.find({"artifacts": {"$type": "object"}, "artifacts.version_id": {"$exists": False}})
+    async for doc in legacy:
+        await externalize_inline_artifacts(doc)
+
+
+async def _chat_messages_by_seq(database) -> None:
+    await database.chat_messages.create_index([("project_id", ASCENDING), ("seq", ASCENDING)], unique=True, name="project_seq")
+
+
+async def _split_chat_documents(database) -> None:
+    # Chats used to keep every message in one growing ``messages`` array
+    from ..projects.chat_store import migrate_embedded_messages
+
+    async for doc in database.chats.find({"messages": {"$exists": True}}):
+        await migrate_embedded_messages(doc)
+
+
+async def _chat_artifact_refs(database) -> None:
+    # Assistant messages used to embed the full artifacts of their generation
+    from ..projects.chat_store import externalize_message_artifacts
+
+    async for doc in database.chat_messages.find({"artifacts": {"$exists": True}}):
+        await externalize_message_artifacts(doc)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "users_email_unique", _users_email_unique),
+    Migration(2, "runs_project_created", _runs_by_project),
+    Migration(3, "projects_created_at", _projects_by_created),
+    Migration(4, "jobs_status_created", _jobs_claim),
+    Migration(5, "llm_cache_ttl", _llm_cache_ttl),
+    Migration(6, "projects_created_id", _projects_keyset),
+    Migration(7, "artifact_versions_project_created", _artifact_versions_by_project),
+    Migration(8, "externalize_project_artifacts", _externalize_artifacts),
+    Migration(9, "chat_messages_project_seq", _chat_messages_by_seq),
+    Migration(10, "split_chat_documents", _split_chat_documents),
+    Migration(11, "chat_artifact_refs", _chat_artifact_refs),
+    Migration(12, "artifact_versions_blob_hashes", _artifact_versions_by_blob),
+]
+
+
+async def run_migrations(database=db, migrations: Optional[List[Migration]] = None) -> List[Dict[str, Any]]:
+    """Apply pending migrations in version order; returns the steps applied now.
+
+    Stops at the first failing step (later steps may depend on it) and logs
+    the error instead of raising, so the API still starts; the step is
+    retried on the next startup.
+    """
+    migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda m: m.version)
+    applied = {d["_id"] for d in await database.migrations.find({}, {"_id": 1}).to_list(None)}
+    done: List[Dict[str, Any]] = []
+    for migration in migrations:
+        if migration.version in applied:
+            continue
+        started = time.monotonic()
+        try:
+            await migration.apply(database)
+        except Exception as e:
+            logger.error(f"Migration {migration.version} ({migration.name}) failed: {e}")
+            break
+        record = {
+            "_id": migration.version,
+            "name": migration.name,
+            "applied_at": datetime.utcnow(),
+            "duration_s": round(time.monotonic() - started, 3),
+        }
+        await database.migrations.replace_one({"_id": migration.version}, record, upsert=True)
+        logger.info(f"Applied migration {migration.version} ({migration.name}) in {record['duration_s']}s")
+        done.append(record)
+    return done
+
+
+async def migration_status(database=db) -> Dict[str, Any]:
+    applied = await database.migrations.find().sort("_id", 1).to_list(None)
+    versions = {d["_id"] for d in applied}
+    return {
+        "applied": applied,
+        "pending": [{"version": m.version, "name": m.name} for m in MIGRATIONS if m.version not in versions],
+    }
+
+
+# The queries behind the hot endpoints, with representative values
+HOT_QUERIES: List[Dict[str, Any]] = [
+    {"name": "login", "collection": "users", "filter": {"email": "user@example.com"}},
+    {"name": "list_runs", "collection": "runs", "filter": {"project_id": "p"}, "sort": [("created_at", DESCENDING)]},
+    {"name": "list_projects", "collection": "projects", "filter": {}, "sort": [("created_at", DESCENDING), ("_id", DESCENDING)]},
+    {
+        "name": "claim_job", "collection": "jobs",
+        "filter": {"status": "queued", "attempts": {"$lt": 1}}, "sort": [("created_at", ASCENDING)],
+    },
+]
+
+
+def _plan_summary(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Stages (outermost first) and index names of an explain() winning plan."""
+    stages: List[str] = []
+    indexes: List[str] = []
+    nodes = [plan.get("queryPlan", plan)]
+    while nodes:
+        node = nodes.pop(0)
+        if not isinstance(node, dict):
+            continue
+        if node.get("stage"):
+            stages.append(node["stage"])
+        if node.get("indexName"):
+            indexes.append(node["indexName"])
+        if isinstance(node.get("inputStage"), dict):
+            nodes.append(node["inputStage"])
+        nodes.extend(node.get("inputStages") or [])
+    return {"stages": stages, "indexes": indexes, "collection_scan": "COLLSCAN" in stages}
+
+
+async def explain_hot_queries(database=db) -> List[Dict[str, Any]]:
+    """Winning plan of each hot query; ``collection_scan`` flags those not using an index."""
+    report = []
+    for query in HOT_QUERIES:
+        cursor = database[query["collection"]].find(query["filter"]).limit(50)
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        entry: Dict[str, Any] = {"name": query["name"], "collection": query["collection"]}
+        try:
+            explained = await cursor.explain()
+            entry.update(_plan_summary((explained.get("queryPlanner") or {}).get("winningPlan") or {}))
+            stats = explained.get("executionStats") or {}
+            if stats:
+                entry["docs_examined"] = stats.get("totalDocsExamined")
+        except Exception as e:
+            entry["error"] = str(e)
+        report.append(entry)
+    return report
+
+
+async def log_query_plans(database=db) -> None:
+    for entry in await explain_hot_queries(database):
+        if entry.get("error"):
+            logger.info(f"Could not explain {entry['name']}: {entry['error']}")
+        elif entry["collection_scan"]:
+            logger.warning(f"Hot query {entry['name']} on {entry['collection']} is a collection scan: {entry['stages']}")
+        else:
+            logger.info(f"Hot query {entry['name']} uses {', '.join(entry['indexes']) or entry['stages']}")
@@ -0,0 +1,105 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import DeleteMany, InsertOne, ReturnDocument, UpdateOne
+
+from .config import DB_TRANSACTIONS
+from .db import db
+
+logger = logging.getLogger("webmatic")
+
+_transactions: Optional[bool] = None
+_warned_non_transactional = False
+
+
+async def supports_transactions(database=None) -> bool:
+    """Whether the deployment can run multi-document transactions (replica set or sharded)."""
+    global _transactions
+    if DB_TRANSACTIONS in ("on", "off"):
+        return DB_TRANSACTIONS == "on"
+    if _transactions is None:
+        try:
+            hello = await (database if database is not None else db).command("hello")
+            _transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            logger.info(f"Transaction support check failed, writing without transactions: {e}")
+            _transactions = False
+    return _transactions
+
+
+class UnitOfWork:
+    """Writes for one logical change, applied together in as few round-trips as possible.
+
+    Queue inserts, updates and deletes, plus at most one ``update_returning``
+    whose post-image ``commit`` returns, so callers never re-read what they
+    just wrote. Writes are applied in the order queued (the
+    ``find_one_and_update`` included), with consecutive writes to the same
+    collection sent as one ordered ``bulk_write``. Where the server supports
+    transactions a unit of more than one operation commits atomically in one
+    transaction; otherwise (a standalone server) the writes are applied one
+    after another with no atomicity: a failure part-way leaves the earlier
+    writes in place.
+    """
+
+    def __init__(self, database=None) -> None:
+        self.database = database if database is not None else db
+        # In the order queued: (collection, [ops]) runs for bulk_write, or
+        # (collection, (filter, update, upsert, projection)) for update_returning
+        self._steps: List[Tuple[str, Any]] = []
+        self._returning = False
+        self._ops = 0
+
+    def _queue(self, collection: str, op: Any) -> "UnitOfWork":
+        self._ops += 1
+        if self._steps and self._steps[-1][0] == collection and isinstance(self._steps[-1][1], list):
+            self._steps[-1][1].append(op)
+        else:
+            self._steps.append((collection, [op]))
+        return self
+
+    def insert(self, collection: str, doc: Dict[str, Any]) -> "UnitOfWork":
+        return self._queue(collection, InsertOne(doc))
+
+    def update(self, collection: str, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> "UnitOfWork":
+        return self._queue(collection, UpdateOne(filter, update, upsert=upsert))
+
+    def delete(self, collection: str, filter: Dict[str, Any]) -> "UnitOfWork":
+        return self._queue(collection, DeleteMany(filter))
+
+    def update_returning(self, collection: str, filter: Dict[str, Any], update: Dict[str, Any],
+                         upsert: bool = False, projection: Optional[Dict[str, Any]] = None) -> "UnitOfWork":
+        if self._returning:
+            raise ValueError("A unit of work returns at most one document")
+        self._returning = True
+        self._ops += 1
+        self._steps.append((collection, (filter, update, upsert, projection)))
+        return self
+
+    async def commit(self) -> Optional[Dict[str, Any]]:
+        """Apply the queued writes; returns the ``update_returning`` post-image (None without one)."""
+        if self._ops <= 1:
+            # A single write is atomic on its own; a multi-op bulk_write is not
+            return await self._apply(None)
+        if await supports_transactions(self.database):
+            async with await self.database.client.start_session() as session:
+                return await session.with_transaction(self._apply)
+        global _warned_non_transactional
+        if not _warned_non_transactional:
+            _warned_non_transactional = True
+            logger.warning("MongoDB has no transactions (standalone server); multi-write units of work are applied in order without atomicity")
+        return await self._apply(None)
+
+    async def _apply(self, session) -> Optional[Dict[str, Any]]:
+        # One operation at a time: a session requires it, and without one the
+        # queued order is the only guarantee left
+        post_image = None
+        for collection, step in self._steps:
+            if isinstance(step, list):
+                await self.database[collection].bulk_write(step, ordered=True, session=session)
+                continue
+            filter, update, upsert, projection = step
+            post_image = await self.database[collection].find_one_and_update(
+                filter, update, projection=projection, upsert=upsert,
+                return_document=ReturnDocument.AFTER, session=session,
+            )
+        return post_image
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from .config import (
+    WRITE_BEHIND_BATCH_SIZE,
+    WRITE_BEHIND_BLOCK_SECONDS,
+    WRITE_BEHIND_ENABLED,
+    WRITE_BEHIND_INTERVAL,
+    WRITE_BEHIND_MAX_ITEMS,
+)
+from .db import db
+
+logger = logging.getLogger("webmatic")
+
+
+class WriteBehind:
+    """Bounded in-process buffer of documents to insert off the request path.
+
+    ``put`` queues a document for a collection and returns at once; a
+    background task inserts queued documents with one ``insert_many`` per
+    collection as soon as ``batch_size`` are waiting or ``interval`` seconds
+    after the first one arrived. When the buffer is full ``put`` waits up to
+    ``block_seconds`` for room (backpressure) and then drops the document,
+    counting it. Documents are only for history and telemetry: a crash loses
+    what is still buffered, and readers that need everything written so far
+    (or deleters that must not race a pending insert) call ``flush`` first.
+    Before ``start`` (and after ``close``) ``put`` inserts directly.
+    """
+
+    def __init__(self, max_items: int = WRITE_BEHIND_MAX_ITEMS, batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 interval: float = WRITE_BEHIND_INTERVAL, block_seconds: float = WRITE_BEHIND_BLOCK_SECONDS,
+                 enabled: bool = WRITE_BEHIND_ENABLED, database=None) -> None:
+        self.max_items = max(1, max_items)
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.block_seconds = block_seconds
+        self.enabled = enabled
+        self.database = database
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending = 0  # queued and not yet written (or failed)
+        self.counters = {"queued": 0, "written": 0, "direct": 0, "dropped": 0, "failed": 0, "batches": 0, "blocked": 0}
+
+    def _db(self):
+        return self.database if self.database is not None else db
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_items)
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, collection: str, doc: Dict[str, Any]) -> bool:
+        """Queue ``doc`` for insertion into ``collection``; False when it was dropped."""
+        if self._task is None:
+            self.counters["direct"] += 1
+            await self._db()[collection].insert_one(doc)
+            return True
+        item = (collection, doc)
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.counters["blocked"] += 1
+            try:
+                if self.block_seconds <= 0:
+                    raise asyncio.QueueFull
+                await asyncio.wait_for(self._queue.put(item), self.block_seconds)
+            except (asyncio.TimeoutError, asyncio.QueueFull):
+                self.counters["dropped"] += 1
+                logger.warning(f"Write-behind buffer full ({self.max_items}); dropped a {collection} document")
+                return False
+        self._pending += 1
+        self.counters["queued"] += 1
+        return True
+
+    async def flush(self, timeout: float = 10.0) -> None:
+        """Wait until every document queued so far has been written."""
+        if self._task is None or not self._pending:
+            return
+        done = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self._queue.put(done), timeout)
+            await asyncio.wait_for(done, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Write-behind flush timed out with {self._pending} document(s) pending")
+
+    async def _run(self) -> None:
+        # A None item (queued by close) ends the loop once everything before it
+        # is written; a future (queued by flush) is resolved at that point
+        while True:
+            item = await self._queue.get()
+            batch: List[Tuple[str, Dict[str, Any]]] = []
+            deadline = time.monotonic() + self.interval
+            while True:
+                if item is None or isinstance(item, asyncio.Future):
+                    await self._flush(batch)
+                    if item is None:
+                        return
+                    if not item.done():
+                        item.set_result(None)
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    await self._flush(batch)
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    await self._flush(batch)
+                    break
+
+    async def _flush(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        by_collection: Dict[str, List[Dict[str, Any]]] = {}
+        for collection, doc in batch:
+            by_collection.setdefault(collection, []).append(doc)
+        for collection, docs in by_collection.items():
+            try:
+                await self._db()[collection].insert_many(docs, ordered=False)
+                self.counters["written"] += len(docs)
+            except BulkWriteError as e:
+                failed = len(e.details.get("writeErrors", []))
+                self.counters["written"] += len(docs) - failed
+                self.counters["failed"] += failed
+                logger.warning(f"Write-behind insert into {collection} failed for {failed} of {len(docs)} document(s)")
+            except Exception as e:
+                self.counters["failed"] += len(docs)
+                logger.warning(f"Write-behind insert of {len(docs)} {collection} document(s) failed: {e}")
+            self.counters["batches"] += 1
+        self._pending -= len(batch)
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Write out everything still buffered and stop the flusher; later puts insert directly."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        buffered = self._queue.qsize()
+        try:
+            await asyncio.wait_for(self._queue.put(None), timeout)
+            await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            task.cancel()
+            logger.warning(f"Write-behind drain timed out; up to {self._queue.qsize()} document(s) lost")
+            return
+        if buffered:
+            logger.info(f"Write-behind drained {buffered} document(s) on shutdown")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "running": self._task is not None,
+            "buffered": self._queue.qsize() if self._queue is not None else 0,
+            "max_items": self.max_items,
+        }
+
+
+write_behind = WriteBehind()
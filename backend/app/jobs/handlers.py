@@ -0,0 +1,54 @@
+from typing import Any, Awaitable, Callable, Dict
+from fastapi.encoders import jsonable_encoder
+from ..projects.router import run_scaffold, run_compare, CompareRequest
+from ..projects.router_generate import run_generation
+from ..templates.router import plan_template_project
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+async def _scaffold(payload: Dict[str, Any]) -> Any:
+    project = await run_scaffold(
+        payload["project_id"],
+        payload.get("provider") or "auto",
+        payload.get("model"),
+        payload.get("prompt"),
+        payload.get("use_cache", True),
+    )
+    return jsonable_encoder(project)
+
+
+async def _generate(payload: Dict[str, Any]) -> Any:
+    artifacts = await run_generation(
+        payload["project_id"],
+        payload.get("provider") or "claude",
+        payload.get("user") or {},
+        use_cache=payload.get("use_cache", True),
+        incremental=payload.get("incremental", False),
+        prompt=payload.get("prompt") or "",
+        pipeline=payload.get("pipeline", False),
+    )
+    return jsonable_encoder(artifacts)
+
+
+async def _from_template(payload: Dict[str, Any]) -> Any:
+    project = await plan_template_project(
+        payload["project_id"],
+        payload.get("provider"),
+        payload.get("model"),
+        payload.get("use_cache", True),
+    )
+    return jsonable_encoder(project)
+
+
+async def _compare(payload: Dict[str, Any]) -> Any:
+    result = await run_compare(payload["project_id"], CompareRequest(**(payload.get("request") or {})))
+    return jsonable_encoder(result)
+
+
+HANDLERS: Dict[str, JobHandler] = {
+    "scaffold": _scaffold,
+    "generate": _generate,
+    "from_template": _from_template,
+    "compare": _compare,
+}
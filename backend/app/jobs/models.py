@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import Optional, Any
+from datetime import datetime
+
+class Job(BaseModel):
+    id: str
+    type: str
+    status: str  # queued | running | succeeded | failed
+    attempts: int = 0
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+
+class JobAccepted(BaseModel):
+    job_id: str
+    type: str
+    status: str = "queued"
+    project_id: Optional[str] = None
@@ -0,0 +1,130 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from pymongo import ReturnDocument
+from ..core.config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+from ..core.db import db
+
+# Job documents live in db.jobs:
+#   status: queued -> running -> succeeded | failed (running -> queued on retry)
+#   lease_owner / lease_expires_at: set while a worker holds the job; a job whose
+#   lease has expired (crashed worker) is claimable again.
+
+
+async def enqueue_job(job_type: str, payload: Dict[str, Any], user_id: Optional[str] = None) -> str:
+    """Queue a job; ``user_id`` (the submitter) is the only user allowed to read its status."""
+    now = datetime.utcnow()
+    job_id = str(uuid.uuid4())
+    await db.jobs.insert_one({
+        "_id": job_id,
+        "type": job_type,
+        "payload": payload,
+        "user_id": user_id,
+        "status": "queued",
+        "attempts": 0,
+        "result": None,
+        "error": None,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "created_at": now,
+        "updated_at": now,
+    })
+    return job_id
+
+
+async def claim_job(worker_id: str) -> Optional[Dict[str, Any]]:
+    """Atomically lease the oldest runnable job to ``worker_id``."""
+    now = datetime.utcnow()
+    return await db.jobs.find_one_and_update(
+        {
+            "attempts": {"$lt": JOB_MAX_ATTEMPTS},
+            "$or": [
+                {"status": "queued"},
+                {"status": "running", "lease_expires_at": {"$lt": now}},
+            ],
+        },
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                "heartbeat_at": now,
+                "started_at": now,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def heartbeat_job(job_id: str, worker_id: str) -> bool:
+    """Extend the lease; returns False if the lease was lost to another worker."""
+    now = datetime.utcnow()
+    res = await db.jobs.update_one(
+        {"_id": job_id, "lease_owner": worker_id, "status": "running"},
+        {"$set": {
+            "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+            "heartbeat_at": now,
+            "updated_at": now,
+        }},
+    )
+    return res.matched_count == 1
+
+
+async def complete_job(job_id: str, worker_id: str, result: Any) -> None:
+    now = datetime.utcnow()
+    await db.jobs.update_one(
+        {"_id": job_id, "lease_owner": worker_id},
+        {"$set": {
+            "status": "succeeded",
+            "result": result,
+            "error": None,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "finished_at": now,
+            "updated_at": now,
+        }},
+    )
+
+
+async def fail_job(job_id: str, worker_id: str, error: str, attempts: int, retry: bool = True) -> None:
+    """Requeue the job while attempts remain, otherwise mark it failed."""
+    now = datetime.utcnow()
+    final = not retry or attempts >= JOB_MAX_ATTEMPTS
+    await db.jobs.update_one(
+        {"_id": job_id, "lease_owner": worker_id},
+        {"$set": {
+            "status": "failed" if final else "queued",
+            "error": error,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "finished_at": now if final else None,
+            "updated_at": now,
+        }},
+    )
+
+
+async def fail_abandoned_jobs() -> int:
+    """Mark jobs whose lease expired after their last allowed attempt as failed."""
+    now = datetime.utcnow()
+    res = await db.jobs.update_many(
+        {
+            "status": "running",
+            "lease_expires_at": {"$lt": now},
+            "attempts": {"$gte": JOB_MAX_ATTEMPTS},
+        },
+        {"$set": {
+            "status": "failed",
+            "error": "Worker lease expired",
+            "lease_owner": None,
+            "finished_at": now,
+            "updated_at": now,
+        }},
+    )
+    return res.modified_count
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return await db.jobs.find_one({"_id": job_id})
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Depends
+from ..auth.utils import get_current_user_optional
+from .models import Job
+from .queue import get_job
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}", response_model=Job)
+async def get_job_status(job_id: str, current_user: dict = Depends(get_current_user_optional)):
+    """Job status and result; jobs submitted by a signed-in user are only visible to that user"""
+    d = await get_job(job_id)
+    # Someone else's job looks the same as a missing one
+    owner = d.get("user_id") if d else None
+    if not d or (owner and (not current_user or current_user.get("sub") != owner)):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Job(
+        id=d.get("_id"),
+        type=d.get("type"),
+        status=d.get("status"),
+        attempts=d.get("attempts", 0),
+        result=d.get("result"),
+        error=d.get("error"),
+        created_at=d.get("created_at"),
+        started_at=d.get("started_at"),
+        finished_at=d.get("finished_at"),
+        heartbeat_at=d.get("heartbeat_at"),
+    )
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from ..core.config import JOB_LEASE_SECONDS, JOB_POLL_INTERVAL, JOB_WORKERS
+from .queue import claim_job, complete_job, fail_job, fail_abandoned_jobs, heartbeat_job
+
+logger = logging.getLogger("webmatic")
+
+
+class JobWorker:
+    """Pool of coroutines that lease jobs from db.jobs and run their handlers.
+
+    Runs inside the API process (started from the lifespan handler) or on its
+    own via ``python -m app.jobs.worker``. A job keeps its lease alive with a
+    heartbeat while the handler runs; if the process dies the lease expires
+    and another worker picks the job up again.
+    """
+
+    def __init__(self, concurrency: int = JOB_WORKERS, handlers: Optional[Dict] = None):
+        self.concurrency = max(1, concurrency)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers = handlers
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    async def start(self) -> None:
+        if self._handlers is None:
+            # Imported lazily: handlers pull in the routers, which enqueue jobs
+            from .handlers import HANDLERS
+            self._handlers = HANDLERS
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._loop(i)) for i in range(self.concurrency)]
+        logger.info(f"Job worker {self.worker_id} started with {self.concurrency} slot(s)")
+
+    async def stop(self) -> None:
+        # Running jobs are abandoned, not failed: their lease expires and they are retried
+        self._stopping.set()
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _loop(self, slot: int) -> None:
+        while not self._stopping.is_set():
+            try:
+                if slot == 0:
+                    await fail_abandoned_jobs()
+                job = await claim_job(self.worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict) -> None:
+        job_id = job["_id"]
+        handler = self._handlers.get(job.get("type"))
+        if handler is None:
+            await fail_job(job_id, self.worker_id, f"Unknown job type: {job.get('type')}", job["attempts"], retry=False)
+            return
+
+        task = asyncio.create_task(handler(job.get("payload") or {}))
+        beat = asyncio.create_task(self._heartbeat(job_id, task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if self._stopping.is_set():
+                task.cancel()
+                raise
+            logger.warning(f"Job {job_id} lost its lease; abandoning")
+            return
+        except HTTPException as e:
+            # e.g. project deleted meanwhile: retrying will not help
+            await fail_job(job_id, self.worker_id, str(e.detail), job["attempts"], retry=False)
+            return
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({job.get('type')}) failed")
+            await fail_job(job_id, self.worker_id, str(e), job["attempts"])
+            return
+        finally:
+            beat.cancel()
+        await complete_job(job_id, self.worker_id, result)
+
+    async def _heartbeat(self, job_id: str, task: asyncio.Task) -> None:
+        while not task.done():
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                alive = await heartbeat_job(job_id, self.worker_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+                continue
+            if not alive:
+                task.cancel()
+                return
+
+
+async def _main() -> None:
+    # JOB_WORKERS=0 keeps jobs out of the API process; this process then runs a single worker
+    concurrency = JOB_WORKERS
+    if concurrency <= 0:
+        logger.info("JOB_WORKERS is 0; standalone worker process running with concurrency 1")
+        concurrency = 1
+    worker = JobWorker(concurrency=concurrency)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await worker.start()
+    await stop.wait()
+    await worker.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
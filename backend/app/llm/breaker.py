@@ -0,0 +1,179 @@
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from ..core.config import (
+    LLM_BREAKER_FAILURE_RATE,
+    LLM_BREAKER_MIN_CALLS,
+    LLM_BREAKER_OPEN_SECONDS,
+    LLM_BREAKER_SLOW_SECONDS,
+    LLM_BREAKER_WINDOW,
+)
+from .limiter import RateLimitedError, call_with_limits, rate_limit_info
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"Circuit open for {name}; retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Error-rate/latency breaker for one provider/model.
+
+    Outcomes of the last ``window`` calls are kept; a call slower than
+    ``slow_seconds`` counts as a failure. Once at least ``min_calls`` are
+    recorded and the failure rate reaches ``failure_rate`` the breaker opens
+    and rejects calls for ``open_seconds``. It then lets a single probe
+    through (half-open): success closes it, failure re-opens it.
+    """
+
+    def __init__(self, name: str, window: int = LLM_BREAKER_WINDOW, min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 failure_rate: float = LLM_BREAKER_FAILURE_RATE, slow_seconds: float = LLM_BREAKER_SLOW_SECONDS,
+                 open_seconds: float = LLM_BREAKER_OPEN_SECONDS) -> None:
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._probe_in_flight = False
+        self.counters = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    def retry_in(self, now: float) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - now)
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == OPEN:
+            if self.retry_in(now) > 0:
+                self.counters["rejected"] += 1
+                return False
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                self.counters["rejected"] += 1
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record(self, ok: bool, latency: float) -> None:
+        slow = latency >= self.slow_seconds
+        failed = not ok or slow
+        self.counters["calls"] += 1
+        self.counters["failures"] += int(not ok)
+        self.counters["slow"] += int(ok and slow)
+
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            if failed:
+                self._open()
+            else:
+                self.state = CLOSED
+                self._outcomes.clear()
+            return
+
+        self._outcomes.append(not failed)
+        if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for o in self._outcomes if not o)
+            if failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe that ended without an outcome (cancelled)."""
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.counters["opened"] += 1
+        self._outcomes.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        state = self.state
+        if state == OPEN and self.retry_in(now) <= 0:
+            state = HALF_OPEN
+        failures = sum(1 for o in self._outcomes if not o)
+        return {
+            "state": state,
+            "retry_in_s": round(self.retry_in(now), 1) if state == OPEN else 0.0,
+            "window_calls": len(self._outcomes),
+            "window_failure_rate": round(failures / len(self._outcomes), 3) if self._outcomes else 0.0,
+            **self.counters,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider: str, model: Optional[str]) -> CircuitBreaker:
+    name = f"{provider}/{model or 'default'}"
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def breaker_state(provider: str, model: Optional[str]) -> str:
+    return get_breaker(provider, model).snapshot()["state"]
+
+
+def is_available(provider: str, model: Optional[str]) -> bool:
+    """True unless the breaker would reject a call right now (no side effects)."""
+    snap = get_breaker(provider, model).snapshot()
+    return snap["state"] != OPEN
+
+
+def record_failure(breaker: CircuitBreaker, exc: BaseException, latency: float) -> None:
+    """Record a failed call; being rate limited is the limiter's business, not a provider fault."""
+    if isinstance(exc, RateLimitedError) or rate_limit_info(exc)[0]:
+        breaker.release_probe()
+        return
+    breaker.record(False, latency)
+
+
+async def call_with_breaker(provider: str, model: Optional[str], fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Run one raw provider call through the breaker (see call_provider for the usual entry point)."""
+    breaker = get_breaker(provider, model)
+    if not breaker.allow():
+        raise CircuitOpenError(breaker.name, breaker.retry_in(time.monotonic()))
+    started = time.monotonic()
+    try:
+        result = await fn()
+    except Exception as e:
+        record_failure(breaker, e, time.monotonic() - started)
+        raise
+    except BaseException:
+        breaker.release_probe()
+        raise
+    breaker.record(True, time.monotonic() - started)
+    return result
+
+
+async def call_provider(provider: str, model: Optional[str], tokens: int, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Call a provider under its limiter, with the breaker around each raw attempt only.
+
+    An open breaker rejects before queueing for a limiter slot. Inside the
+    slot every attempt goes through the breaker, so queue wait and 429
+    backoff never count as provider latency, and 429s are not failures.
+    """
+    if not is_available(provider, model):
+        breaker = get_breaker(provider, model)
+        breaker.counters["rejected"] += 1
+        raise CircuitOpenError(breaker.name, breaker.retry_in(time.monotonic()))
+    return await call_with_limits(provider, model, tokens, lambda: call_with_breaker(provider, model, fn))
+
+
+def breaker_stats() -> Dict[str, Any]:
+    return {name: b.snapshot() for name, b in sorted(_breakers.items())}
@@ -0,0 +1,136 @@
+import copy
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..core.config import LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS
+from ..core.db import db
+
+logger = logging.getLogger("webmatic")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Collapse whitespace so cosmetic differences map to the same key."""
+    return " ".join((text or "").split())
+
+
+def make_cache_key(kind: str, **parts: Any) -> str:
+    """Content-address a request: sha256 over the canonical JSON of its parts."""
+    payload = json.dumps({"kind": kind, **parts}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LlmResponseCache:
+    """Two-tier cache for LLM results.
+
+    Tier 1 is an in-process LRU with a TTL; tier 2 is the ``llm_cache``
+    collection so results survive restarts and are shared across workers.
+    Mongo errors are logged and treated as misses - the cache never fails a
+    request.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, enabled: bool = True, collection: str = "llm_cache"):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.collection = collection
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "bypassed": 0, "errors": 0}
+
+    async def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        """Return ``(value, source)`` where source is memory, db or miss."""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > now:
+                self._entries.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return copy.deepcopy(value), "memory"
+            del self._entries[key]
+
+        try:
+            doc = await db[self.collection].find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"LLM cache lookup failed: {e}")
+            doc = None
+        if doc and isinstance(doc.get("value"), dict):
+            remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+            self._remember(key, doc["value"], min(remaining, self.ttl_seconds))
+            self.counters["db_hits"] += 1
+            return copy.deepcopy(doc["value"]), "db"
+
+        self.counters["misses"] += 1
+        return None, "miss"
+
+    async def set(self, key: str, value: Dict[str, Any], kind: str) -> None:
+        self._remember(key, value, self.ttl_seconds)
+        self.counters["stores"] += 1
+        now = datetime.utcnow()
+        try:
+            await db[self.collection].update_one(
+                {"_id": key},
+                {"$set": {
+                    "kind": kind,
+                    "value": value,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                }},
+                upsert=True,
+            )
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"LLM cache store failed: {e}")
+
+    async def get_or_compute(
+        self,
+        kind: str,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        use_cache: bool = True,
+        cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """Serve ``key`` from the cache or run ``compute`` and store its result.
+
+        Returns ``(value, source)``; source is memory, db, miss or off. Failed
+        computations, and results rejected by ``cacheable``, are not stored.
+        """
+        if not (self.enabled and use_cache):
+            self.bypass()
+            return await compute(), "off"
+        value, source = await self.get(key)
+        if value is not None:
+            return value, source
+        value = await compute()
+        if cacheable is None or cacheable(value):
+            await self.set(key, value, kind)
+        return value, "miss"
+
+    def _remember(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def bypass(self) -> None:
+        self.counters["bypassed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["memory_hits"] + self.counters["db_hits"] + self.counters["misses"]
+        hits = self.counters["memory_hits"] + self.counters["db_hits"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            **self.counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+        }
+
+
+llm_cache = LlmResponseCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS, enabled=LLM_CACHE_ENABLED)
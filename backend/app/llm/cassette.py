@@ -0,0 +1,257 @@
+import asyncio
+import gzip
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from ..core.config import LLM_CASSETTE_MATCH, LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_SPEED
+from .cache import make_cache_key
+
+logger = logging.getLogger("webmatic")
+
+
+class CassetteMissError(RuntimeError):
+    """Replay found no recording for a request."""
+
+
+class ReplayedProviderError(RuntimeError):
+    """A provider error captured while recording, raised again on replay."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Cassette:
+    """Gzip'd JSONL file of recorded LLM calls.
+
+    Each line holds the request identity (``message`` or ``chat`` call,
+    provider, model, params, system message, prompt; the session is kept
+    for reference but not matched on), the response as
+    ``[offset_seconds, text]`` chunks, and the error if the call failed. Recording appends one gzip
+    member per call so a crash never loses earlier entries. Replay matches
+    ``exact`` requests, or with ``sequential`` serves recordings of the same
+    call type in order regardless of the prompt; either way it cycles when
+    a match has been used up.
+    """
+
+    def __init__(self, path: str, mode: str, match: str = "exact") -> None:
+        self.path = Path(path)
+        self.mode = mode
+        self.match = match
+        self._by_key: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_call: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.counters = {"recorded": 0, "replayed": 0, "misses": 0}
+        if mode == "replay":
+            self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            logger.warning(f"Cassette {self.path} not found; every replayed call will miss")
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._by_key.setdefault(entry["key"], []).append(entry)
+                self._by_call.setdefault(entry["call"], []).append(entry)
+        logger.info(f"Loaded {sum(len(v) for v in self._by_key.values())} recording(s) from {self.path}")
+
+    def lookup(self, key: str, call: str) -> Optional[Dict[str, Any]]:
+        bucket, cursor = (self._by_call.get(call), f"call:{call}") if self.match == "sequential" else (self._by_key.get(key), key)
+        if not bucket:
+            self.counters["misses"] += 1
+            return None
+        index = self._cursors.get(cursor, 0)
+        self._cursors[cursor] = index + 1
+        self.counters["replayed"] += 1
+        return bucket[index % len(bucket)]
+
+    async def record(self, entry: Dict[str, Any]) -> None:
+        # Compression and file I/O run on a worker thread, never on the event loop
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as fh:
+                fh.write(line)
+            self.counters["recorded"] += 1
+
+
+class _Response:
+    def __init__(self, content: str) -> None:
+        self.content = content
+
+
+class CassetteLlmChat:
+    """Wraps an ``LlmChat``-like client to record its calls or replay them.
+
+    ``stream_message`` records each delta with its offset from the start of
+    the call, so replay reproduces chunk boundaries as well as timing;
+    ``send_message`` and ``chat`` record a single chunk at the total
+    latency; streamed and non-streamed recordings of the same request are
+    interchangeable on replay. Replay sleeps to the recorded offsets scaled
+    by ``speed`` (0 replays instantly) and never touches the network.
+    """
+
+    def __init__(self, inner: Any, cassette: Cassette, session_id: str, system_message: str,
+                 speed: float = LLM_CASSETTE_SPEED) -> None:
+        self.inner = inner
+        self.cassette = cassette
+        self.session_id = session_id
+        self.system_message = system_message
+        self.speed = speed
+        self.provider: Optional[str] = None
+        self.model: Optional[str] = None
+        self.params: Dict[str, Any] = {}
+
+    def with_model(self, provider: str, model: str) -> "CassetteLlmChat":
+        clone = self._clone(self.inner.with_model(provider, model) if self.inner is not None else None)
+        clone.provider, clone.model = provider, model
+        return clone
+
+    def with_params(self, **params: Any) -> "CassetteLlmChat":
+        clone = self._clone(self.inner.with_params(**params) if self.inner is not None else None)
+        clone.params = {**self.params, **params}
+        return clone
+
+    def _clone(self, inner: Any) -> "CassetteLlmChat":
+        clone = CassetteLlmChat(inner, self.cassette, self.session_id, self.system_message, self.speed)
+        clone.provider, clone.model, clone.params = self.provider, self.model, dict(self.params)
+        return clone
+
+    def _request(self, call: str, prompt: str, provider: Optional[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        request = {
+            "call": call,
+            "session": self.session_id,
+            "provider": provider,
+            "model": self.model if call != "chat" else params.get("model"),
+            "params": {k: v for k, v in params.items() if k != "model"},
+            "system": self.system_message if call != "chat" else "",
+            "prompt": prompt,
+        }
+        # The session id names the project; leave it out so recordings replay for any project
+        request["key"] = make_cache_key("cassette", **{k: v for k, v in request.items() if k != "session"})
+        return request
+
+    async def _replay(self, request: Dict[str, Any]) -> AsyncIterator[str]:
+        entry = self.cassette.lookup(request["key"], request["call"])
+        if entry is None:
+            raise CassetteMissError(f"No recording for {request['call']} {request['provider']}/{request['model']} in {self.cassette.path}")
+        started = time.monotonic()
+        for offset, text in entry.get("chunks", []):
+            delay = offset * self.speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield text
+        error = entry.get("error")
+        if error:
+            delay = entry.get("latency_s", 0) * self.speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            raise ReplayedProviderError(error.get("message", "replayed error"), error.get("status_code"), error.get("retry_after"))
+
+    async def _record(self, request: Dict[str, Any], source: AsyncIterator[str]) -> AsyncIterator[str]:
+        started = time.monotonic()
+        chunks: List[List[Any]] = []
+        try:
+            async for text in source:
+                chunks.append([round(time.monotonic() - started, 4), text])
+                yield text
+        except Exception as e:
+            await self._save(request, chunks, started, {
+                "message": str(e),
+                "type": type(e).__name__,
+                "status_code": getattr(e, "status_code", None) or getattr(e, "status", None),
+                "retry_after": getattr(e, "retry_after", None),
+            })
+            raise
+        # Cancelled or abandoned calls never get here: they are not complete recordings
+        await self._save(request, chunks, started, None)
+
+    async def _save(self, request: Dict[str, Any], chunks: List[List[Any]], started: float, error: Optional[Dict[str, Any]]) -> None:
+        try:
+            await self.cassette.record({
+                **request,
+                "chunks": chunks,
+                "latency_s": round(time.monotonic() - started, 4),
+                "error": error,
+                "recorded_at": datetime.utcnow(),
+            })
+        except Exception as e:
+            logger.warning(f"Failed to record LLM call to {self.cassette.path}: {e}")
+
+    def _calls(self, call: str, prompt: str, provider: Optional[str], params: Dict[str, Any], source, streamed: bool = False) -> AsyncIterator[str]:
+        request = self._request(call, prompt, provider, params)
+        request["streamed"] = streamed
+        if self.cassette.mode == "replay":
+            return self._replay(request)
+        if self.inner is None:
+            raise RuntimeError("LLM client not configured")
+        return self._record(request, source())
+
+    async def stream_message(self, message: Any) -> AsyncIterator[str]:
+        async def source():
+            streamer = getattr(self.inner, "stream_message", None)
+            if streamer is None:
+                yield str(await self.inner.send_message(message))
+                return
+            async for delta in streamer(message):
+                yield str(delta)
+
+        async for text in self._calls("message", _text(message), self.provider, self.params, source, streamed=True):
+            yield text
+
+    async def send_message(self, message: Any) -> str:
+        async def source():
+            yield str(await self.inner.send_message(message))
+
+        return "".join([t async for t in self._calls("message", _text(message), self.provider, self.params, source)])
+
+    async def chat(self, **kwargs: Any) -> _Response:
+        messages = kwargs.get("messages") or []
+        params = {k: v for k, v in kwargs.items() if k not in ("messages", "provider")}
+        prompt = json.dumps(messages, sort_keys=True)
+
+        async def source():
+            resp = await self.inner.chat(**kwargs)
+            yield resp.content if isinstance(resp.content, str) else str(resp.content)
+
+        return _Response("".join([t async for t in self._calls("chat", prompt, kwargs.get("provider"), params, source)]))
+
+
+def _text(message: Any) -> str:
+    return getattr(message, "text", None) or str(message)
+
+
+_cassettes: Dict[str, Cassette] = {}
+
+
+def get_cassette(path: str = LLM_CASSETTE_PATH, mode: str = LLM_CASSETTE_MODE, match: str = LLM_CASSETTE_MATCH) -> Cassette:
+    cassette = _cassettes.get(path)
+    if cassette is None:
+        cassette = _cassettes[path] = Cassette(path, mode, match)
+    return cassette
+
+
+def with_cassette(client: Any, session_id: str, system_message: str) -> Any:
+    """Wrap ``client`` for LLM_CASSETTE_MODE record/replay; returns it unchanged when off."""
+    if LLM_CASSETTE_MODE not in ("record", "replay"):
+        return client
+    if LLM_CASSETTE_MODE == "record" and client is None:
+        return None
+    return CassetteLlmChat(client, get_cassette(), session_id, system_message)
+
+
+def cassette_stats() -> Dict[str, Any]:
+    return {path: {"mode": c.mode, **c.counters} for path, c in _cassettes.items()}
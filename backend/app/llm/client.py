@@ -1,15 +1,64 @@
 import os
 from functools import lru_cache
-from emergentintegrations.llm.chat import LlmChat
+from typing import Any, AsyncIterator, Dict, Optional
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+from ..core.config import LLM_BACKEND
+from .mock import MockLlmChat
+from .cassette import CassetteLlmChat, with_cassette
+from .sessions import SessionPool, project_key
+
+def _build_client(session_id: str, system_message: str):
+    if LLM_BACKEND == "mock":
+        client = MockLlmChat(session_id=session_id, system_message=system_message)
+    else:
+        api_key = os.getenv("EMERGENT_LLM_KEY")
+        client = LlmChat(api_key=api_key, session_id=session_id, system_message=system_message) if api_key else None
+    # Record or replay through a cassette when LLM_CASSETTE_MODE is set
+    return with_cassette(client, session_id, system_message)
+
+GENERATOR_SYSTEM = "You are an expert full-stack code generator. Given a product description and recent chat, return ONLY strict JSON with keys: files (array of {path, content}), html_preview (string). files should be minimal but functional, focusing on frontend for quick preview. The html_preview must be a complete inline HTML document that renders a basic working preview of the requested UI. No prose, no explanations."
+
+# Multi-file pipeline calls return raw text per file
+PIPELINE_SYSTEM = "You are an expert frontend engineer generating a multi-file web app one step at a time. Follow the output format each request asks for exactly: strict JSON when JSON is requested, otherwise only the raw contents of the requested file. No prose, no explanations."
 
 @lru_cache(maxsize=1)
-def get_llm_client() -> LlmChat | None:
-    api_key = os.getenv("EMERGENT_LLM_KEY")
-    if not api_key:
-        return None
+def get_llm_client() -> LlmChat | MockLlmChat | CassetteLlmChat | None:
     # Create a simple LlmChat instance for generation
-    return LlmChat(
-        api_key=api_key,
-        session_id="generator",
-        system_message="You are an expert full-stack code generator. Given a product description and recent chat, return ONLY strict JSON with keys: files (array of {path, content}), html_preview (string). files should be minimal but functional, focusing on frontend for quick preview. The html_preview must be a complete inline HTML document that renders a basic working preview of the requested UI. No prose, no explanations."
-    )
\ No newline at end of file
+    return _build_client("generator", GENERATOR_SYSTEM)
+
+@lru_cache(maxsize=1)
+def get_session_pool() -> SessionPool:
+    return SessionPool(_build_client)
+
+def project_system_message(base: str, description: str) -> str:
+    """System message for a project's sessions: fixed instructions, then the description."""
+    return f"{base}\n\nProject Description:\n{description.strip()}"
+
+def session_client(scope: str, base_system: str, project_id: Optional[str], description: str,
+                   provider: str, model: Optional[str], params: Dict[str, Any]):
+    """Lease a client from the project's pooled session for one call.
+
+    Use as ``with session_client(...) as (configured_client, prefix_hit):``.
+    """
+    return get_session_pool().lease(
+        scope, project_key(project_id, description), provider, model, params,
+        project_system_message(base_system, description),
+    )
+
+def session_pool_stats() -> Dict[str, Any]:
+    return get_session_pool().stats()
+
+async def stream_message(client: LlmChat, message: UserMessage) -> AsyncIterator[str]:
+    """Yield response text deltas from a configured client.
+
+    Uses the client's native ``stream_message`` when it has one; otherwise the
+    whole ``send_message`` response is yielded as a single delta.
+    """
+    streamer = getattr(client, "stream_message", None)
+    if streamer is not None:
+        async for delta in streamer(message):
+            if delta:
+                yield str(delta)
+        return
+    response = await client.send_message(message)
+    yield str(response)
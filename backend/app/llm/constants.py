@@ -1,8 +1,15 @@
-from typing import Set
+from typing import Dict, Set
 
 ALLOWED_MODELS: Set[str] = {"claude-4-sonnet", "gpt-5"}
 
 def is_allowed_model(model: str | None) -> bool:
     if not model:
         return True
-    return model in ALLOWED_MODELS
\ No newline at end of file
+    return model in ALLOWED_MODELS
+
+# Provider to try when a provider's circuit breaker is open, and to hedge against
+ALTERNATE_PROVIDERS: Dict[str, str] = {
+    "auto": "claude",
+    "claude": "gpt",
+    "gpt": "claude",
+}
@@ -0,0 +1,135 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from ..core.config import LLM_CONTEXT_MESSAGE_TOKENS, LLM_CONTEXT_SUMMARY_TOKENS, LLM_CONTEXT_TOKENS
+from ..core.db import db
+from ..projects.chat_store import messages_after
+from .limiter import estimate_tokens
+
+logger = logging.getLogger("webmatic")
+
+_MESSAGE_OVERHEAD = 4  # "role: " prefix and separator
+_BULLET_CHARS = 200
+_SHORT_BULLET_CHARS = 100
+
+
+def _content(message: Dict[str, Any]) -> str:
+    return " ".join(str(message.get("content") or "").split())
+
+
+def _clip(text: str, tokens: int) -> str:
+    limit = max(1, tokens) * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + " …[truncated]"
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Estimated prompt tokens for one message as rendered by ``render_context``."""
+    return estimate_tokens(_clip(_content(message), LLM_CONTEXT_MESSAGE_TOKENS)) + _MESSAGE_OVERHEAD
+
+
+def select_recent(messages: List[Dict[str, Any]], budget: int) -> Tuple[int, List[Dict[str, Any]]]:
+    """Fill ``budget`` with messages newest-first.
+
+    Returns ``(cutoff, selected)``: ``messages[cutoff:]`` are the ones that
+    fit (in chronological order), everything before ``cutoff`` is left for
+    the summary. The newest message is always kept.
+    """
+    used = 0
+    cutoff = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        tokens = message_tokens(messages[i])
+        if used + tokens > budget and cutoff < len(messages):
+            break
+        used += tokens
+        cutoff = i
+    return cutoff, messages[cutoff:]
+
+
+def summarize_messages(messages: List[Dict[str, Any]]) -> List[str]:
+    """Extractive summary: one bullet per user request.
+
+    Assistant turns are generation notices and carry no requirements.
+    """
+    bullets = []
+    for m in messages:
+        text = _content(m)
+        if m.get("role") != "user" or not text:
+            continue
+        if len(text) > _BULLET_CHARS:
+            text = text[:_BULLET_CHARS].rstrip() + "…"
+        bullets.append(f"- {text}")
+    return bullets
+
+
+def merge_summary(summary: str, bullets: List[str], budget: int = LLM_CONTEXT_SUMMARY_TOKENS) -> str:
+    """Append ``bullets`` to ``summary`` and shrink the result to ``budget``.
+
+    Bullets are shortened first; if that is not enough, bullets are dropped
+    from the middle so the earliest requirements and the latest requests
+    both survive.
+    """
+    lines = [line for line in (summary or "").splitlines() if line.strip()]
+    seen = set(lines)
+    for bullet in bullets:
+        if bullet not in seen:
+            seen.add(bullet)
+            lines.append(bullet)
+    if estimate_tokens("\n".join(lines)) <= budget:
+        return "\n".join(lines)
+    lines = [line if len(line) <= _SHORT_BULLET_CHARS else line[:_SHORT_BULLET_CHARS].rstrip() + "…" for line in lines]
+    while len(lines) > 2 and estimate_tokens("\n".join(lines)) > budget:
+        del lines[len(lines) // 2]
+    return "\n".join(lines)
+
+
+def render_context(messages: List[Dict[str, Any]], summary: str = "", budget: int = LLM_CONTEXT_TOKENS) -> str:
+    """Render the chat section of a generation prompt within ``budget``."""
+    remaining = budget - (estimate_tokens(summary) if summary else 0)
+    _, recent = select_recent(messages, remaining)
+    parts = []
+    if summary:
+        parts.append(f"Earlier requests (summary):\n{summary}")
+    if recent:
+        parts.append("\n".join(f"{m.get('role')}: {_clip(_content(m), LLM_CONTEXT_MESSAGE_TOKENS)}" for m in recent))
+    return "\n\n".join(parts)
+
+
+async def build_chat_context(chat_id: str) -> Tuple[List[Dict[str, Any]], str]:
+    """Return ``(recent_messages, summary)`` for a project's chat.
+
+    Messages that no longer fit the budget are folded into the rolling
+    summary stored on the chat document as ``{text, upto}``, where ``upto``
+    is the seq of the last message summarized; only messages after it are
+    read, and only the new ones are folded in.
+    """
+    chat_doc = await db.chats.find_one({"_id": chat_id}, {"summary": 1})
+    stored = (chat_doc or {}).get("summary") or {}
+    summary = stored.get("text", "")
+    upto = int(stored.get("upto", 0))
+    messages = await messages_after(chat_id, upto)
+
+    start = 0
+    changed = False
+    while True:
+        # A longer summary leaves less room, so repeat until the window fits
+        budget = LLM_CONTEXT_TOKENS - (estimate_tokens(summary) if summary else 0)
+        cutoff = start + select_recent(messages[start:], budget)[0]
+        if cutoff <= start:
+            break
+        summary = merge_summary(summary, summarize_messages(messages[start:cutoff]))
+        start = cutoff
+        upto = messages[cutoff - 1]["seq"]
+        changed = True
+
+    if changed:
+        try:
+            await db.chats.update_one(
+                {"_id": chat_id, "$or": [{"summary.upto": {"$lt": upto}}, {"summary": {"$exists": False}}]},
+                {"$set": {"summary": {"text": summary, "upto": upto, "updated_at": datetime.utcnow()}}},
+            )
+        except Exception as e:
+            logger.warning(f"Failed to store chat summary for {chat_id}: {e}")
+    return messages[start:], summary
@@ -1,8 +1,21 @@
-import json
-from typing import Optional, Dict, Any, List
-from .client import get_llm_client
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, AsyncIterator
+from .client import GENERATOR_SYSTEM, session_client, stream_message
+from .cache import llm_cache, make_cache_key, normalize_text
+from .singleflight import llm_flights
+from .limiter import estimate_tokens, get_limiter
+from .breaker import CircuitOpenError, call_provider, get_breaker, is_available, record_failure
+from .hedge import get_hedger
+from .metrics import track_call
+from .constants import ALTERNATE_PROVIDERS
+from ..core.config import LLM_HEDGE_ENABLED
+import time
+from .context import render_context
+from .jsonstream import ArtifactStreamParser, parse_generation, PATH_STRICT, PATH_FENCED, PATH_EMBEDDED
 from emergentintegrations.llm.chat import UserMessage
-import re
+import logging
+
+logger = logging.getLogger("webmatic")
 
 _PROVIDER_MAP = {
     "auto": ("openai", "gpt-4o"),
@@ -10,8 +23,9 @@ _PROVIDER_MAP = {
     "gpt": ("openai", "gpt-5"),
 }
 
-def _build_user_prompt(description: str, chat_text: str) -> str:
-    base = f"Project Description:\n{description.strip()}\n\n"
+def _build_user_prompt(chat_text: str) -> str:
+    # The project description is part of the session's system message
+    base = ""
     if chat_text.strip():
         base += f"Recent Chat:\n{chat_text.strip()}\n\n"
     base += (
@@ -29,107 +43,240 @@ def _build_user_prompt(description: str, chat_text: str) -> str:
     )
     return base
 
-async def generate_code_from_llm(description: str, chat_messages: List[Dict[str, str]], provider: Optional[str] = "auto") -> Dict[str, Any]:
-    client = get_llm_client()
-    if client is None:
-        raise RuntimeError("LLM client not configured")
+_GEN_PARAMS = {
+    "max_tokens": 3000,  # Slightly reduced to prevent truncation
+    "temperature": 0.3,  # Slightly more creative
+}
+
+def generation_target(provider: Optional[str]):
+    return _PROVIDER_MAP.get((provider or "auto").lower(), ("openai", "gpt-4o"))
+
+@contextmanager
+def _configure_client(provider: Optional[str], description: str, project_id: Optional[str] = None):
+    """Lease ``(configured_client, prefix_hit)`` from the project's pooled generator session for one call."""
+    prov_key, model = generation_target(provider)
+    with session_client(
+        "generator", GENERATOR_SYSTEM, project_id, description, prov_key, model, _GEN_PARAMS,
+    ) as (configured_client, prefix_hit):
+        if configured_client is None:
+            raise RuntimeError("LLM client not configured")
+        yield configured_client, prefix_hit
+
+def _full_prompt(configured_client, user_prompt: str) -> str:
+    return (getattr(configured_client, "system_message", "") or "") + user_prompt
+
+def _token_budget(configured_client, user_prompt: str) -> int:
+    return estimate_tokens(_full_prompt(configured_client, user_prompt)) + _GEN_PARAMS["max_tokens"]
+
+def _is_cacheable(out: Dict[str, Any]) -> bool:
+    # Do not pin truncated or repaired output; a retry may do better
+    return out.get("parse_path") in (PATH_STRICT, PATH_FENCED, PATH_EMBEDDED)
+
+def generation_cache_key(description: str, chat_text: str, provider: Optional[str]) -> str:
+    prov_key, model = generation_target(provider)
+    return make_cache_key(
+        "generate",
+        description=normalize_text(description),
+        chat=normalize_text(chat_text),
+        provider=prov_key,
+        model=model,
+        params=_GEN_PARAMS,
+    )
 
-    chat_text = "\n".join([f"{m.get('role')}: {m.get('content')}" for m in chat_messages][-10:])
-    user_prompt = _build_user_prompt(description, chat_text)
+def flight_key(cache_key: str, project_id: Optional[str]) -> str:
+    """Single-flight key for a request: the cache key scoped to the project.
 
-    prov_key, model = _PROVIDER_MAP.get((provider or "auto").lower(), ("openai", "gpt-4o"))
+    Results are cached across projects, but an in-flight call runs on one
+    project's pooled session and records its metrics there, so only
+    requests for the same project share it.
+    """
+    return f"{cache_key}:{project_id}" if project_id else cache_key
 
+def _chat_text(chat_messages: List[Dict[str, str]], summary: str = "") -> str:
+    return render_context(chat_messages, summary)
+
+def _parse_generation(content: str) -> Dict[str, Any]:
+    content = content.strip()
+    if not content:
+        raise RuntimeError("LLM returned empty response")
     try:
-        # Configure the client with the appropriate provider and model
-        configured_client = client.with_model(prov_key, model)
-        
-        # Add parameters for longer responses
-        configured_client = configured_client.with_params(
-            max_tokens=3000,  # Slightly reduced to prevent truncation
-            temperature=0.3   # Slightly more creative
-        )
-        
+        out, path = parse_generation(content)
+    except ValueError as e:
+        raise RuntimeError(str(e))
+    if path not in (PATH_STRICT, PATH_FENCED):
+        logger.info(f"Recovered generation output via '{path}' ({len(content)} chars)")
+    out["parse_path"] = path
+    return out
+
+def _finish_stream(parser: ArtifactStreamParser) -> Dict[str, Any]:
+    if not parser.text.strip():
+        raise RuntimeError("LLM returned empty response")
+    try:
+        out = parser.finish()
+    except ValueError as e:
+        raise RuntimeError(str(e))
+    out["parse_path"] = parser.recovery
+    return out
+
+def hedge_alternate(provider: Optional[str]) -> Optional[str]:
+    """Provider to hedge ``provider`` with, if it is distinct and its breaker allows calls"""
+    alternate = ALTERNATE_PROVIDERS.get((provider or "auto").lower())
+    if not alternate or generation_target(alternate) == generation_target(provider):
+        return None
+    return alternate if is_available(*generation_target(alternate)) else None
+
+async def generate_code_from_llm(
+    description: str,
+    chat_messages: List[Dict[str, str]],
+    provider: Optional[str] = "auto",
+    use_cache: bool = True,
+    hedge: Optional[bool] = None,
+    summary: str = "",
+    project_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Generate files and preview via the LLM.
+
+    With hedging (``hedge``, defaulting to LLM_HEDGE_ENABLED) a second request
+    goes to the alternate provider once the primary is slower than its recent
+    latency percentile; ``out["hedge"]`` then records whether it fired and
+    which provider won. ``summary`` is the chat's rolling summary; recent
+    messages are fitted newest-first into the remaining context budget.
+    ``project_id`` selects the project's pooled session (see app/llm/sessions.py).
+    """
+    chat_text = _chat_text(chat_messages, summary)
+    user_prompt = _build_user_prompt(chat_text)
+
+    async def _send(target: Optional[str]) -> Dict[str, Any]:
         # Create user message
         user_message = UserMessage(text=user_prompt)
-        
-        # Send message and get response
-        response = await configured_client.send_message(user_message)
-        
-        # Extract content - response should be a string
-        content = str(response).strip()
-        
-        if not content:
-            raise RuntimeError("LLM returned empty response")
-        
-        # Try to extract JSON even if provider adds prose or markdown code blocks
-        # Look for JSON in any format - more permissive approach
-        json_match = None
-        
-        # Try markdown code blocks first
-        patterns = [
-            r"```(?:json)?\s*(\{[\s\S]*?\})\s*```",  # JSON in code blocks
-            r"```(?:json)?\s*(\{[\s\S]*?)\s*```",     # Relaxed code blocks
-            r"\{[\s\S]*\}",                           # Any JSON anywhere
-        ]
-        
-        for pattern in patterns:
-            m = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
-            if m:
-                if len(m.groups()) > 0:
-                    json_match = m.group(1)
-                else:
-                    json_match = m.group(0)
-                break
-        
-        if json_match:
-            content = json_match.strip()
-        else:
-            raise RuntimeError(f"No JSON found in LLM response: {content[:200]}...")
-        # Try to parse JSON, with aggressive fallback handling for malformed responses
-        try:
-            data = json.loads(content)
-            files = data.get("files", [])
-            html_preview = data.get("html_preview", "")
-            if not isinstance(files, list):
-                files = []
-            return {"files": files, "html_preview": html_preview}
-        except json.JSONDecodeError as e:
-            # Aggressive JSON repair for truncated responses
-            try:
-                # Method 1: Try to find the last complete object before truncation
-                lines = content.split('\n')
-                for i in range(len(lines) - 1, -1, -1):
-                    test_content = '\n'.join(lines[:i+1])
-                    # Try to close any open strings and objects
-                    if '"' in test_content and not test_content.rstrip().endswith('"'):
-                        test_content = test_content.rstrip() + '"'
-                    if '{' in test_content and not test_content.rstrip().endswith('}'):
-                        test_content = test_content.rstrip() + '}'
+
+        # Send message through the breaker and the provider's concurrency/rate limits
+        prov_key, model = generation_target(target)
+        with _configure_client(target, description, project_id) as (configured_client, prefix_hit):
+            async with track_call("generate", prov_key, model, _full_prompt(configured_client, user_prompt)) as record:
+                record.prefix_hit = prefix_hit
+                response = await call_provider(
+                    prov_key, model, _token_budget(configured_client, user_prompt),
+                    lambda: configured_client.send_message(user_message),
+                )
+
+                # Extract content - response should be a string
+                text = str(response)
+                record.finish(text)
+                out = _parse_generation(text)
+                record.parse_path = out.get("parse_path")
+        return out
+
+    async def _call() -> Dict[str, Any]:
+        hedging = LLM_HEDGE_ENABLED if hedge is None else hedge
+        alternate = hedge_alternate(provider) if hedging else None
+        out, info = await get_hedger(*generation_target(provider)).run(
+            lambda: _send(provider),
+            (lambda: _send(alternate)) if alternate else None,
+            provider, alternate,
+        )
+        if hedging:
+            out["hedge"] = info
+        return out
+
+    def _cacheable(out: Dict[str, Any]) -> bool:
+        # Only the requested provider's answer is cached under its key
+        return _is_cacheable(out) and out.get("hedge", {}).get("winner", provider) == provider
+
+    key = generation_cache_key(description, chat_text, provider)
+
+    async def _generate() -> Dict[str, Any]:
+        # Identical concurrent requests share one provider call
+        return dict(await llm_flights.do(flight_key(key, project_id), _call))
+
+    try:
+        out, source = await llm_cache.get_or_compute("generate", key, _generate, use_cache, _cacheable)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"LLM generation error: {e}")
+    if source in ("memory", "db"):
+        out.pop("hedge", None)
+    out["cache"] = source
+    return out
+
+async def stream_code_from_llm(
+    description: str,
+    chat_messages: List[Dict[str, str]],
+    provider: Optional[str] = "auto",
+    use_cache: bool = True,
+    summary: str = "",
+    project_id: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Stream a generation as events.
+
+    Yields ``delta`` events with raw text as it arrives, a ``file`` event for
+    each entry of ``files`` as soon as it is complete, an ``html_preview``
+    event once the preview string is closed, and finally a ``result`` event
+    carrying the same dict ``generate_code_from_llm`` would return. Cache hits
+    skip straight to the ``file``/``html_preview``/``result`` events. Streams
+    are never hedged: deltas from one provider are already being forwarded.
+    """
+    chat_text = _chat_text(chat_messages, summary)
+    user_prompt = _build_user_prompt(chat_text)
+    key = generation_cache_key(description, chat_text, provider)
+
+    if llm_cache.enabled and use_cache:
+        cached, source = await llm_cache.get(key)
+        if cached is not None:
+            for f in cached.get("files", []):
+                yield {"type": "file", "file": f}
+            yield {"type": "html_preview", "html_preview": cached.get("html_preview", "")}
+            yield {"type": "result", **cached, "cache": source}
+            return
+    else:
+        llm_cache.bypass()
+
+    try:
+        user_message = UserMessage(text=user_prompt)
+        parser = ArtifactStreamParser()
+        breaker = get_breaker(*generation_target(provider))
+        if not is_available(*generation_target(provider)):
+            breaker.counters["rejected"] += 1
+            raise CircuitOpenError(breaker.name, breaker.retry_in(time.monotonic()))
+        # The leased client stays with this stream until it ends
+        with _configure_client(provider, description, project_id) as (configured_client, prefix_hit):
+            async with track_call("generate", *generation_target(provider), _full_prompt(configured_client, user_prompt)) as record:
+                record.prefix_hit = prefix_hit
+                received = []
+                # Streams hold a limiter slot for their whole duration and are not retried;
+                # the breaker times the stream from inside the slot
+                async with get_limiter(*generation_target(provider)).slot(_token_budget(configured_client, user_prompt)):
+                    if not breaker.allow():
+                        raise CircuitOpenError(breaker.name, breaker.retry_in(time.monotonic()))
+                    started = time.monotonic()
                     try:
-                        data = json.loads(test_content)
-                        files = data.get("files", [])
-                        html_preview = data.get("html_preview", "")
-                        if not isinstance(files, list):
-                            files = []
-                        return {"files": files, "html_preview": html_preview}
-                    except:
-                        continue
-                
-                # Method 2: Extract whatever HTML we can find
-                html_match = re.search(r'"html_preview":\s*"([^"]*(?:\\.[^"]*)*)"', content, re.DOTALL)
-                if html_match:
-                    html_content = html_match.group(1).replace('\\"', '"').replace('\\n', '\n')
-                    return {
-                        "files": [{"path": "index.html", "content": html_content}],
-                        "html_preview": html_content
-                    }
-                    
-            except Exception as repair_error:
-                pass
-                
-            raise RuntimeError(f"Failed to parse LLM JSON response: {e}")
+                        async for delta in stream_message(configured_client, user_message):
+                            record.first_token()
+                            received.append(delta)
+                            yield {"type": "delta", "text": delta}
+                            for kind, value in parser.feed(delta):
+                                if kind == "file":
+                                    yield {"type": "file", "file": value}
+                                else:
+                                    yield {"type": "html_preview", "html_preview": value}
+                    except Exception as e:
+                        record_failure(breaker, e, time.monotonic() - started)
+                        raise
+                    except BaseException:
+                        breaker.release_probe()
+                        raise
+                    breaker.record(True, time.monotonic() - started)
+                record.finish("".join(received))
+                out = _finish_stream(parser)
+                record.parse_path = out.get("parse_path")
+    except CircuitOpenError:
+        raise
     except Exception as e:
         raise RuntimeError(f"LLM generation error: {e}")
+    if llm_cache.enabled and use_cache and _is_cacheable(out):
+        await llm_cache.set(key, out, "generate")
+    yield {"type": "result", **out, "cache": "miss" if use_cache and llm_cache.enabled else "off"}
 
 def stub_generate_code(description: str, chat_messages: List[Dict[str, str]]) -> Dict[str, Any]:
     last = ""
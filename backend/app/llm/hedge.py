@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from ..core.config import (
+    LLM_HEDGE_DEFAULT_DELAY,
+    LLM_HEDGE_MAX_RATE,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_PERCENTILE,
+)
+from .metrics import note_hedge
+
+logger = logging.getLogger("webmatic")
+
+_WINDOW = 200  # recent requests kept for the latency percentile and the hedge rate
+
+
+class Hedger:
+    """Latency tracker and hedge budget for one primary provider/model.
+
+    ``delay()`` is the configured percentile of recent primary latencies
+    (``default_delay`` until ``min_samples`` have been seen, never below
+    ``min_delay``). A hedge is only sent while at most ``max_rate`` of the
+    recent requests have been hedged, which bounds the extra cost.
+    """
+
+    def __init__(self, name: str, percentile: float = LLM_HEDGE_PERCENTILE, min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+                 default_delay: float = LLM_HEDGE_DEFAULT_DELAY, min_delay: float = LLM_HEDGE_MIN_DELAY,
+                 max_rate: float = LLM_HEDGE_MAX_RATE) -> None:
+        self.name = name
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self._latencies: Deque[float] = deque(maxlen=_WINDOW)
+        self._hedged: Deque[bool] = deque(maxlen=_WINDOW)
+        self.counters = {"requests": 0, "hedged": 0, "alternate_wins": 0, "over_budget": 0}
+
+    def observe(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def delay(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return max(self.min_delay, self.default_delay)
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(round(self.percentile / 100.0 * (len(ordered) - 1))))
+        return max(self.min_delay, ordered[index])
+
+    def _allow_hedge(self) -> bool:
+        # The current request is already in _hedged; one hedge is always allowed
+        # so a cold window does not block hedging outright.
+        if sum(self._hedged) + 1 > max(1.0, self.max_rate * len(self._hedged)):
+            self.counters["over_budget"] += 1
+            return False
+        self._hedged[-1] = True
+        self.counters["hedged"] += 1
+        return True
+
+    async def run(
+        self,
+        primary: Callable[[], Awaitable[Any]],
+        alternate: Optional[Callable[[], Awaitable[Any]]] = None,
+        primary_label: Optional[str] = None,
+        alternate_label: Optional[str] = None,
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """Run ``primary``, racing ``alternate`` if it is slower than ``delay()``.
+
+        Returns ``(result, info)``. The first call to complete without raising
+        wins and the other is cancelled; if both fail the primary's error is
+        raised. ``info`` records whether a hedge fired and which label won.
+        Without ``alternate`` this only measures the primary's latency.
+        """
+        self.counters["requests"] += 1
+        self._hedged.append(False)
+        delay = self.delay()
+        info: Dict[str, Any] = {"fired": False, "winner": primary_label or self.name, "delay_s": round(delay, 3)}
+        started = time.monotonic()
+        first = asyncio.ensure_future(primary())
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay if alternate is not None else None)
+            if first in done:
+                if first.exception() is None:
+                    self.observe(time.monotonic() - started)
+                return first.result(), info
+            if not self._allow_hedge():
+                result = await first
+                self.observe(time.monotonic() - started)
+                return result, info
+
+            info["fired"] = True
+            note_hedge()
+            logger.info(f"Hedging {self.name} with {alternate_label} after {delay:.1f}s")
+            second = asyncio.ensure_future(alternate())
+            tasks.add(second)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (first, second):
+                    if task in done and task.exception() is None:
+                        # When the alternate wins this is a lower bound for the primary
+                        self.observe(time.monotonic() - started)
+                        if task is second:
+                            self.counters["alternate_wins"] += 1
+                            info["winner"] = alternate_label
+                        return task.result(), info
+            raise first.exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                else:
+                    # Mark a loser's exception retrieved
+                    task.cancelled() or task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "delay_s": round(self.delay(), 3),
+            "samples": len(self._latencies),
+            "recent_hedge_rate": round(sum(self._hedged) / len(self._hedged), 3) if self._hedged else 0.0,
+            **self.counters,
+        }
+
+
+_hedgers: Dict[str, Hedger] = {}
+
+
+def get_hedger(provider: str, model: Optional[str]) -> Hedger:
+    name = f"{provider}/{model or 'default'}"
+    hedger = _hedgers.get(name)
+    if hedger is None:
+        hedger = _hedgers[name] = Hedger(name)
+    return hedger
+
+
+def hedge_stats() -> Dict[str, Any]:
+    return {name: h.stats() for name, h in sorted(_hedgers.items())}
@@ -0,0 +1,371 @@
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Recovery paths reported by ArtifactStreamParser.finish()
+PATH_STRICT = "strict"              # response is exactly one JSON object
+PATH_FENCED = "fenced"              # object inside a markdown code fence
+PATH_EMBEDDED = "embedded"          # object surrounded by prose
+PATH_TRUNCATED = "truncated"        # unterminated; completed values recovered
+PATH_PARTIAL = "truncated_partial"  # unterminated; in-progress string salvaged
+PATH_MALFORMED = "malformed"        # closed but invalid; completed values recovered
+
+_ARTIFACT_KEYS = ("files", "html_preview")
+_FENCE = re.compile(r"```[\w-]*[ \t]*\n?(.*?)```", re.DOTALL)
+_DECODER = json.JSONDecoder(strict=False)
+
+
+class ArtifactStreamParser:
+    """Single-pass, resumable scanner for generation responses.
+
+    Chunks are fed as they arrive from the provider. Each completed element of
+    the top-level ``files`` array and the ``html_preview`` string are reported
+    as soon as their closing delimiter is seen, so callers can forward them
+    before the full response is available. Anything before the first ``{``
+    (prose, markdown fences) and after the root object closes is ignored; a
+    "root" that closes without yielding anything (braces in prose) is
+    skipped and the scan restarts at the next ``{``.
+
+    ``finish()`` turns whatever has been fed into ``{files, html_preview}``
+    without rescanning, recovering completed values from truncated output.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[str] = []
+        self._joined: Optional[str] = ""
+        self._length = 0
+        # Segments still needed for slicing (open string / file element)
+        self._tail: List[str] = []
+        self._tail_start = 0
+        self._start = -1
+        self._end = -1
+        # Each entry: [opener, key_in_parent, expect_key, start_index]
+        self._stack: List[List[Any]] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self.files: List[Dict[str, Any]] = []
+        self.html_preview: Optional[str] = None
+        self.recovery: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        if self._joined is None:
+            self._joined = "".join(self._chunks)
+            self._chunks = [self._joined]
+        return self._joined
+
+    @property
+    def complete(self) -> bool:
+        """True once the root object has been closed."""
+        return self._end >= 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk and return newly completed ``(kind, value)`` events."""
+        events: List[Tuple[str, Any]] = []
+        if not chunk:
+            return events
+        base = self._length
+        self._chunks.append(chunk)
+        self._joined = None
+        self._length += len(chunk)
+        if self._end >= 0:
+            return events
+        self._tail.append(chunk)
+
+        while True:
+            restart = self._scan(chunk, base, events)
+            if restart is None:
+                return events
+            # The closed "root" was a brace in prose; rescan from just after it opened
+            self._start = -1
+            self._stack = []
+            self._in_string = False
+            self._escape = False
+            self._last_key = None
+            chunk = self.text[restart:]
+            base = restart
+            self._tail = [chunk]
+            self._tail_start = restart
+
+    def _scan(self, chunk: str, base: int, events: List[Tuple[str, Any]]) -> Optional[int]:
+        # Scans ``chunk`` (at offset ``base``); returns where to restart when the root was not an artifact
+        i = 0
+        n = len(chunk)
+        if self._start < 0:
+            i = chunk.find("{")
+            if i < 0:
+                self._trim_tail(self._length)
+                return None
+            self._start = base + i
+
+        while i < n:
+            c = chunk[i]
+            if self._in_string:
+                # Jump straight to the next quote or backslash
+                if self._escape:
+                    self._escape = False
+                    i += 1
+                    continue
+                q = chunk.find('"', i)
+                b = chunk.find("\\", i, q if q >= 0 else n)
+                if b >= 0:
+                    self._escape = True
+                    i = b + 1
+                    continue
+                if q < 0:
+                    i = n
+                    break
+                self._in_string = False
+                self._on_string_end(self._string_start, base + q + 1, events)
+                i = q + 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = base + i
+            elif c in "{[":
+                key = self._last_key if self._stack and self._stack[-1][0] == "{" else None
+                self._stack.append([c, key, c == "{", base + i])
+                self._last_key = None
+            elif c in "}]":
+                if self._stack:
+                    opener, _, _, start = self._stack.pop()
+                    if opener == "{" and self._is_files_element_depth():
+                        self._on_file_end(start, base + i + 1, events)
+                    if not self._stack:
+                        if not self.files and self.html_preview is None and not self._is_artifact(start, base + i + 1):
+                            return start + 1
+                        self._end = base + i + 1
+                        break
+                self._last_key = None
+            elif c == ":":
+                if self._stack:
+                    self._stack[-1][2] = False
+            elif c == ",":
+                if self._stack and self._stack[-1][0] == "{":
+                    self._stack[-1][2] = True
+                    self._last_key = None
+            i += 1
+
+        if self._end >= 0:
+            self._tail = []
+            return None
+        keep = self._length
+        if len(self._stack) >= 3 and self._stack[1][1] == "files":
+            keep = self._stack[2][3]
+        if self._in_string:
+            keep = min(keep, self._string_start)
+        self._trim_tail(keep)
+        return None
+
+    def _is_artifact(self, start: int, end: int) -> bool:
+        try:
+            data = json.loads(self._slice(start, end), strict=False)
+        except ValueError:
+            return False
+        return isinstance(data, dict) and any(k in data for k in _ARTIFACT_KEYS)
+
+    def _trim_tail(self, keep: int) -> None:
+        while self._tail and self._tail_start + len(self._tail[0]) <= keep:
+            self._tail_start += len(self._tail.pop(0))
+        if not self._tail:
+            self._tail_start = self._length
+
+    def _slice(self, start: int, end: int) -> str:
+        if len(self._tail) > 1:
+            self._tail = ["".join(self._tail)]
+        if self._tail and start >= self._tail_start:
+            return self._tail[0][start - self._tail_start:end - self._tail_start]
+        return self.text[start:end]
+
+    def finish(self) -> Dict[str, Any]:
+        """Return ``{files, html_preview}`` from everything fed so far.
+
+        Sets ``recovery`` to the path that produced the result and raises
+        ``ValueError`` when nothing usable was found.
+        """
+        text = self.text
+        if self._start < 0:
+            raise ValueError(f"No JSON found in LLM response: {text.strip()[:200]}...")
+
+        if self._end >= 0:
+            try:
+                data = json.loads(text[self._start:self._end], strict=False)
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                self.recovery = complete_path(text, self._start, self._end)
+                return _normalize(data.get("files", []), data.get("html_preview", ""))
+
+        # Braces in the prose can hide a complete object from the scan (e.g. an unclosed "{")
+        found = find_json_object(text, _ARTIFACT_KEYS)
+        if found is not None:
+            data, start, end = found
+            self.recovery = complete_path(text, start, end)
+            return _normalize(data.get("files", []), data.get("html_preview", ""))
+
+        files = list(self.files)
+        html_preview = self.html_preview
+        self.recovery = PATH_MALFORMED if self._end >= 0 else PATH_TRUNCATED
+
+        if self._end < 0 and self._in_string:
+            partial = self._salvage_open_string()
+            if partial is not None:
+                kind, value = partial
+                if kind == "file":
+                    files.append(value)
+                elif kind == "html_preview" and html_preview is None:
+                    html_preview = value
+                self.recovery = PATH_PARTIAL
+
+        if not files and not html_preview:
+            self.recovery = None
+            raise ValueError("Failed to parse LLM JSON response: no complete files or html_preview")
+        if not html_preview:
+            html_preview = next(
+                (f.get("content") for f in files if str(f.get("path", "")).endswith(".html")),
+                "",
+            )
+        return _normalize(files, html_preview)
+
+    def _is_files_element_depth(self) -> bool:
+        # After popping the element, the stack is [root {, files [].
+        return (
+            len(self._stack) == 2
+            and self._stack[1][0] == "["
+            and self._stack[1][1] == "files"
+        )
+
+    def _on_string_end(self, start: int, end: int, events: List[Tuple[str, Any]]) -> None:
+        if not self._stack or self._stack[-1][0] != "{":
+            return
+        top = self._stack[-1]
+        if top[2]:
+            try:
+                self._last_key = json.loads(self._slice(start, end), strict=False)
+            except ValueError:
+                self._last_key = None
+            return
+        if len(self._stack) == 1 and self._last_key == "html_preview":
+            try:
+                self.html_preview = json.loads(self._slice(start, end), strict=False)
+            except ValueError:
+                return
+            events.append(("html_preview", self.html_preview))
+
+    def _on_file_end(self, start: int, end: int, events: List[Tuple[str, Any]]) -> None:
+        try:
+            item = json.loads(self._slice(start, end), strict=False)
+        except ValueError:
+            return
+        if isinstance(item, dict) and "path" in item:
+            self.files.append(item)
+            events.append(("file", item))
+
+    def _salvage_open_string(self) -> Optional[Tuple[str, Any]]:
+        """Close the string the response was truncated in, if it is useful.
+
+        Only the ``html_preview`` value and the ``content`` of a file entry
+        whose ``path`` has already been seen are worth salvaging.
+        """
+        if not self._stack or self._stack[-1][0] != "{" or self._stack[-1][2]:
+            return None
+        value = _decode_partial_string(self.text[self._string_start + 1:])
+        if value is None:
+            return None
+        if len(self._stack) == 1 and self._last_key == "html_preview":
+            return "html_preview", value
+        if (
+            len(self._stack) == 3
+            and self._last_key == "content"
+            and self._stack[1][0] == "["
+            and self._stack[1][1] == "files"
+        ):
+            head = self.text[self._stack[2][3]:self._string_start]
+            try:
+                item = json.loads(head + json.dumps(value) + "}", strict=False)
+            except ValueError:
+                return None
+            if isinstance(item, dict) and "path" in item:
+                return "file", item
+        return None
+
+
+def _decode_partial_string(raw: str) -> Optional[str]:
+    # Drop an incomplete escape sequence at the cut point, e.g. '\' or '\u00'
+    for trim in range(0, 7):
+        candidate = raw[:len(raw) - trim] if trim else raw
+        try:
+            return json.loads('"' + candidate + '"', strict=False)
+        except ValueError:
+            continue
+    return None
+
+
+def _scan_objects(text: str, keys: Tuple[str, ...], lo: int, hi: int) -> Optional[Tuple[Dict[str, Any], int, int]]:
+    i = text.find("{", lo, hi)
+    while i >= 0:
+        try:
+            data, end = _DECODER.raw_decode(text, i)
+        except ValueError:
+            i = text.find("{", i + 1, hi)
+            continue
+        if isinstance(data, dict) and any(k in data for k in keys):
+            return data, i, end
+        # A complete object without the keys: nothing inside it is the answer either
+        i = text.find("{", end, hi)
+    return None
+
+
+def find_json_object(text: str, keys: Iterable[str]) -> Optional[Tuple[Dict[str, Any], int, int]]:
+    """Find the JSON object in an LLM reply; returns ``(data, start, end)`` or None.
+
+    The answer is the first object having any of ``keys``. Markdown code
+    fences are searched first, then the whole text, trying each ``{`` in
+    turn, so braces in surrounding prose do not break the match.
+    """
+    keys = tuple(keys)
+    for m in _FENCE.finditer(text):
+        found = _scan_objects(text, keys, m.start(1), m.end(1))
+        if found is not None:
+            return found
+    return _scan_objects(text, keys, 0, len(text))
+
+
+def complete_path(text: str, start: int, end: int) -> str:
+    """Recovery path for a complete JSON object found at ``text[start:end]``."""
+    before = text[:start].strip()
+    after = text[end:].strip()
+    if not before and not after:
+        return PATH_STRICT
+    if before.endswith("```") or before.lower().endswith("```json"):
+        return PATH_FENCED
+    return PATH_EMBEDDED
+
+
+def _normalize(files: Any, html_preview: Any) -> Dict[str, Any]:
+    if not isinstance(files, list):
+        files = []
+    html_preview = html_preview if isinstance(html_preview, str) else ""
+    if not files and html_preview:
+        files = [{"path": "index.html", "content": html_preview}]
+    return {"files": files, "html_preview": html_preview}
+
+
+def parse_generation(content: str) -> Tuple[Dict[str, Any], str]:
+    """Parse a complete response; returns ``(result, recovery_path)``.
+
+    Well-formed responses are decoded directly (see ``find_json_object``);
+    only when that fails does the incremental scanner recover what it can.
+    """
+    found = find_json_object(content, _ARTIFACT_KEYS)
+    if found is not None:
+        data, start, end = found
+        return _normalize(data.get("files", []), data.get("html_preview", "")), complete_path(content, start, end)
+
+    parser = ArtifactStreamParser()
+    parser.feed(content)
+    out = parser.finish()
+    return out, parser.recovery
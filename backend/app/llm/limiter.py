@@ -0,0 +1,235 @@
+import asyncio
+import json
+import logging
+import math
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..core.config import (
+    LLM_DEFAULT_CONCURRENCY,
+    LLM_DEFAULT_RPM,
+    LLM_DEFAULT_TPM,
+    LLM_LIMITS,
+    LLM_MAX_RETRIES,
+)
+
+from .metrics import estimate_tokens, note_queue_wait, note_retry
+
+logger = logging.getLogger("webmatic")
+
+_BACKOFF_BASE = 1.0
+_BACKOFF_MAX = 30.0
+
+
+class RateLimitedError(RuntimeError):
+    """Raised when a provider keeps returning 429 after all retries."""
+
+
+def rate_limit_info(exc: BaseException) -> Tuple[bool, Optional[float]]:
+    """Return ``(is_rate_limited, retry_after_seconds)`` for a provider error.
+
+    SDK errors are not typed consistently, so this checks a ``status_code`` /
+    ``status`` attribute, the response headers when present, and finally the
+    message text.
+    """
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None)
+    response = getattr(exc, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    message = str(exc).lower()
+    limited = status == 429 or re.search(r"\b429\b", message) is not None or "rate limit" in message or "too many requests" in message
+
+    retry_after = getattr(exc, "retry_after", None)
+    headers = getattr(response, "headers", None) if response is not None else None
+    if retry_after is None and headers is not None:
+        retry_after = headers.get("retry-after") or headers.get("Retry-After")
+    if retry_after is None:
+        m = re.search(r"retry[- ]after[^0-9]{0,5}(\d+(?:\.\d+)?)", message)
+        if m:
+            retry_after = m.group(1)
+    try:
+        retry_after = float(retry_after) if retry_after is not None else None
+    except (TypeError, ValueError):
+        retry_after = None
+    return limited, retry_after
+
+
+class _TokenBucket:
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class ProviderLimiter:
+    """Concurrency + RPM/TPM limiter for one provider/model.
+
+    Concurrency is an AIMD window: it halves on a 429 and grows by roughly
+    one slot per window of successful calls, up to ``max_concurrency``. A
+    Retry-After (or exponential backoff when none is given) pauses every
+    caller of this limiter, not just the one that was throttled.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, rpm: int, tpm: int) -> None:
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = asyncio.Condition()
+        self.counters = {"acquired": 0, "rate_limited": 0, "retries": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def _delay(self, tokens: float, now: float) -> float:
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.in_flight >= int(self.limit):
+            return math.inf
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.requests.delay_for(1), self.tokens.delay_for(tokens))
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait for a slot and budget; returns the time spent waiting in seconds."""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._cond:
+                while True:
+                    delay = self._delay(tokens, time.monotonic())
+                    if delay <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), None if delay == math.inf else delay)
+                    except asyncio.TimeoutError:
+                        pass
+                self.requests.level -= 1
+                self.tokens.level -= min(tokens, self.tokens.capacity)
+                self.in_flight += 1
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.counters["acquired"] += 1
+        self.counters["wait_ms_total"] += waited * 1000
+        self.counters["wait_ms_max"] = max(self.counters["wait_ms_max"], waited * 1000)
+        return waited
+
+    async def release(self, *, rate_limited: bool = False, retry_after: Optional[float] = None, attempt: int = 0,
+                      extra_tokens: int = 0) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            if rate_limited:
+                self.counters["rate_limited"] += 1
+                self.limit = max(1.0, self.limit / 2)
+                pause = retry_after if retry_after is not None else min(
+                    _BACKOFF_MAX, _BACKOFF_BASE * (2 ** attempt) * (1 + random.random() / 2)
+                )
+                self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            if extra_tokens:
+                # Reconcile the estimate with actual usage; may leave the bucket in debt
+                self.tokens.level -= extra_tokens
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int) -> AsyncIterator[None]:
+        note_queue_wait(await self.acquire(tokens))
+        try:
+            yield
+        except BaseException as e:
+            limited, retry_after = rate_limit_info(e)
+            await self.release(rate_limited=limited, retry_after=retry_after)
+            raise
+        await self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        acquired = self.counters["acquired"]
+        return {
+            "limit": round(self.limit, 2),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "blocked_for_s": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+            "rpm_available": round(self.requests.level, 1),
+            "tpm_available": round(self.tokens.level),
+            "acquired": acquired,
+            "rate_limited": self.counters["rate_limited"],
+            "retries": self.counters["retries"],
+            "avg_wait_ms": round(self.counters["wait_ms_total"] / acquired, 1) if acquired else 0.0,
+            "max_wait_ms": round(self.counters["wait_ms_max"], 1),
+        }
+
+
+def _limits_config() -> Dict[str, Dict[str, int]]:
+    if not LLM_LIMITS:
+        return {}
+    try:
+        return json.loads(LLM_LIMITS)
+    except ValueError:
+        logger.warning("Ignoring invalid LLM_LIMITS JSON")
+        return {}
+
+
+_CONFIG = _limits_config()
+_limiters: Dict[str, ProviderLimiter] = {}
+
+
+def get_limiter(provider: str, model: Optional[str]) -> ProviderLimiter:
+    name = f"{provider}/{model or 'default'}"
+    limiter = _limiters.get(name)
+    if limiter is None:
+        conf = _CONFIG.get(name) or _CONFIG.get(provider) or {}
+        limiter = ProviderLimiter(
+            name,
+            int(conf.get("concurrency", LLM_DEFAULT_CONCURRENCY)),
+            int(conf.get("rpm", LLM_DEFAULT_RPM)),
+            int(conf.get("tpm", LLM_DEFAULT_TPM)),
+        )
+        _limiters[name] = limiter
+    return limiter
+
+
+async def call_with_limits(provider: str, model: Optional[str], tokens: int, fn: Callable[[], Awaitable[Any]],
+                           max_retries: int = LLM_MAX_RETRIES) -> Any:
+    """Run ``fn`` under the provider/model limiter, retrying 429s with backoff."""
+    limiter = get_limiter(provider, model)
+    attempt = 0
+    while True:
+        note_queue_wait(await limiter.acquire(tokens))
+        try:
+            result = await fn()
+        except BaseException as e:
+            limited, retry_after = rate_limit_info(e) if isinstance(e, Exception) else (False, None)
+            await limiter.release(rate_limited=limited, retry_after=retry_after, attempt=attempt)
+            if limited and attempt < max_retries:
+                attempt += 1
+                limiter.counters["retries"] += 1
+                note_retry()
+                logger.info(f"{limiter.name} rate limited; retry {attempt}/{max_retries}")
+                continue
+            if limited:
+                raise RateLimitedError(f"{limiter.name} rate limited after {attempt} retries: {e}") from e
+            raise
+        await limiter.release()
+        return result
+
+
+def limiter_stats() -> Dict[str, Any]:
+    return {name: lim.stats() for name, lim in sorted(_limiters.items())}
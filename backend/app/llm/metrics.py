@@ -0,0 +1,232 @@
+import bisect
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for budgeting."""
+    return max(1, math.ceil(len(text or "") / 4))
+
+
+_SECONDS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+_TOKENS = (100, 250, 500, 1000, 2000, 3000, 4000, 8000, 16000)
+_BYTES = (1024, 4096, 8192, 16384, 32768, 65536, 131072)
+
+# Histogram buckets per CallRecord field
+_FIELDS = {
+    "queue_wait_s": _SECONDS,
+    "ttft_s": _SECONDS,
+    "latency_s": _SECONDS,
+    "prompt_tokens": _TOKENS,
+    "completion_tokens": _TOKENS,
+    "response_bytes": _BYTES,
+}
+
+
+class CallRecord:
+    """Measurements for one provider call (one attempt sequence through the limiter)."""
+
+    __slots__ = ("kind", "provider", "model", "queue_wait_s", "ttft_s", "latency_s", "prompt_tokens",
+                 "completion_tokens", "response_bytes", "retries", "parse_path", "prefix_hit", "error", "_started")
+
+    def __init__(self, kind: str, provider: str, model: Optional[str], prompt_tokens: int) -> None:
+        self.kind = kind
+        self.provider = provider
+        self.model = model
+        self.queue_wait_s = 0.0
+        self.ttft_s: Optional[float] = None
+        self.latency_s = 0.0
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.parse_path: Optional[str] = None
+        self.prefix_hit: Optional[bool] = None  # prompt prefix still warm in the provider's cache
+        self.error: Optional[str] = None
+        self._started = time.monotonic()
+
+    def first_token(self) -> None:
+        if self.ttft_s is None:
+            self.ttft_s = time.monotonic() - self._started
+
+    def finish(self, text: str) -> None:
+        self.completion_tokens = estimate_tokens(text) if text else 0
+        self.response_bytes = len(text.encode("utf-8")) if text else 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {name: getattr(self, name) for name in self.__slots__ if not name.startswith("_")}
+        for name in ("queue_wait_s", "ttft_s", "latency_s"):
+            if out[name] is not None:
+                out[name] = round(out[name], 4)
+        return out
+
+
+class RunMetrics:
+    """Calls made on behalf of one run (plan, generation, compare variant)."""
+
+    def __init__(self) -> None:
+        self.calls: List[CallRecord] = []
+        self.hedges = 0
+
+    def summary(self) -> Dict[str, Any]:
+        calls = [c.to_dict() for c in self.calls]
+        ok = [c for c in self.calls if c.error is None]
+        return {
+            "calls": calls,
+            "llm_calls": len(calls),
+            "hedges": self.hedges,
+            "retries": sum(c.retries for c in self.calls),
+            "queue_wait_s": round(sum(c.queue_wait_s for c in self.calls), 4),
+            "latency_s": round(max((c.latency_s for c in ok), default=0.0), 4),
+            "ttft_s": min((round(c.ttft_s, 4) for c in ok if c.ttft_s is not None), default=None),
+            "prompt_tokens": sum(c.prompt_tokens for c in self.calls),
+            "completion_tokens": sum(c.completion_tokens for c in self.calls),
+            "response_bytes": sum(c.response_bytes for c in self.calls),
+            "prefix_hits": sum(1 for c in self.calls if c.prefix_hit),
+            "parse_path": next((c.parse_path for c in reversed(ok) if c.parse_path), None),
+        }
+
+
+_run: ContextVar[Optional[RunMetrics]] = ContextVar("llm_run_metrics", default=None)
+_call: ContextVar[Optional[CallRecord]] = ContextVar("llm_call_record", default=None)
+
+
+@contextmanager
+def collect_metrics() -> Iterator[RunMetrics]:
+    """Collect every LLM call made inside the block (including in tasks it starts)."""
+    run = RunMetrics()
+    token = _run.set(run)
+    try:
+        yield run
+    finally:
+        _run.reset(token)
+
+
+@asynccontextmanager
+async def track_call(kind: str, provider: str, model: Optional[str], prompt: str) -> AsyncIterator[CallRecord]:
+    """Measure one provider call; the limiter adds queue wait and retries to it."""
+    record = CallRecord(kind, provider, model, estimate_tokens(prompt))
+    token = _call.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        record.error = "cancelled" if not isinstance(e, Exception) else f"{type(e).__name__}: {str(e)[:200]}"
+        raise
+    finally:
+        _call.reset(token)
+        record.latency_s = time.monotonic() - record._started
+        run = _run.get()
+        if run is not None:
+            run.calls.append(record)
+        llm_metrics.observe(record)
+
+
+def current_run() -> Optional[RunMetrics]:
+    return _run.get()
+
+
+def current_call() -> Optional[CallRecord]:
+    return _call.get()
+
+
+def note_queue_wait(seconds: float) -> None:
+    record = _call.get()
+    if record is not None:
+        record.queue_wait_s += seconds
+
+
+def note_retry() -> None:
+    record = _call.get()
+    if record is not None:
+        record.retries += 1
+
+
+def note_hedge() -> None:
+    run = _run.get()
+    if run is not None:
+        run.hedges += 1
+    llm_metrics.hedges += 1
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None past the last bucket)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else None
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative, seen = {}, 0
+        for bound, n in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            seen += n
+            cumulative[bound] = seen
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "p50_le": self.quantile(0.5),
+            "p95_le": self.quantile(0.95),
+            "buckets": cumulative,
+        }
+
+
+class LlmMetrics:
+    """Process-wide histograms of call measurements keyed by ``kind provider/model``."""
+
+    def __init__(self) -> None:
+        self._series: Dict[str, Dict[str, Any]] = {}
+        self.hedges = 0
+
+    def observe(self, record: CallRecord) -> None:
+        key = f"{record.kind} {record.provider}/{record.model or 'default'}"
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {
+                "calls": 0, "errors": 0, "retries": 0, "prefix_hits": 0, "parse_paths": {},
+                "histograms": {name: Histogram(b) for name, b in _FIELDS.items()},
+            }
+        series["calls"] += 1
+        series["retries"] += record.retries
+        if record.prefix_hit:
+            series["prefix_hits"] += 1
+        if record.error is not None:
+            series["errors"] += 1
+        if record.parse_path:
+            series["parse_paths"][record.parse_path] = series["parse_paths"].get(record.parse_path, 0) + 1
+        for name, hist in series["histograms"].items():
+            value = getattr(record, name)
+            if value is not None and (record.error is None or name == "queue_wait_s"):
+                hist.observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "hedges": self.hedges,
+            "series": {
+                key: {**{k: v for k, v in s.items() if k != "histograms"},
+                      "histograms": {name: h.snapshot() for name, h in s["histograms"].items()}}
+                for key, s in sorted(self._series.items())
+            },
+        }
+
+
+llm_metrics = LlmMetrics()
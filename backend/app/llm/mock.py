@@ -0,0 +1,312 @@
+"""Local stand-in for ``LlmChat`` for load tests and benchmarks.
+
+Select it with ``LLM_BACKEND=mock``; ``LLM_MOCK_PROFILE`` is a preset name
+(``fast``, ``realistic``, ``flaky``, ``slow``) or a JSON object of profile
+fields, optionally with a ``"preset"`` to start from and per-provider
+overrides under ``"providers"``, e.g.::
+
+    LLM_MOCK_PROFILE='{"preset": "realistic", "error_429_rate": 0.2,
+                       "providers": {"anthropic": {"ttft_ms": 3000}}}'
+
+Responses are shaped after the prompt (plan, generation, patch, pipeline
+manifest or file) so the parser, limiter, breaker and fallbacks all run for
+real. The same mock can be served over HTTP as an OpenAI-style
+``/v1/chat/completions`` endpoint::
+
+    python -m app.llm.mock --port 8089 --profile flaky
+"""
+import asyncio
+import copy
+import json
+import math
+import random
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from ..core.config import LLM_MOCK_PROFILE
+
+_DEFAULTS: Dict[str, Any] = {
+    "ttft_ms": 300,          # median time to first token
+    "ttft_sigma": 0.3,       # lognormal spread of the time to first token
+    "tokens_per_sec": 200,
+    "slow_rate": 0.0,        # share of calls whose latency is multiplied by slow_factor
+    "slow_factor": 4.0,
+    "error_429_rate": 0.0,
+    "error_5xx_rate": 0.0,
+    "retry_after": 1.0,      # seconds advertised on 429s
+    "markdown_rate": 0.0,    # share of JSON responses wrapped in ```json fences
+    "truncate_tokens": None,  # cut responses after this many tokens ...
+    "truncate_rate": 1.0,    # ... for this share of calls
+    "html_chars": 2500,      # size of generated HTML documents
+    "seed": None,
+}
+
+PRESETS: Dict[str, Dict[str, Any]] = {
+    "fast": {"ttft_ms": 2, "ttft_sigma": 0.0, "tokens_per_sec": 100000},
+    "realistic": {
+        "ttft_ms": 800, "ttft_sigma": 0.4, "tokens_per_sec": 60, "slow_rate": 0.02, "slow_factor": 5.0,
+        "error_429_rate": 0.02, "error_5xx_rate": 0.01, "markdown_rate": 0.2,
+    },
+    "flaky": {
+        "ttft_ms": 500, "ttft_sigma": 0.5, "tokens_per_sec": 80, "slow_rate": 0.1, "slow_factor": 6.0,
+        "error_429_rate": 0.15, "error_5xx_rate": 0.1, "markdown_rate": 0.3,
+        "truncate_tokens": 400, "truncate_rate": 0.2,
+    },
+    "slow": {"ttft_ms": 4000, "ttft_sigma": 0.6, "tokens_per_sec": 25, "slow_rate": 0.1, "slow_factor": 3.0},
+}
+
+
+class MockProviderError(RuntimeError):
+    """Provider-style error carrying ``status_code`` (and ``retry_after`` on 429)."""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def load_profile(spec: Optional[str] = None) -> Dict[str, Any]:
+    """Resolve a preset name or JSON spec into a full profile."""
+    spec = (spec if spec is not None else LLM_MOCK_PROFILE) or "realistic"
+    spec = spec.strip()
+    if spec.startswith("{"):
+        overrides = json.loads(spec)
+        base = PRESETS.get(overrides.pop("preset", "realistic"), {})
+    else:
+        if spec not in PRESETS:
+            raise ValueError(f"Unknown mock profile '{spec}'; expected one of {sorted(PRESETS)} or JSON")
+        base, overrides = PRESETS[spec], {}
+    profile = {**_DEFAULTS, **base, **overrides}
+    profile.setdefault("providers", {})
+    return profile
+
+
+def _tokenize(text: str, rng: random.Random) -> List[str]:
+    # Provider tokens average ~4 characters; vary them so chunk boundaries
+    # land inside strings, escapes and delimiters like real streams do
+    tokens = []
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 7)
+        tokens.append(text[i:i + size])
+        i += size
+    return tokens
+
+
+def _html(title: str, chars: int) -> str:
+    sections = []
+    n = 0
+    while sum(len(s) for s in sections) < max(0, chars - 600):
+        n += 1
+        sections.append(
+            f'    <section class="card"><h2>Feature {n}</h2>'
+            f"<p>{title} feature {n} keeps things simple, fast and \"reliable\".</p></section>\n"
+        )
+    return (
+        "<!doctype html>\n<html>\n<head>\n  <meta charset=\"utf-8\" />\n"
+        f"  <title>{title}</title>\n"
+        "  <style>body{font-family:system-ui;margin:0} .card{padding:16px;border:1px solid #e2e8f0}</style>\n"
+        f"</head>\n<body>\n  <header><h1>{title}</h1></header>\n  <main>\n{''.join(sections)}  </main>\n"
+        "</body>\n</html>"
+    )
+
+
+def _title(prompt: str) -> str:
+    m = re.search(r"(?:Project|Product) Description:\s*\n(.+)", prompt)
+    text = (m.group(1) if m else "Mock App").strip()
+    return re.sub(r"[<>\"&]", "", text)[:60] or "Mock App"
+
+
+def respond(prompt: str, profile: Dict[str, Any]) -> str:
+    """Deterministic response body for a prompt, shaped after what it asks for."""
+    title = _title(prompt)
+    if "frontend (array of strings)" in prompt or "implementation plan" in prompt:
+        return json.dumps({
+            "frontend": [f"{title} landing page", "Responsive layout", "Client-side state"],
+            "backend": ["REST API", "Authentication", "Validation"],
+            "database": ["Users collection", "Projects collection"],
+        })
+    if "Plan the files" in prompt:
+        return json.dumps({"files": [
+            {"path": "index.html", "role": "entry page", "spec": f"{title} home page"},
+            {"path": "styles.css", "role": "stylesheet", "spec": "Layout and theme"},
+            {"path": "app.js", "role": "script", "spec": "Interactivity"},
+        ]}, indent=2)
+    m = re.search(r"Write the complete contents of (\S+)\.\n", prompt)
+    if m:
+        path = m.group(1)
+        if path.endswith(".css"):
+            return "body { font-family: system-ui; margin: 0 }\n.card { padding: 16px }\n"
+        if path.endswith(".js"):
+            return "document.addEventListener('DOMContentLoaded', () => console.log('ready'));\n"
+        return _html(title, profile["html_chars"]).replace(
+            "</head>", '  <link rel="stylesheet" href="styles.css">\n</head>'
+        ).replace("</body>", '  <script src="app.js"></script>\n</body>')
+    if "Change Request:" in prompt:
+        return json.dumps({"patches": [
+            {"path": "mock-theme.css", "op": "create", "content": "body { color: #0f172a }\n"},
+        ]}, indent=2)
+    html = _html(title, profile["html_chars"])
+    return json.dumps({"files": [{"path": "index.html", "content": html}], "html_preview": html}, indent=2)
+
+
+class _MockResponse:
+    def __init__(self, content: str) -> None:
+        self.content = content
+
+
+class MockLlmChat:
+    """Drop-in for ``LlmChat``: ``with_model``/``with_params`` return configured
+    copies; ``send_message``, ``stream_message`` and ``chat`` simulate a
+    provider according to the profile."""
+
+    counters: Dict[str, int] = {"calls": 0, "errors_429": 0, "errors_5xx": 0, "truncated": 0, "tokens_out": 0}
+
+    def __init__(self, api_key: str = "mock", session_id: str = "mock", system_message: str = "",
+                 profile: Optional[Dict[str, Any]] = None) -> None:
+        self.api_key = api_key
+        self.session_id = session_id
+        self.system_message = system_message
+        self.profile = profile if profile is not None else load_profile()
+        self.provider = "openai"
+        self.model = "mock"
+        self.params: Dict[str, Any] = {}
+        seed = self.profile.get("seed")
+        self._rng = random.Random(seed) if seed is not None else random.Random()
+
+    def with_model(self, provider: str, model: str) -> "MockLlmChat":
+        clone = copy.copy(self)
+        clone.provider, clone.model = provider, model
+        return clone
+
+    def with_params(self, **params: Any) -> "MockLlmChat":
+        clone = copy.copy(self)
+        clone.params = {**self.params, **params}
+        return clone
+
+    def _effective(self, provider: str) -> Dict[str, Any]:
+        return {**self.profile, **self.profile.get("providers", {}).get(provider, {})}
+
+    def _plan_tokens(self, prompt: str, profile: Dict[str, Any]) -> List[str]:
+        text = respond(prompt, profile)
+        if text.lstrip().startswith("{") and self._rng.random() < profile["markdown_rate"]:
+            text = f"```json\n{text}\n```"
+        tokens = _tokenize(text, self._rng)
+        limit = profile.get("truncate_tokens")
+        max_tokens = self.params.get("max_tokens")
+        if limit and self._rng.random() < profile["truncate_rate"]:
+            max_tokens = min(limit, max_tokens or limit)
+        if max_tokens and len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            MockLlmChat.counters["truncated"] += 1
+        return tokens
+
+    async def _first_token(self, profile: Dict[str, Any]) -> float:
+        """Wait out the time to first token or raise; returns the slow-down factor."""
+        MockLlmChat.counters["calls"] += 1
+        factor = profile["slow_factor"] if self._rng.random() < profile["slow_rate"] else 1.0
+        ttft = profile["ttft_ms"] / 1000.0 * math.exp(self._rng.gauss(0, profile["ttft_sigma"])) * factor
+        await asyncio.sleep(ttft)
+        roll = self._rng.random()
+        if roll < profile["error_429_rate"]:
+            MockLlmChat.counters["errors_429"] += 1
+            raise MockProviderError(429, "rate limit exceeded", retry_after=profile["retry_after"])
+        if roll < profile["error_429_rate"] + profile["error_5xx_rate"]:
+            MockLlmChat.counters["errors_5xx"] += 1
+            raise MockProviderError(503, "upstream overloaded")
+        return factor
+
+    async def _stream(self, provider: str, prompt: str) -> AsyncIterator[str]:
+        profile = self._effective(provider)
+        factor = await self._first_token(profile)
+        tokens = self._plan_tokens(prompt, profile)
+        per_token = factor / max(1.0, float(profile["tokens_per_sec"]))
+        # Sleep in batches; per-token sleeps would measure the event loop, not the model
+        batch = max(1, int(0.02 / per_token)) if per_token > 0 else len(tokens)
+        for i in range(0, len(tokens), batch):
+            await asyncio.sleep(per_token * len(tokens[i:i + batch]))
+            for token in tokens[i:i + batch]:
+                MockLlmChat.counters["tokens_out"] += 1
+                yield token
+
+    async def stream_message(self, message: Any) -> AsyncIterator[str]:
+        async for token in self._stream(self.provider, getattr(message, "text", str(message))):
+            yield token
+
+    async def send_message(self, message: Any) -> str:
+        return "".join([t async for t in self._stream(self.provider, getattr(message, "text", str(message)))])
+
+    async def chat(self, provider: str = "auto", messages: Optional[List[Dict[str, str]]] = None, **params: Any) -> _MockResponse:
+        prompt = "\n".join(str(m.get("content", "")) for m in (messages or []))
+        configured = self.with_params(**params)
+        return _MockResponse("".join([t async for t in configured._stream(provider, prompt)]))
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return dict(cls.counters)
+
+
+def create_app(profile: Optional[Dict[str, Any]] = None):
+    """OpenAI-style ``/v1/chat/completions`` server backed by ``MockLlmChat``."""
+    import time
+    import uuid
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI(title="webmatic mock LLM")
+    chat = MockLlmChat(profile=profile)
+
+    @app.post("/v1/chat/completions")
+    async def completions(body: Dict[str, Any]):
+        model = body.get("model") or "mock"
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages") or [])
+        configured = chat.with_model("openai", model).with_params(max_tokens=body.get("max_tokens"))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        try:
+            if not body.get("stream"):
+                text = await configured.send_message(prompt)
+                return {
+                    "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                }
+            stream = configured.stream_message(prompt)
+            first = await stream.__anext__()
+        except MockProviderError as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+            return JSONResponse(status_code=e.status_code, content={"error": {"message": str(e)}}, headers=headers)
+        except StopAsyncIteration:
+            first, stream = "", None
+
+        async def events():
+            if first:
+                yield _chunk(completion_id, model, first)
+            if stream is not None:
+                async for token in stream:
+                    yield _chunk(completion_id, model, token)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return MockLlmChat.stats()
+
+    return app
+
+
+def _chunk(completion_id: str, model: str, token: str) -> str:
+    payload = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+               "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the mock LLM over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--profile", default=None, help="preset name or JSON (defaults to LLM_MOCK_PROFILE)")
+    args = parser.parse_args()
+    uvicorn.run(create_app(load_profile(args.profile)), host=args.host, port=args.port)
@@ -0,0 +1,222 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from emergentintegrations.llm.chat import UserMessage
+
+from .breaker import CircuitOpenError, call_provider
+from .cache import llm_cache, make_cache_key, normalize_text
+from .generator import _chat_text, _configure_client, _full_prompt, _GEN_PARAMS, _token_budget, flight_key, generation_target
+from .jsonstream import find_json_object
+from .metrics import track_call
+from .singleflight import llm_flights
+
+logger = logging.getLogger("webmatic")
+
+PREVIEW_PATH = "html_preview"  # pseudo-path for patching the preview itself
+
+# Tags whose open/close counts must match after patching
+_BALANCED_TAGS = ("html", "head", "body", "script", "style")
+
+
+class PatchError(ValueError):
+    """A patch response could not be parsed, applied or validated."""
+
+
+def _build_patch_prompt(chat_text: str, files: List[Dict[str, str]], html_preview: str, request: str) -> str:
+    # The project description is part of the session's system message
+    base = ""
+    if chat_text.strip():
+        base += f"Recent Chat:\n{chat_text.strip()}\n\n"
+    base += "Current Files:\n"
+    for f in files:
+        base += f"--- {f['path']}\n{f['content']}\n"
+    if html_preview and not any(f["content"] == html_preview for f in files):
+        base += f"--- {PREVIEW_PATH}\n{html_preview}\n"
+    base += (
+        f"\nChange Request:\n{request.strip()}\n\n"
+        "Return ONLY the changes as EXACTLY this JSON structure (no extra text):\n"
+        "{\n"
+        '  "patches": [\n'
+        '    {"path": "index.html", "op": "edit", "edits": [{"find": "EXACT_EXISTING_TEXT", "replace": "NEW_TEXT"}]},\n'
+        '    {"path": "new-file.css", "op": "create", "content": "FULL_CONTENT"},\n'
+        '    {"path": "old-file.js", "op": "delete"}\n'
+        "  ]\n"
+        "}\n\n"
+        "CRITICAL REQUIREMENTS:\n"
+        "- Each \"find\" must be copied verbatim from the current file and occur exactly once in it\n"
+        "- Keep edits minimal; do not resend unchanged text\n"
+        "- Use \"op\": \"replace\" with full \"content\" only when most of a file changes\n"
+        f"- The preview follows index.html; patch \"{PREVIEW_PATH}\" only if it is listed separately\n"
+        "- Return ONLY valid JSON, no markdown blocks, no explanations"
+    )
+    return base
+
+
+def _parse_patches(content: str) -> List[Dict[str, Any]]:
+    found = find_json_object(content, ("patches",))
+    if found is None:
+        raise PatchError(f"No patch JSON found in response: {content.strip()[:200]}...")
+    patches = found[0]["patches"]
+    if not isinstance(patches, list):
+        raise PatchError("Patch response has no 'patches' list")
+    return patches
+
+
+def _apply_edits(path: str, text: str, edits: Any) -> str:
+    if not isinstance(edits, list) or not edits:
+        raise PatchError(f"Edit patch for {path} has no edits")
+    for edit in edits:
+        find = edit.get("find") if isinstance(edit, dict) else None
+        replace = edit.get("replace", "") if isinstance(edit, dict) else None
+        if not isinstance(find, str) or not find or not isinstance(replace, str):
+            raise PatchError(f"Malformed edit for {path}")
+        count = text.count(find)
+        if count != 1:
+            raise PatchError(f"Edit for {path} matches {count} times: {find[:80]!r}")
+        text = text.replace(find, replace, 1)
+    return text
+
+
+def _validate_html(path: str, before: str, after: str) -> None:
+    if not after.strip():
+        raise PatchError(f"Patched {path} is empty")
+    for tag in _BALANCED_TAGS:
+        opened = len(re.findall(rf"<{tag}[\s>]", after, re.IGNORECASE))
+        closed = len(re.findall(rf"</{tag}\s*>", after, re.IGNORECASE))
+        before_opened = len(re.findall(rf"<{tag}[\s>]", before, re.IGNORECASE))
+        before_closed = len(re.findall(rf"</{tag}\s*>", before, re.IGNORECASE))
+        # Only flag imbalance the patch introduced
+        if opened - closed != before_opened - before_closed:
+            raise PatchError(f"Patched {path} has unbalanced <{tag}> tags")
+
+
+def apply_patches(files: List[Dict[str, str]], html_preview: str, patches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply file- and hunk-level patches; returns ``{files, html_preview}``.
+
+    ``op`` is ``edit`` (exact find/replace hunks), ``replace``/``create``
+    (full content) or ``delete``. The preview follows the HTML file it was
+    identical to unless it is patched explicitly via ``html_preview``.
+    Raises ``PatchError`` when any patch does not apply cleanly or the
+    result fails validation; nothing is partially applied.
+    """
+    current = {f["path"]: f["content"] for f in files}
+    order = [f["path"] for f in files]
+    preview = html_preview or ""
+    preview_source = next((f["path"] for f in files if f["content"] == preview and f["path"].endswith(".html")), None)
+    preview_patched = False
+
+    for patch in patches:
+        if not isinstance(patch, dict) or not isinstance(patch.get("path"), str) or not patch["path"].strip():
+            raise PatchError("Patch without a path")
+        path = patch["path"].strip()
+        op = (patch.get("op") or "edit").lower()
+        if path == PREVIEW_PATH:
+            if op == "edit":
+                preview = _apply_edits(path, preview, patch.get("edits"))
+            elif op in ("replace", "create") and isinstance(patch.get("content"), str):
+                preview = patch["content"]
+            else:
+                raise PatchError(f"Unsupported patch op '{op}' for {PREVIEW_PATH}")
+            preview_patched = True
+        elif op == "edit":
+            if path not in current:
+                raise PatchError(f"Edit for unknown file {path}")
+            current[path] = _apply_edits(path, current[path], patch.get("edits"))
+        elif op in ("replace", "create"):
+            if not isinstance(patch.get("content"), str):
+                raise PatchError(f"Patch for {path} has no content")
+            if path not in current:
+                order.append(path)
+            current[path] = patch["content"]
+        elif op == "delete":
+            if path not in current:
+                raise PatchError(f"Delete for unknown file {path}")
+            del current[path]
+            order.remove(path)
+        else:
+            raise PatchError(f"Unsupported patch op '{op}' for {path}")
+
+    if not current:
+        raise PatchError("Patches removed every file")
+    if not preview_patched and preview_source is not None:
+        if preview_source not in current:
+            raise PatchError(f"Patches deleted {preview_source}, which the preview is built from")
+        preview = current[preview_source]
+
+    before = {f["path"]: f["content"] for f in files}
+    for path in order:
+        if path.endswith(".html"):
+            _validate_html(path, before.get(path, ""), current[path])
+    _validate_html(PREVIEW_PATH, html_preview or "", preview)
+
+    return {"files": [{"path": p, "content": current[p]} for p in order], "html_preview": preview}
+
+
+async def patch_code_from_llm(
+    description: str,
+    chat_messages: List[Dict[str, str]],
+    files: List[Dict[str, str]],
+    html_preview: str,
+    request: str,
+    provider: Optional[str] = "auto",
+    use_cache: bool = True,
+    summary: str = "",
+    project_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Ask the LLM for patches against ``files`` and return the patched result.
+
+    The result has the same shape as ``generate_code_from_llm``'s, with
+    ``parse_path`` set to ``patch`` and ``patch`` summarizing what changed.
+    Raises ``PatchError`` when the patches do not apply; callers then fall
+    back to a full regeneration.
+    """
+    chat_text = _chat_text(chat_messages, summary)
+    user_prompt = _build_patch_prompt(chat_text, files, html_preview, request)
+    prov_key, model = generation_target(provider)
+
+    async def _call() -> Dict[str, Any]:
+        user_message = UserMessage(text=user_prompt)
+        with _configure_client(provider, description, project_id) as (configured_client, prefix_hit):
+            async with track_call("patch", prov_key, model, _full_prompt(configured_client, user_prompt)) as record:
+                record.prefix_hit = prefix_hit
+                response = await call_provider(
+                    prov_key, model, _token_budget(configured_client, user_prompt),
+                    lambda: configured_client.send_message(user_message),
+                )
+                text = str(response)
+                record.finish(text)
+                patches = _parse_patches(text)
+                record.parse_path = "patch"
+        out = apply_patches(files, html_preview, patches)
+        out["parse_path"] = "patch"
+        out["patch"] = {
+            "ops": len(patches),
+            "edits": sum(len(p.get("edits") or []) for p in patches if isinstance(p, dict)),
+            "response_chars": len(text),
+        }
+        return out
+
+    key = make_cache_key(
+        "patch",
+        description=normalize_text(description),
+        chat=normalize_text(chat_text),
+        files=files,
+        html_preview=html_preview,
+        request=normalize_text(request),
+        provider=prov_key,
+        model=model,
+        params=_GEN_PARAMS,
+    )
+
+    async def _patch() -> Dict[str, Any]:
+        return dict(await llm_flights.do(flight_key(key, project_id), _call))
+
+    try:
+        out, source = await llm_cache.get_or_compute("patch", key, _patch, use_cache)
+    except (CircuitOpenError, PatchError):
+        raise
+    except Exception as e:
+        raise RuntimeError(f"LLM patch error: {e}")
+    out["cache"] = source
+    return out
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import posixpath
+import re
+from typing import Any, Dict, List, Optional
+
+from emergentintegrations.llm.chat import UserMessage
+
+from ..core.config import LLM_PIPELINE_CONCURRENCY, LLM_PIPELINE_FILE_RETRIES, LLM_PIPELINE_MAX_FILES
+from .breaker import CircuitOpenError, call_provider
+from .cache import llm_cache, make_cache_key, normalize_text
+from .client import PIPELINE_SYSTEM, session_client
+from .generator import _chat_text, flight_key, generation_target
+from .jsonstream import find_json_object
+from .limiter import estimate_tokens
+from .metrics import track_call
+from .singleflight import llm_flights
+
+logger = logging.getLogger("webmatic")
+
+_MANIFEST_PARAMS = {"max_tokens": 800, "temperature": 0.2}
+_FILE_PARAMS = {"max_tokens": 4000, "temperature": 0.3}
+
+_FENCE = re.compile(r"^\s*```[\w+-]*\s*\n(.*?)\n?```\s*$", re.DOTALL)
+_LINK = re.compile(r"<link\b[^>]*\bhref=[\"']([^\"']+\.css)[\"'][^>]*>", re.IGNORECASE)
+_SCRIPT = re.compile(r"<script\b([^>]*)\bsrc=[\"']([^\"']+\.js)[\"']([^>]*)>\s*</script>", re.IGNORECASE)
+
+
+def _build_manifest_prompt(chat_text: str) -> str:
+    # The project description is part of the session's system message
+    base = ""
+    if chat_text.strip():
+        base += f"Recent Chat:\n{chat_text.strip()}\n\n"
+    base += (
+        "Plan the files for a working frontend preview of this app. Return EXACTLY this JSON "
+        "structure (no extra text):\n"
+        "{\n"
+        '  "files": [{"path": "index.html", "role": "entry page", "spec": "WHAT_THIS_FILE_CONTAINS"}]\n'
+        "}\n\n"
+        "CRITICAL REQUIREMENTS:\n"
+        "- index.html is the entry page and references the other files by relative path\n"
+        "- Use plain HTML, CSS and JavaScript files only (no build step, no frameworks)\n"
+        f"- At most {LLM_PIPELINE_MAX_FILES} files; keep each spec to one or two sentences\n"
+        "- Return ONLY valid JSON, no markdown blocks, no explanations"
+    )
+    return base
+
+
+def _build_file_prompt(chat_text: str, manifest: List[Dict[str, str]], entry: Dict[str, str]) -> str:
+    # Everything but the last request is shared by all files of a run
+    base = ""
+    if chat_text.strip():
+        base += f"Recent Chat:\n{chat_text.strip()}\n\n"
+    base += "Project Files:\n"
+    for f in manifest:
+        base += f"- {f['path']} ({f['role']}): {f['spec']}\n"
+    base += (
+        f"\nWrite the complete contents of {entry['path']}.\n\n"
+        "CRITICAL REQUIREMENTS:\n"
+        "- Make it professional, modern, responsive and fully functional\n"
+        "- Refer to the other files only by the paths listed above\n"
+        "- Return ONLY the raw file contents: no JSON, no markdown fences, no explanations"
+    )
+    return base
+
+
+def _parse_manifest(content: str) -> List[Dict[str, str]]:
+    found = find_json_object(content, ("files",))
+    if found is None:
+        raise RuntimeError(f"No manifest JSON found in response: {content.strip()[:200]}...")
+    files = found[0]["files"]
+    manifest: List[Dict[str, str]] = []
+    seen = set()
+    for item in files if isinstance(files, list) else []:
+        if not isinstance(item, dict):
+            continue
+        path = posixpath.normpath(str(item.get("path") or "").strip().lstrip("/"))
+        if not path or path == "." or path.startswith("..") or path in seen:
+            continue
+        seen.add(path)
+        manifest.append({"path": path, "role": str(item.get("role") or ""), "spec": str(item.get("spec") or "")})
+    if not any(f["path"].endswith(".html") for f in manifest):
+        raise RuntimeError("Manifest has no HTML entry page")
+    return manifest[:LLM_PIPELINE_MAX_FILES]
+
+
+def _clean_file(path: str, content: str) -> str:
+    content = content.strip()
+    m = _FENCE.match(content)
+    if m:
+        content = m.group(1).strip()
+    if not content:
+        raise RuntimeError(f"Empty content for {path}")
+    if path.endswith(".html") and "<html" in content.lower() and "</html>" not in content.lower():
+        raise RuntimeError(f"Truncated content for {path}")
+    return content + "\n"
+
+
+def _entry_path(files: List[Dict[str, str]]) -> Optional[str]:
+    paths = [f["path"] for f in files]
+    if "index.html" in paths:
+        return "index.html"
+    return next((p for p in paths if p.endswith(".html")), None)
+
+
+def assemble_preview(files: List[Dict[str, str]]) -> str:
+    """Inline the entry page's local stylesheets and scripts into one document."""
+    entry = _entry_path(files)
+    if entry is None:
+        return ""
+    contents = {f["path"]: f["content"] for f in files}
+    base = posixpath.dirname(entry)
+
+    def _local(ref: str) -> Optional[str]:
+        if "://" in ref or ref.startswith("//"):
+            return None
+        return contents.get(posixpath.normpath(posixpath.join(base, ref)))
+
+    def _style(m: "re.Match[str]") -> str:
+        css = _local(m.group(1))
+        return f"<style>\n{css}</style>" if css is not None else m.group(0)
+
+    def _script(m: "re.Match[str]") -> str:
+        js = _local(m.group(2))
+        if js is None:
+            return m.group(0)
+        attrs = " ".join((m.group(1) + m.group(3)).split())
+        return f"<script{' ' + attrs if attrs else ''}>\n{js}</script>"
+
+    html = _LINK.sub(_style, contents[entry])
+    return _SCRIPT.sub(_script, html)
+
+
+async def _complete(kind: str, provider: Optional[str], description: str, project_id: Optional[str],
+                    prompt: str, params: Dict[str, Any]) -> str:
+    prov_key, model = generation_target(provider)
+    # File calls run concurrently; each leases its own client from the project's session
+    with session_client(
+        "pipeline", PIPELINE_SYSTEM, project_id, description, prov_key, model, params,
+    ) as (configured_client, prefix_hit):
+        if configured_client is None:
+            raise RuntimeError("LLM client not configured")
+        system = getattr(configured_client, "system_message", "") or ""
+        tokens = estimate_tokens(system + prompt) + params["max_tokens"]
+        async with track_call(kind, prov_key, model, system + prompt) as record:
+            record.prefix_hit = prefix_hit
+            response = await call_provider(
+                prov_key, model, tokens, lambda: configured_client.send_message(UserMessage(text=prompt)),
+            )
+            text = str(response)
+            record.finish(text)
+            record.parse_path = "pipeline"
+    return text
+
+
+async def _generate_file(description: str, chat_text: str, manifest: List[Dict[str, str]], entry: Dict[str, str],
+                         provider: Optional[str], project_id: Optional[str], semaphore: asyncio.Semaphore,
+                         stats: Dict[str, int]) -> Dict[str, str]:
+    prompt = _build_file_prompt(chat_text, manifest, entry)
+    attempt = 0
+    while True:
+        try:
+            async with semaphore:
+                content = await _complete("pipeline_file", provider, description, project_id, prompt, _FILE_PARAMS)
+            return {"path": entry["path"], "content": _clean_file(entry["path"], content)}
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if attempt >= LLM_PIPELINE_FILE_RETRIES:
+                raise RuntimeError(f"{entry['path']}: {e}")
+            attempt += 1
+            stats["retries"] += 1
+            logger.info(f"Retrying {entry['path']} (attempt {attempt + 1}): {e}")
+
+
+async def generate_with_pipeline(
+    description: str,
+    chat_messages: List[Dict[str, str]],
+    provider: Optional[str] = "auto",
+    use_cache: bool = True,
+    summary: str = "",
+    project_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Generate a multi-file app as a manifest call plus one call per file.
+
+    Files are generated concurrently (at most LLM_PIPELINE_CONCURRENCY at a
+    time) as raw text, so there is no JSON to escape or repair; a failed
+    file is retried on its own. The result has the same shape as
+    ``generate_code_from_llm``'s, with the entry page's local CSS/JS inlined
+    into ``html_preview``. Raises RuntimeError when a file still fails.
+    """
+    chat_text = _chat_text(chat_messages, summary)
+    prov_key, model = generation_target(provider)
+
+    async def _call() -> Dict[str, Any]:
+        manifest = _parse_manifest(await _complete(
+            "pipeline_manifest", provider, description, project_id, _build_manifest_prompt(chat_text), _MANIFEST_PARAMS,
+        ))
+        semaphore = asyncio.Semaphore(max(1, LLM_PIPELINE_CONCURRENCY))
+        stats = {"retries": 0}
+        tasks = [
+            asyncio.ensure_future(_generate_file(description, chat_text, manifest, entry, provider, project_id, semaphore, stats))
+            for entry in manifest
+        ]
+        try:
+            files = await asyncio.gather(*tasks)
+        finally:
+            # One file failing for good fails the run; stop the others
+            for task in tasks:
+                task.cancel()
+        return {
+            "files": list(files),
+            "html_preview": assemble_preview(list(files)),
+            "parse_path": "pipeline",
+            "pipeline": {"files": len(files), "retries": stats["retries"]},
+        }
+
+    key = make_cache_key(
+        "pipeline",
+        description=normalize_text(description),
+        chat=normalize_text(chat_text),
+        provider=prov_key,
+        model=model,
+        params=[_MANIFEST_PARAMS, _FILE_PARAMS],
+    )
+
+    async def _generate() -> Dict[str, Any]:
+        return dict(await llm_flights.do(flight_key(key, project_id), _call))
+
+    try:
+        out, source = await llm_cache.get_or_compute("generate", key, _generate, use_cache)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"LLM pipeline error: {e}")
+    out["cache"] = source
+    return out
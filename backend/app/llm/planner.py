@@ -1,7 +1,15 @@
 import json
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 # Note: Catch generic Exception to avoid tight coupling to SDK-specific exceptions
 from .client import get_llm_client
+from .cache import make_cache_key, normalize_text
+from .singleflight import llm_flights
+from .limiter import estimate_tokens
+from .breaker import CircuitOpenError, call_provider, is_available
+from .hedge import get_hedger
+from .metrics import track_call
+from .constants import ALTERNATE_PROVIDERS
+from ..core.config import LLM_HEDGE_ENABLED
 from ..projects.models import Plan
 
 _PROVIDER_MAP = {
@@ -10,7 +18,56 @@ _PROVIDER_MAP = {
     "gpt": "openai",
 }
 
-async def plan_from_llm(description: str, provider: Optional[str] = "auto", model: Optional[str] = None) -> Plan:
+_PLAN_PARAMS = {"max_tokens": 900, "temperature": 0.2}
+
+def plan_target(provider: Optional[str], model: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Provider key and model a plan request is sent to (limiter/breaker identity)"""
+    return _PROVIDER_MAP.get((provider or "auto").lower(), "auto"), model
+
+def plan_cache_key(description: str, provider: Optional[str] = "auto", model: Optional[str] = None) -> str:
+    return make_cache_key(
+        "plan",
+        description=normalize_text(description),
+        provider=_PROVIDER_MAP.get((provider or "auto").lower(), "auto"),
+        model=model,
+        params=_PLAN_PARAMS,
+    )
+
+async def plan_from_llm(description: str, provider: Optional[str] = "auto", model: Optional[str] = None, hedge: Optional[bool] = None) -> Plan:
+    """Plan via the LLM; identical concurrent requests share one provider call"""
+    plan, _ = await hedged_plan_from_llm(description, provider, model, hedge)
+    return plan
+
+async def hedged_plan_from_llm(
+    description: str,
+    provider: Optional[str] = "auto",
+    model: Optional[str] = None,
+    hedge: Optional[bool] = None,
+) -> Tuple[Plan, Dict[str, Any]]:
+    """Like ``plan_from_llm`` but also returns the hedge info.
+
+    With hedging (``hedge``, defaulting to LLM_HEDGE_ENABLED) the alternate
+    provider is raced once the primary is slower than its recent latency
+    percentile. The info is empty when hedging is off.
+    """
+    hedging = LLM_HEDGE_ENABLED if hedge is None else hedge
+    alternate = ALTERNATE_PROVIDERS.get((provider or "auto").lower()) if hedging else None
+    if alternate and (plan_target(alternate, None) == plan_target(provider, model) or not is_available(*plan_target(alternate, None))):
+        alternate = None
+
+    async def _call() -> Tuple[Plan, Dict[str, Any]]:
+        plan, info = await get_hedger(*plan_target(provider, model)).run(
+            lambda: _plan_from_llm(description, provider, model),
+            (lambda: _plan_from_llm(description, alternate, None)) if alternate else None,
+            provider, alternate,
+        )
+        return plan, (info if hedging else {})
+
+    key = plan_cache_key(description, provider, model)
+    plan, info = await llm_flights.do(key, _call)
+    return plan.copy(deep=True), dict(info)
+
+async def _plan_from_llm(description: str, provider: Optional[str] = "auto", model: Optional[str] = None) -> Plan:
     client = get_llm_client()
     if client is None:
         raise RuntimeError("LLM client not configured")
@@ -36,20 +93,25 @@ async def plan_from_llm(description: str, provider: Optional[str] = "auto", mode
                 {"role": "system", "content": system},
                 {"role": "user", "content": user},
             ],
-            "max_tokens": 900,
-            "temperature": 0.2,
+            **_PLAN_PARAMS,
         }
         if model:
             kwargs["model"] = model
 
-        resp = await client.chat(**kwargs)
-        content = resp.content if isinstance(resp.content, str) else str(resp.content)
-        data = json.loads(content)
+        tokens = estimate_tokens(system + user) + _PLAN_PARAMS["max_tokens"]
+        async with track_call("plan", provider_key, model, system + user) as record:
+            resp = await call_provider(provider_key, model, tokens, lambda: client.chat(**kwargs))
+            content = resp.content if isinstance(resp.content, str) else str(resp.content)
+            record.finish(content)
+            data = json.loads(content)
+            record.parse_path = "json"
         return Plan(
             frontend=list(map(str, data.get("frontend", []))),
             backend=list(map(str, data.get("backend", []))),
             database=list(map(str, data.get("database", []))),
         )
+    except CircuitOpenError:
+        raise
     except Exception as e:
         # Catch any LLM-related errors (auth, rate limit, invalid request, etc.)
         if "json" not in str(e).lower():  # Avoid catching JSON decode errors here
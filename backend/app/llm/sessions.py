@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..core.config import LLM_PROMPT_CACHE_TTL, LLM_SESSION_IDLE_SECONDS, LLM_SESSION_POOL_SIZE
+from .metrics import estimate_tokens
+
+logger = logging.getLogger("webmatic")
+
+SessionKey = Tuple[str, str, str, Optional[str], Tuple[Tuple[str, Any], ...]]
+
+
+def project_key(project_id: Optional[str], description: str) -> str:
+    """Pool key for a project; callers without a project id share sessions by description."""
+    if project_id:
+        return project_id
+    return "desc:" + hashlib.sha256(description.strip().encode("utf-8")).hexdigest()[:16]
+
+
+class _Session:
+    __slots__ = ("name", "idle", "clients", "leased", "system_message", "created", "last_used", "calls")
+
+    def __init__(self, name: str, system_message: str, now: float) -> None:
+        self.name = name
+        self.idle: List[Any] = []  # configured clients not leased to a call
+        self.clients = 0
+        self.leased = 0
+        self.system_message = system_message
+        self.created = now
+        self.last_used = now
+        self.calls = 0
+
+
+class SessionPool:
+    """Bounded LRU of configured LLM clients keyed by scope, project, provider, model and params.
+
+    A session's system message is the scope's instructions followed by the
+    project description, so every call on it starts with the same prefix and
+    providers' prompt caching can apply. Clients keep per-conversation state,
+    so each in-flight call leases a client of its own (``lease``) and gives it
+    back when done; concurrent calls on one session get separate clients. A call is counted as a prefix hit
+    when the session was last used within LLM_PROMPT_CACHE_TTL (the window
+    providers keep a prefix warm); hits, misses and the estimated prefix
+    tokens reused are reported by ``stats``. Sessions idle for longer than
+    ``idle_seconds`` are evicted, as are the least recently used ones once
+    the pool is full. A changed description replaces the project's session.
+    """
+
+    def __init__(self, factory: Callable[[str, str], Any], size: int = LLM_SESSION_POOL_SIZE,
+                 idle_seconds: float = LLM_SESSION_IDLE_SECONDS, prefix_ttl: float = LLM_PROMPT_CACHE_TTL) -> None:
+        self.factory = factory
+        self.size = max(1, size)
+        self.idle_seconds = idle_seconds
+        self.prefix_ttl = prefix_ttl
+        self._sessions: "OrderedDict[SessionKey, _Session]" = OrderedDict()
+        self.counters = {
+            "created": 0, "reused": 0, "rebuilt": 0, "evicted_idle": 0, "evicted_lru": 0,
+            "prefix_hits": 0, "prefix_misses": 0, "prefix_tokens_reused": 0,
+        }
+
+    @contextmanager
+    def lease(self, scope: str, project: str, provider: str, model: Optional[str],
+              params: Dict[str, Any], system_message: str) -> Iterator[Tuple[Any, bool]]:
+        """Lend a client for one call: yields ``(configured_client, prefix_hit)``.
+
+        The client is None when no LLM is configured.
+        """
+        session, client, prefix_hit = self._checkout(scope, project, provider, model, params, system_message)
+        try:
+            yield client, prefix_hit
+        finally:
+            if session is not None:
+                session.leased -= 1
+                session.last_used = time.monotonic()
+                # A session evicted or rebuilt meanwhile just lets the client go
+                if any(s is session for s in self._sessions.values()):
+                    session.idle.append(client)
+
+    def _checkout(self, scope: str, project: str, provider: str, model: Optional[str],
+                  params: Dict[str, Any], system_message: str) -> Tuple[Optional[_Session], Any, bool]:
+        now = time.monotonic()
+        self._evict_idle(now)
+        key: SessionKey = (scope, project, provider, model, tuple(sorted(params.items())))
+        session = self._sessions.get(key)
+        if session is not None and session.system_message != system_message:
+            # The description changed; the old prefix will never be sent again
+            del self._sessions[key]
+            session = None
+            self.counters["rebuilt"] += 1
+        if session is None:
+            session = _Session(f"{scope}:{project}:{provider}/{model or 'default'}", system_message, now)
+            prefix_hit = False
+        else:
+            self._sessions.move_to_end(key)
+            self.counters["reused"] += 1
+            prefix_hit = now - session.last_used <= self.prefix_ttl
+        if session.idle:
+            client = session.idle.pop()
+        else:
+            client = self.factory(session.name if not session.clients else f"{session.name}#{session.clients}", system_message)
+            if client is None:
+                return None, None, False
+            client = client.with_model(provider, model).with_params(**params)
+            session.clients += 1
+        if key not in self._sessions:
+            self._sessions[key] = session
+            self.counters["created"] += 1
+            while len(self._sessions) > self.size:
+                self._sessions.popitem(last=False)
+                self.counters["evicted_lru"] += 1
+        session.leased += 1
+        session.last_used = now
+        session.calls += 1
+        if prefix_hit:
+            self.counters["prefix_hits"] += 1
+            self.counters["prefix_tokens_reused"] += estimate_tokens(system_message)
+        else:
+            self.counters["prefix_misses"] += 1
+        return session, client, prefix_hit
+
+    def _evict_idle(self, now: float) -> None:
+        # Least recently used first, so stop at the first session still in use
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if session.leased or now - session.last_used <= self.idle_seconds:
+                break
+            del self._sessions[key]
+            self.counters["evicted_idle"] += 1
+
+    def clear(self) -> None:
+        self._sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["prefix_hits"] + self.counters["prefix_misses"]
+        return {
+            "sessions": len(self._sessions),
+            "clients": sum(s.clients for s in self._sessions.values()),
+            "leased": sum(s.leased for s in self._sessions.values()),
+            "size": self.size,
+            **self.counters,
+            "prefix_hit_rate": round(self.counters["prefix_hits"] / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    __slots__ = ("task", "refs")
+
+    def __init__(self, task: "asyncio.Future[Any]") -> None:
+        self.task = task
+        self.refs = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight task.
+
+    The first caller starts the task; later callers with the same key await
+    the same result. Each caller holds a reference: a caller that is
+    cancelled only drops its reference, and the shared task is cancelled
+    once nobody is waiting for it any more.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+        self.counters = {"calls": 0, "coalesced": 0, "abandoned": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.counters["calls"] += 1
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda t, k=key, c=call: self._forget(k, c))
+        else:
+            self.counters["coalesced"] += 1
+
+        call.refs += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.refs -= 1
+            if call.refs == 0 and not call.task.done():
+                self.counters["abandoned"] += 1
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            # Mark the exception retrieved; waiters re-raise it themselves
+            call.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._calls), **self.counters}
+
+
+llm_flights = SingleFlight()
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from ..core.db import db
+
+logger = logging.getLogger("webmatic")
+
+# Generated artifacts live outside the project document:
+#   artifact_blobs:    {_id: sha256 of content, content, size, created_at, used_at}; identical
+#                      bodies (e.g. index.html and the html_preview) are stored once and
+#                      deleted by delete_unreferenced_blobs once no version refers to them
+#   artifact_versions: one per generation, {_id, project_id, files: [{path, hash, size}],
+#                      html_preview_hash, html_preview_size, ...summary fields}
+# The project keeps the latest version's summary (no bodies) under ``artifacts``;
+# chat messages keep an ``artifact_ref`` (see artifact_ref) to the version they produced.
+
+_DUPLICATE_KEY = 11000
+# A blob stored or reused this recently may belong to a version not inserted yet
+_SWEEP_GRACE = timedelta(seconds=30)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+async def put_blobs(contents: Iterable[str]) -> Dict[str, int]:
+    """Store each distinct body once; returns ``{hash: size}``."""
+    by_hash = {content_hash(c): c for c in contents}
+    if not by_hash:
+        return {}
+    existing = {d["_id"] for d in await db.artifact_blobs.find({"_id": {"$in": list(by_hash)}}, {"_id": 1}).to_list(None)}
+    now = datetime.utcnow()
+    if existing:
+        # Keeps a concurrent sweep from deleting them before our version refers to them
+        await db.artifact_blobs.update_many({"_id": {"$in": list(existing)}}, {"$set": {"used_at": now}})
+    missing = [
+        {"_id": h, "content": c, "size": len(c.encode("utf-8")), "created_at": now, "used_at": now}
+        for h, c in by_hash.items() if h not in existing
+    ]
+    if missing:
+        try:
+            await db.artifact_blobs.insert_many(missing, ordered=False)
+        except BulkWriteError as e:
+            # Another writer stored the same content first; anything else is a real failure
+            if any(err.get("code") != _DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                raise
+    return {h: len(c.encode("utf-8")) for h, c in by_hash.items()}
+
+
+def version_blob_hashes(versions: Iterable[Dict[str, Any]]) -> List[str]:
+    """Every blob hash the given version documents refer to."""
+    hashes = set()
+    for v in versions:
+        hashes.update(f["hash"] for f in v.get("files") or [] if f.get("hash"))
+        if v.get("html_preview_hash"):
+            hashes.add(v["html_preview_hash"])
+    return list(hashes)
+
+
+async def delete_unreferenced_blobs(hashes: Iterable[str]) -> int:
+    """Delete the blobs among ``hashes`` that no artifact version refers to; returns how many.
+
+    Blobs are shared between versions and projects, so call this after
+    deleting versions with the hashes they referred to. Blobs stored or
+    reused within the last ``_SWEEP_GRACE`` are kept: a generation may be
+    about to insert a version that refers to them.
+    """
+    candidates = list(set(hashes))
+    if not candidates:
+        return 0
+    referenced = set(await db.artifact_versions.distinct("files.hash", {"files.hash": {"$in": candidates}}))
+    referenced.update(await db.artifact_versions.distinct("html_preview_hash", {"html_preview_hash": {"$in": candidates}}))
+    orphans = [h for h in candidates if h not in referenced]
+    if not orphans:
+        return 0
+    cutoff = datetime.utcnow() - _SWEEP_GRACE
+    result = await db.artifact_blobs.delete_many({
+        "_id": {"$in": orphans},
+        "$or": [
+            {"used_at": {"$lt": cutoff}},
+            # Stored before blobs recorded their last use
+            {"used_at": {"$exists": False}, "created_at": {"$lt": cutoff}},
+        ],
+    })
+    if result.deleted_count < len(orphans):
+        logger.info(f"Kept {len(orphans) - result.deleted_count} recently used unreferenced blob(s)")
+    return result.deleted_count
+
+
+async def get_blobs(hashes: Iterable[str]) -> Dict[str, str]:
+    wanted = list({h for h in hashes if h})
+    if not wanted:
+        return {}
+    return {d["_id"]: d["content"] for d in await db.artifact_blobs.find({"_id": {"$in": wanted}}).to_list(None)}
+
+
+async def save_artifacts(project_id: str, files: List[Dict[str, str]], html_preview: str,
+                         info: Dict[str, Any], created_at: Optional[datetime] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Store a generation's bodies and version; returns ``(summary, artifacts)``.
+
+    ``summary`` is what the project document keeps; ``artifacts`` is the
+    full dict (with bodies) in the shape callers returned before.
+    """
+    sizes = await put_blobs([f["content"] for f in files] + ([html_preview] if html_preview else []))
+    refs = [{"path": f["path"], "hash": content_hash(f["content"]), "size": sizes[content_hash(f["content"])]} for f in files]
+    preview_hash = content_hash(html_preview) if html_preview else None
+    summary = {
+        "version_id": str(uuid.uuid4()),
+        "files": refs,
+        "html_preview_hash": preview_hash,
+        "html_preview_size": sizes.get(preview_hash, 0) if preview_hash else 0,
+        "file_count": len(refs),
+        "total_bytes": sum(sizes.values()),
+        **info,
+    }
+    await db.artifact_versions.insert_one({
+        **summary,
+        "_id": summary["version_id"],
+        "project_id": project_id,
+        "created_at": created_at or datetime.utcnow(),
+    })
+    artifacts = {**info, "files": files, "html_preview": html_preview, "version_id": summary["version_id"]}
+    return summary, artifacts
+
+
+def version_hash(summary: Dict[str, Any]) -> str:
+    """Hash of a version's contents: identical generations hash the same."""
+    parts = [f"{f['path']}:{f['hash']}" for f in summary.get("files", [])]
+    parts.append(f"html_preview:{summary.get('html_preview_hash') or ''}")
+    return content_hash("\n".join(parts))
+
+
+def artifact_ref(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Pointer to a stored version, small enough to embed in a chat message."""
+    return {
+        "version_id": summary["version_id"],
+        "file_count": summary.get("file_count", len(summary.get("files", []))),
+        "total_bytes": summary.get("total_bytes", 0),
+        "hash": version_hash(summary),
+    }
+
+
+def is_summary(artifacts: Optional[Dict[str, Any]]) -> bool:
+    """True for a stored summary (bodies not loaded), False for inline or loaded artifacts."""
+    return bool(artifacts) and bool(artifacts.get("version_id")) and artifacts.get("html_preview") is None
+
+
+async def load_artifacts(artifacts: Optional[Dict[str, Any]], paths: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+    """Return ``artifacts`` with file contents and ``html_preview`` filled in.
+
+    Accepts a stored summary, or legacy inline artifacts (returned as is).
+    ``paths`` limits which files are loaded; the preview is then only
+    loaded when ``html_preview`` is among them.
+    """
+    if not artifacts or not is_summary(artifacts):
+        return artifacts
+    wanted = set(paths) if paths is not None else None
+    refs = [f for f in artifacts.get("files", []) if wanted is None or f["path"] in wanted]
+    preview_hash = artifacts.get("html_preview_hash") if wanted is None or "html_preview" in wanted else None
+    bodies = await get_blobs([f["hash"] for f in refs] + [preview_hash])
+    out = {k: v for k, v in artifacts.items() if k not in ("files", "html_preview", "html_preview_hash", "html_preview_size")}
+    out["files"] = [{"path": f["path"], "content": bodies.get(f["hash"], "")} for f in refs]
+    out["html_preview"] = bodies.get(preview_hash, "") if preview_hash else ("" if wanted is None else None)
+    return out
+
+
+async def get_version(project_id: str, version_id: str) -> Optional[Dict[str, Any]]:
+    doc = await db.artifact_versions.find_one({"_id": version_id, "project_id": project_id})
+    if doc:
+        doc.pop("_id")
+    return doc
+
+
+async def list_versions(project_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    docs = await db.artifact_versions.find(
+        {"project_id": project_id}, {"files": 0},
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    for d in docs:
+        d.pop("_id")
+    return docs
+
+
+async def externalize_inline_artifacts(project_doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Move a legacy project's inline artifacts into the store; returns the new summary."""
+    artifacts = project_doc.get("artifacts")
+    if not artifacts or is_summary(artifacts):
+        return None
+    files = [
+        {"path": str(f.get("path", "unknown")), "content": str(f.get("content", ""))}
+        for f in artifacts.get("files") or [] if isinstance(f, dict)
+    ]
+    info = {k: v for k, v in artifacts.items() if k not in ("files", "html_preview")}
+    summary, _ = await save_artifacts(project_doc["_id"], files, artifacts.get("html_preview") or "", info)
+    await db.projects.update_one(
+        {"_id": project_doc["_id"], "artifacts": artifacts},
+        {"$set": {"artifacts": summary}},
+    )
+    return summary
@@ -0,0 +1,162 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from ..core.db import db
+from ..core.uow import UnitOfWork
+from .artifacts import artifact_ref, get_version, save_artifacts
+
+_DUPLICATE_KEY = 11000
+
+# Chat messages are stored one document per message in db.chat_messages:
+#   {_id, project_id, seq, role, content, timestamp, user_id, ...}
+# ``seq`` counts up from 1 per project, allocated from ``seq`` on the project's
+# db.chats document (which also holds the rolling summary). Appending is one
+# counter update plus one insert however long the conversation is.
+
+
+async def next_seq(project_id: str) -> int:
+    # A chat not migrated yet has no counter: start after its embedded messages,
+    # whose seqs (1..n) migrate_embedded_messages will claim
+    doc = await db.chats.find_one_and_update(
+        {"_id": project_id},
+        [{"$set": {
+            "seq": {"$add": [{"$ifNull": ["$seq", {"$size": {"$ifNull": ["$messages", []]}}]}, 1]},
+            "updated_at": datetime.utcnow(),
+        }}],
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["seq"]
+
+
+async def append_message(project_id: str, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Store ``message`` as the project's next message; returns it with ``id`` and ``seq``."""
+    doc = {**message, "_id": str(uuid.uuid4()), "project_id": project_id, "seq": await next_seq(project_id)}
+    await db.chat_messages.insert_one(doc)
+    return _to_message(doc)
+
+
+def _to_message(doc: Dict[str, Any]) -> Dict[str, Any]:
+    doc["id"] = doc.pop("_id")
+    doc.pop("project_id", None)
+    return doc
+
+
+async def fetch_messages(
+    project_id: str,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = 50,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Return ``(messages, has_more)`` in chronological order.
+
+    With ``after`` the oldest ``limit`` messages newer than that seq are
+    returned (``has_more``: newer ones remain); otherwise the newest
+    ``limit`` messages, older than ``before`` when given (``has_more``:
+    older ones remain).
+    """
+    query: Dict[str, Any] = {"project_id": project_id}
+    if after is not None:
+        query["seq"] = {"$gt": after}
+        order = ASCENDING
+    else:
+        if before is not None:
+            query["seq"] = {"$lt": before}
+        order = DESCENDING
+    docs = await db.chat_messages.find(query).sort("seq", order).limit(limit + 1).to_list(limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if order == DESCENDING:
+        docs.reverse()
+    return [_to_message(d) for d in docs], has_more
+
+
+async def get_message(project_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+    doc = await db.chat_messages.find_one({"_id": message_id, "project_id": project_id})
+    return _to_message(doc) if doc else None
+
+
+async def messages_after(project_id: str, seq: int) -> List[Dict[str, Any]]:
+    """All messages newer than ``seq``, oldest first."""
+    docs = await db.chat_messages.find({"project_id": project_id, "seq": {"$gt": seq}}).sort("seq", ASCENDING).to_list(None)
+    return [_to_message(d) for d in docs]
+
+
+async def latest_seq(project_id: str) -> int:
+    doc = await db.chats.find_one({"_id": project_id}, {"seq": 1})
+    return int((doc or {}).get("seq") or 0)
+
+
+def delete_messages(uow: UnitOfWork, project_id: str) -> UnitOfWork:
+    """Queue deletion of the project's messages and chat document on ``uow``."""
+    return uow.delete("chat_messages", {"project_id": project_id}).delete("chats", {"_id": project_id})
+
+
+async def migrate_embedded_messages(chat_doc: Dict[str, Any]) -> int:
+    """Move a legacy ``messages`` array into chat_messages; returns how many were moved.
+
+    Messages get seq 1..n in array order, so a stored summary's ``upto``
+    (a count of summarized messages) carries over as a seq unchanged. Safe
+    while other processes append (e.g. during a rolling deploy): messages
+    are upserted by seq and never replace one already stored, and the array
+    is only removed if nothing was pushed to it meanwhile.
+    """
+    project_id = chat_doc["_id"]
+    while True:
+        messages = chat_doc.get("messages") or []
+        if messages:
+            try:
+                await db.chat_messages.bulk_write([
+                    UpdateOne(
+                        {"project_id": project_id, "seq": i},
+                        {"$setOnInsert": {**m, "_id": str(uuid.uuid4()), "project_id": project_id, "seq": i}},
+                        upsert=True,
+                    )
+                    for i, m in enumerate(messages, start=1)
+                ], ordered=False)
+            except BulkWriteError as e:
+                # A concurrent upsert of the same seq won; anything else is a real failure
+                if any(err.get("code") != _DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                    raise
+        result = await db.chats.update_one(
+            {"_id": project_id, "messages": {"$size": len(messages)}},
+            {"$unset": {"messages": ""}, "$max": {"seq": len(messages)}},
+        )
+        if result.matched_count:
+            return len(messages)
+        # The array grew (or went away) since it was read
+        chat_doc = await db.chats.find_one({"_id": project_id})
+        if not chat_doc or "messages" not in chat_doc:
+            return len(messages)
+
+
+async def externalize_message_artifacts(message_doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Replace a legacy message's inline ``artifacts`` with an ``artifact_ref``; returns the ref.
+
+    Messages written since artifacts moved to the store name their version,
+    which is referenced as is; older ones are stored as a new version dated
+    with the message.
+    """
+    artifacts = message_doc.get("artifacts")
+    if not isinstance(artifacts, dict):
+        return None
+    project_id = message_doc["project_id"]
+    summary = await get_version(project_id, artifacts["version_id"]) if artifacts.get("version_id") else None
+    if summary is None:
+        files = [
+            {"path": str(f.get("path", "unknown")), "content": str(f.get("content", ""))}
+            for f in artifacts.get("files") or [] if isinstance(f, dict)
+        ]
+        info = {k: v for k, v in artifacts.items() if k not in ("files", "html_preview", "version_id")}
+        summary, _ = await save_artifacts(project_id, files, artifacts.get("html_preview") or "", info,
+                                          created_at=message_doc.get("timestamp"))
+    ref = artifact_ref(summary)
+    await db.chat_messages.update_one(
+        {"_id": message_doc["_id"]},
+        {"$set": {"artifact_ref": ref}, "$unset": {"artifacts": ""}},
+    )
+    return ref
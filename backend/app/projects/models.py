@@ -10,7 +10,9 @@ class Plan(BaseModel):
 
 class ArtifactFile(BaseModel):
     path: str
-    content: str
+    content: Optional[str] = None  # None when only the reference was loaded
+    hash: Optional[str] = None  # sha256 of content in artifact_blobs
+    size: Optional[int] = None
 
 class Artifacts(BaseModel):
     files: List[ArtifactFile] = []
@@ -20,6 +22,11 @@ class Artifacts(BaseModel):
     generated_at: Optional[datetime] = None
     provider: Optional[str] = None
     user_id: Optional[str] = None
+    version_id: Optional[str] = None  # artifact_versions entry; bodies live in artifact_blobs
+    html_preview_hash: Optional[str] = None
+    html_preview_size: Optional[int] = None
+    file_count: Optional[int] = None
+    total_bytes: Optional[int] = None
 
 class ProjectBase(BaseModel):
     name: str
@@ -34,6 +41,18 @@ class Project(ProjectBase):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ProjectListItem(BaseModel):
+    """A project as returned by list views; only the projected fields are set"""
+    id: str
+    name: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[str] = None
+    plan: Optional[Plan] = None
+    artifacts: Optional[Artifacts] = None
+    chat_history: Optional[List[Dict[str, Any]]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 class ProjectCreate(ProjectBase):
     pass
 
@@ -1,14 +1,38 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pymongo import UpdateOne
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import uuid
+import time
+import asyncio
+import base64
+import binascii
+import json
 import logging
+from ..auth.utils import get_current_user_optional
 from ..core.db import db
-from .models import Project, ProjectCreate
-from .services import compute_plan, doc_to_project
+from ..core.uow import UnitOfWork
+from ..core.writebehind import write_behind
+from .models import Project, ProjectCreate, ProjectListItem
+from .services import compute_plan, doc_to_list_item, doc_to_project
 from .quality import score_plan
+from .speculation import plan_speculator
+from .artifacts import delete_unreferenced_blobs, get_version, list_versions, load_artifacts, version_blob_hashes
+from .chat_store import delete_messages
 from ..llm.constants import is_allowed_model, ALLOWED_MODELS
+from ..jobs.models import JobAccepted
+from ..jobs.queue import enqueue_job
+from ..core.config import (
+    COMPARE_MAX_TIMEOUT_S,
+    COMPARE_MAX_VARIANTS,
+    SCAFFOLD_BATCH_CONCURRENCY,
+    SCAFFOLD_BATCH_MAX_ITEMS,
+    SCAFFOLD_BATCH_WRITE_SIZE,
+    SPECULATIVE_PLANNING,
+)
 
 router = APIRouter()
 logger = logging.getLogger("webmatic")
@@ -17,31 +41,128 @@ class ScaffoldRequest(BaseModel):
   provider: Optional[str] = "auto"  # "claude" | "gpt" | "auto"
   model: Optional[str] = None
   prompt: Optional[str] = None
+  cache: bool = True  # serve identical requests from the LLM cache
 
 class ProjectUpdate(BaseModel):
   name: Optional[str] = None
   description: Optional[str] = None
 
+class BatchScaffoldRequest(BaseModel):
+  project_ids: List[str] = []  # existing projects to plan
+  projects: List[ProjectCreate] = []  # created first, then planned
+  provider: Optional[str] = "auto"
+  model: Optional[str] = None
+  prompt: Optional[str] = None
+  cache: bool = True
+  concurrency: Optional[int] = None  # capped at SCAFFOLD_BATCH_CONCURRENCY
+
 @router.post("/projects", response_model=Project)
-async def create_project(payload: ProjectCreate):
+async def create_project(payload: ProjectCreate, speculate: bool = SPECULATIVE_PLANNING):
+    """Create a project; with ``speculate`` its plan starts computing in the background
+
+    A later scaffold with the default provider adopts the speculative plan
+    instead of waiting for the LLM (see app/projects/speculation.py).
+    """
     project = Project(**payload.dict())
     doc = project.dict()
     doc["_id"] = project.id
     await db.projects.insert_one(doc)
+    if speculate:
+        plan_speculator.start(project.id, project.description)
     return project
 
-@router.get("/projects", response_model=List[Project])
-async def list_projects():
-    docs = await db.projects.find().sort("created_at", -1).to_list(500)
-    return [doc_to_project(d) for d in docs]
+# Left out of list views unless asked for with ``fields``
+_HEAVY_LIST_FIELDS = {"artifacts.files": 0, "artifacts.html_preview": 0, "chat_history": 0, "pending_plan": 0}
+
+def _encode_cursor(doc: Dict[str, Any]) -> str:
+    raw = json.dumps({"t": doc["created_at"].isoformat(), "id": doc["_id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return {"created_at": datetime.fromisoformat(data["t"]), "_id": str(data["id"])}
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _list_projection(fields: Optional[str]) -> Dict[str, Any]:
+    if not fields:
+        return dict(_HEAVY_LIST_FIELDS)
+    requested = {f.strip() for f in fields.split(",") if f.strip()} - {"id"}
+    unknown = requested - set(ProjectListItem.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+    # created_at is always needed for the next cursor
+    return {"_id": 1, "created_at": 1, **{f: 1 for f in requested}}
+
+@router.get("/projects", response_model=List[ProjectListItem], response_model_exclude_unset=True)
+async def list_projects(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """List projects newest first, one page at a time
+
+    Pages are keyed on ``(created_at, _id)``: pass the ``X-Next-Cursor``
+    header of a response as ``cursor`` to get the next page (the header is
+    absent on the last page). ``fields`` is a comma-separated list of
+    top-level fields to return; by default everything except the artifact
+    files, the HTML preview and legacy chat history is returned.
+    """
+    query: Dict[str, Any] = {}
+    if cursor:
+        after = _decode_cursor(cursor)
+        query = {"$or": [
+            {"created_at": {"$lt": after["created_at"]}},
+            {"created_at": after["created_at"], "_id": {"$lt": after["_id"]}},
+        ]}
+    docs = await (
+        db.projects.find(query, _list_projection(fields))
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(docs[-1])
+    return [doc_to_list_item(d) for d in docs]
 
 @router.get("/projects/{project_id}", response_model=Project)
-async def get_project(project_id: str):
+async def get_project(project_id: str, include: Optional[str] = None):
+    """Get a project; artifact bodies are only loaded with ``include=artifacts``"""
     doc = await db.projects.find_one({"_id": project_id})
     if not doc:
         raise HTTPException(status_code=404, detail="Project not found")
+    if include and "artifacts" in include.split(","):
+        doc["artifacts"] = await load_artifacts(doc.get("artifacts"))
     return doc_to_project(doc)
 
+@router.get("/projects/{project_id}/artifacts")
+async def get_project_artifacts(project_id: str, version: Optional[str] = None, paths: Optional[str] = None):
+    """Artifact bodies of the latest (or given) version; ``paths`` limits which files are loaded
+
+    Include ``html_preview`` in ``paths`` to get the preview along with a subset of files.
+    """
+    if version:
+        artifacts = await get_version(project_id, version)
+        if artifacts is None:
+            raise HTTPException(status_code=404, detail="Artifact version not found")
+    else:
+        doc = await db.projects.find_one({"_id": project_id}, {"artifacts": 1})
+        if not doc:
+            raise HTTPException(status_code=404, detail="Project not found")
+        artifacts = doc.get("artifacts")
+        if not artifacts:
+            raise HTTPException(status_code=404, detail="Project has no artifacts")
+    wanted = [p.strip() for p in paths.split(",") if p.strip()] if paths else None
+    return await load_artifacts(artifacts, wanted)
+
+@router.get("/projects/{project_id}/artifacts/versions")
+async def list_artifact_versions(project_id: str, limit: int = Query(50, ge=1, le=200)) -> List[Dict[str, Any]]:
+    """Generated versions newest first, without file lists"""
+    return await list_versions(project_id, limit)
+
 @router.patch("/projects/{project_id}", response_model=Project)
 async def update_project(project_id: str, payload: ProjectUpdate):
     doc = await db.projects.find_one({"_id": project_id})
@@ -54,34 +175,56 @@ async def update_project(project_id: str, payload: ProjectUpdate):
         updates["description"] = payload.description
     if updates:
         updates["updated_at"] = datetime.utcnow()
-        await db.projects.update_one({"_id": project_id}, {"$set": updates})
+        change: Dict[str, Any] = {"$set": updates}
+        if payload.description is not None and payload.description != doc.get("description"):
+            # A speculative plan for the old description is useless now
+            plan_speculator.discard(project_id)
+            change["$unset"] = {"pending_plan": ""}
+        await db.projects.update_one({"_id": project_id}, change)
     new_doc = await db.projects.find_one({"_id": project_id})
     return doc_to_project(new_doc)
 
 @router.delete("/projects/{project_id}")
 async def delete_project(project_id: str):
     # Check if project exists
-    doc = await db.projects.find_one({"_id": project_id})
+    doc = await db.projects.find_one({"_id": project_id}, {"_id": 1})
     if not doc:
         raise HTTPException(status_code=404, detail="Project not found")
-    
-    # Delete the project
-    await db.projects.delete_one({"_id": project_id})
-    
-    # Clean up related data
-    await db.chats.delete_many({"_id": project_id})
-    await db.runs.delete_many({"project_id": project_id})
+
+    # Buffered runs are written first so none outlive the project
+    await write_behind.flush()
+    # Read the blob hashes before their versions go
+    versions = await db.artifact_versions.find(
+        {"project_id": project_id}, {"files.hash": 1, "html_preview_hash": 1},
+    ).to_list(None)
+
+    # The project and its related data go together (atomically where transactions are available)
+    uow = UnitOfWork().delete("projects", {"_id": project_id})
+    delete_messages(uow, project_id)
+    await (
+        uow.delete("runs", {"project_id": project_id})
+        .delete("artifact_versions", {"project_id": project_id})
+        .commit()
+    )
+    plan_speculator.discard(project_id)
+
+    # Blobs are content-addressed and may be shared with other projects: only
+    # those no remaining version refers to are deleted
+    await delete_unreferenced_blobs(version_blob_hashes(versions))
     
     return {"ok": True, "message": f"Project {project_id} deleted successfully"}
 
 @router.get("/projects/{project_id}/runs")
 async def list_runs(project_id: str) -> List[Dict[str, Any]]:
+    # Runs are written behind the request that produced them
+    await write_behind.flush()
     docs = await db.runs.find({"project_id": project_id}).sort("created_at", -1).to_list(200)
     out = []
     for d in docs:
         out.append({
             "id": d.get("_id"),
             "project_id": d.get("project_id"),
+            "kind": d.get("kind", "plan"),
             "provider": d.get("provider"),
             "model": d.get("model"),
             "mode": d.get("mode"),
@@ -89,39 +232,33 @@ async def list_runs(project_id: str) -> List[Dict[str, Any]]:
             "error": d.get("error"),
             "plan_counts": d.get("plan_counts", {}),
             "quality_score": d.get("quality_score"),
+            "meta": d.get("meta", {}),
             "created_at": d.get("created_at"),
         })
     return out
 
-@router.post("/projects/{project_id}/scaffold", response_model=Project)
-async def scaffold_project(project_id: str, payload: ScaffoldRequest | None = None):
-    doc = await db.projects.find_one({"_id": project_id})
-    if not doc:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    provider = (payload.provider if payload else "auto") if payload else "auto"
-    model = payload.model if payload else None
-    prompt = payload.prompt if payload else None
-
-    if model and not is_allowed_model(model):
-        logger.warning(f"Rejected unsupported model '{model}'. Allowed: {sorted(ALLOWED_MODELS)}")
-        raise HTTPException(status_code=400, detail=f"Unsupported model. Allowed: {sorted(ALLOWED_MODELS)}")
-
+async def _plan_project(doc: Dict[str, Any], provider: str, model: Optional[str], prompt: Optional[str], use_cache: bool):
+    """Plan a project document; returns ``(project, set_fields, run_doc)`` for the caller to write"""
+    project_id = doc["_id"]
     prj = doc_to_project(doc)
 
-    plan, meta = await compute_plan(prj.description, provider, model, prompt)
+    # Adopt the plan speculated at creation when it was made for this request
+    adopted, speculation = await plan_speculator.take(project_id, doc, provider, model, use_cache)
+    if adopted is not None:
+        plan, meta = adopted
+    else:
+        plan, meta = await compute_plan(prj.description, provider, model, prompt, use_cache=use_cache)
+    if speculation is not None:
+        meta["speculative"] = speculation
     prj.plan = plan
     prj.status = "planned"
     prj.updated_at = datetime.utcnow()
 
-    await db.projects.update_one(
-        {"_id": project_id},
-        {"$set": {
-            "plan": plan.dict(),
-            "status": prj.status,
-            "updated_at": prj.updated_at,
-        }}
-    )
+    set_fields = {
+        "plan": plan.dict(),
+        "status": prj.status,
+        "updated_at": prj.updated_at,
+    }
 
     # Record a run for history
     q, qd = score_plan(plan)
@@ -140,17 +277,164 @@ async def scaffold_project(project_id: str, payload: ScaffoldRequest | None = No
         },
         "quality_score": q,
         "quality_detail": qd,
+        "meta": meta,
         "created_at": datetime.utcnow(),
     }
-    await db.runs.insert_one(run_doc)
+    return prj, set_fields, run_doc
+
+async def run_scaffold(project_id: str, provider: str = "auto", model: Optional[str] = None, prompt: Optional[str] = None, use_cache: bool = True) -> Project:
+    """Plan a project and record the run; shared by the endpoint and the job worker"""
+    doc = await db.projects.find_one({"_id": project_id})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    _, set_fields, run_doc = await _plan_project(doc, provider, model, prompt, use_cache)
+    doc = await UnitOfWork().update_returning("projects", {"_id": project_id}, {"$set": set_fields}).commit()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Project not found")
+    # Run history is written behind the response
+    await write_behind.put("runs", run_doc)
+
+    return doc_to_project(doc)
+
+@router.post("/projects/{project_id}/scaffold", response_model=Project)
+async def scaffold_project(project_id: str, payload: ScaffoldRequest | None = None, background: bool = False,
+                          current_user: Optional[dict] = Depends(get_current_user_optional)):
+    provider = (payload.provider if payload else "auto") if payload else "auto"
+    model = payload.model if payload else None
+    prompt = payload.prompt if payload else None
+    use_cache = payload.cache if payload else True
+
+    if model and not is_allowed_model(model):
+        logger.warning(f"Rejected unsupported model '{model}'. Allowed: {sorted(ALLOWED_MODELS)}")
+        raise HTTPException(status_code=400, detail=f"Unsupported model. Allowed: {sorted(ALLOWED_MODELS)}")
+
+    if background:
+        if not await db.projects.find_one({"_id": project_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Project not found")
+        job_id = await enqueue_job("scaffold", {
+            "project_id": project_id, "provider": provider, "model": model, "prompt": prompt, "use_cache": use_cache,
+        }, user_id=(current_user or {}).get("sub"))
+        return _accepted(JobAccepted(job_id=job_id, type="scaffold", project_id=project_id))
+
+    return await run_scaffold(project_id, provider, model, prompt, use_cache)
+
+def _ndjson(data: Dict[str, Any]) -> str:
+    return json.dumps(jsonable_encoder(data)) + "\n"
+
+@router.post("/projects/scaffold:batch")
+async def scaffold_batch(payload: BatchScaffoldRequest):
+    """Plan many projects concurrently, streaming one NDJSON line per project as it finishes
+
+    Plans run at most ``concurrency`` at a time; finished results are written
+    with one bulk project update per group (runs go to the write-behind buffer),
+    then streamed as ``{"project_id", "status": "planned", "project", ...}``
+    or ``{"project_id", "status": "error", "error"}``. A final line
+    ``{"done": true, ...}`` summarizes the batch.
+    """
+    provider = payload.provider or "auto"
+    model = payload.model
+    if model and not is_allowed_model(model):
+        logger.warning(f"Rejected unsupported model '{model}'. Allowed: {sorted(ALLOWED_MODELS)}")
+        raise HTTPException(status_code=400, detail=f"Unsupported model. Allowed: {sorted(ALLOWED_MODELS)}")
+    project_ids = list(dict.fromkeys(payload.project_ids))
+    total = len(project_ids) + len(payload.projects)
+    if not total:
+        raise HTTPException(status_code=400, detail="Provide project_ids or projects")
+    if total > SCAFFOLD_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {SCAFFOLD_BATCH_MAX_ITEMS} projects per batch")
+
+    created = [Project(**p.dict()) for p in payload.projects]
+    if created:
+        await db.projects.insert_many([{**p.dict(), "_id": p.id} for p in created])
+    found = {d["_id"]: d for d in await db.projects.find({"_id": {"$in": project_ids}}).to_list(None)} if project_ids else {}
+    docs = [found[pid] for pid in project_ids if pid in found] + [{**p.dict(), "_id": p.id} for p in created]
+    missing = [pid for pid in project_ids if pid not in found]
+    concurrency = max(1, min(payload.concurrency or SCAFFOLD_BATCH_CONCURRENCY, SCAFFOLD_BATCH_CONCURRENCY))
+
+    async def results():
+        started = time.monotonic()
+        counts = {"planned": 0, "error": len(missing)}
+        for pid in missing:
+            yield _ndjson({"project_id": pid, "status": "error", "error": "Project not found"})
+
+        semaphore = asyncio.Semaphore(concurrency)
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def plan_one(doc: Dict[str, Any]) -> None:
+            project_id = doc["_id"]
+            async with semaphore:
+                try:
+                    finished.put_nowait((project_id, await _plan_project(doc, provider, model, payload.prompt, payload.cache), None))
+                except Exception as e:
+                    logger.warning(f"Batch scaffold of {project_id} failed: {e}")
+                    finished.put_nowait((project_id, None, str(e)))
 
-    return prj
+        tasks = [asyncio.ensure_future(plan_one(doc)) for doc in docs]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                # Write whatever has finished by now in one round trip per collection
+                group = [await finished.get()]
+                while len(group) < SCAFFOLD_BATCH_WRITE_SIZE and not finished.empty():
+                    group.append(finished.get_nowait())
+                remaining -= len(group)
+                planned = [(pid, result) for pid, result, _ in group if result is not None]
+                if planned:
+                    await db.projects.bulk_write(
+                        [UpdateOne({"_id": pid}, {"$set": set_fields}) for pid, (_, set_fields, _) in planned],
+                        ordered=False,
+                    )
+                    for _, (_, _, run_doc) in planned:
+                        await write_behind.put("runs", run_doc)
+                for pid, result, error in group:
+                    if result is None:
+                        counts["error"] += 1
+                        yield _ndjson({"project_id": pid, "status": "error", "error": error})
+                        continue
+                    prj, _, run_doc = result
+                    counts["planned"] += 1
+                    yield _ndjson({
+                        "project_id": pid,
+                        "status": "planned",
+                        "run_id": run_doc["_id"],
+                        "mode": run_doc["mode"],
+                        "project": prj,
+                    })
+        finally:
+            # Client went away or a write failed: stop planning the rest
+            for task in tasks:
+                task.cancel()
+        yield _ndjson({
+            "done": True, "total": total, **counts,
+            "concurrency": concurrency, "elapsed_s": round(time.monotonic() - started, 3),
+        })
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def _accepted(job: JobAccepted) -> JSONResponse:
+    return JSONResponse(status_code=202, content=job.dict())
 
 # ---------- Provider comparison ----------
+DEFAULT_COMPARE_COMBOS = [
+    ("claude", "claude-4-sonnet"),
+    ("gpt", "gpt-5"),
+]
+
+class CompareVariant(BaseModel):
+    provider: str
+    model: Optional[str] = None
+
+class CompareRequest(BaseModel):
+    variants: Optional[List[CompareVariant]] = Field(None, max_length=COMPARE_MAX_VARIANTS)  # defaults to DEFAULT_COMPARE_COMBOS
+    timeout_s: float = Field(60.0, gt=0, le=COMPARE_MAX_TIMEOUT_S)  # per variant
+    cache: bool = True
+
 class CompareResponse(BaseModel):
     baseline: Dict[str, Any]
     variants: List[Dict[str, Any]]
     diff: Dict[str, Any]
+    diff_matrix: List[Dict[str, Any]] = []
 
 
 def _list_to_set_map(plan_list: List[str]) -> set:
@@ -170,52 +454,110 @@ def _diff_plans(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
         }
     return out
 
-@router.post("/projects/{project_id}/compare-providers")
-async def compare_providers(project_id: str):
-    doc = await db.projects.find_one({"_id": project_id})
+
+def _diff_matrix(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Pairwise diffs (upper triangle) between every variant that returned a plan."""
+    done = [(i, r) for i, r in enumerate(results) if r.get("plan")]
+    out = []
+    for x, (i, ra) in enumerate(done):
+        for j, rb in done[x + 1:]:
+            d = _diff_plans(ra["plan"], rb["plan"])
+            union = sum(len(v["only_in_a"]) + len(v["only_in_b"]) + len(v["overlap"]) for v in d.values())
+            overlap = sum(len(v["overlap"]) for v in d.values())
+            out.append({
+                "a": i,
+                "b": j,
+                "similarity": round(overlap / union, 3) if union else 1.0,
+                "diff": d,
+            })
+    return out
+
+
+async def _run_variant(description: str, provider: str, model: Optional[str], timeout_s: float, use_cache: bool) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        plan, meta = await asyncio.wait_for(compute_plan(description, provider, model, use_cache=use_cache), timeout_s)
+    except asyncio.TimeoutError:
+        return {
+            "provider": provider,
+            "model": model,
+            "status": "timeout",
+            "plan": None,
+            "meta": {"mode": "timeout", "provider": provider, "error": f"Timed out after {timeout_s}s"},
+            "elapsed_ms": int((time.perf_counter() - started) * 1000),
+        }
+    return {
+        "provider": provider,
+        "model": model,
+        "status": "success",
+        "plan": plan.dict(),
+        "meta": meta,
+        "elapsed_ms": int((time.perf_counter() - started) * 1000),
+    }
+
+
+async def run_compare(project_id: str, payload: CompareRequest) -> CompareResponse:
+    """Fan out planning across variants; shared by the endpoint and the job worker"""
+    doc = await db.projects.find_one({"_id": project_id}, {"description": 1})
     if not doc:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    prj = doc_to_project(doc)
+    if payload.variants:
+        combos = [(v.provider, v.model) for v in payload.variants]
+    else:
+        combos = list(DEFAULT_COMPARE_COMBOS)
 
-    combos = [
-        ("claude", "claude-4-sonnet"),
-        ("gpt", "gpt-5"),
-    ]
+    # All variants run concurrently; wall time is bounded by the slowest (or the timeout)
+    results = await asyncio.gather(*[
+        _run_variant(doc.get("description", ""), provider, model, payload.timeout_s, payload.cache)
+        for provider, model in combos
+    ])
 
-    results = []
-    for provider, model in combos:
-        plan, meta = await compute_plan(prj.description, provider, model)
-        # store run record but do not update project
-        q, qd = score_plan(plan)
+    # store run records (behind the response) but do not update project
+    for r in results:
         run_doc = {
             "_id": str(uuid.uuid4()),
             "project_id": project_id,
-            "provider": meta.get("provider"),
-            "model": meta.get("model"),
-            "mode": meta.get("mode"),
-            "status": "success",
-            "plan_counts": {
-                "frontend": len(plan.frontend or []),
-                "backend": len(plan.backend or []),
-                "database": len(plan.database or []),
-            },
-            "quality_score": q,
-            "quality_detail": qd,
+            "provider": r["meta"].get("provider"),
+            "model": r["model"],
+            "mode": r["meta"].get("mode"),
+            "status": r["status"],
+            "error": r["meta"].get("error"),
+            "meta": r["meta"],
             "created_at": datetime.utcnow(),
         }
-        await db.runs.insert_one(run_doc)
-        results.append({
-            "provider": provider,
-            "model": model,
-            "plan": plan.dict(),
-            "meta": meta,
-        })
+        if r["plan"]:
+            plan = r["plan"]
+            q, qd = score_plan(plan)
+            run_doc["plan_counts"] = {k: len(plan.get(k) or []) for k in ("frontend", "backend", "database")}
+            run_doc["quality_score"] = q
+            run_doc["quality_detail"] = qd
+        await write_behind.put("runs", run_doc)
 
-    # first is baseline
-    baseline = results[0]
-    variants = results[1:]
+    # baseline is the first variant, in request order, that produced a plan
+    ordered = [r for r in results if r["plan"]] + [r for r in results if not r["plan"]]
+    baseline = ordered[0]
+    variants = ordered[1:]
+
+    diff = _diff_plans(baseline["plan"], variants[0]["plan"]) if variants and baseline["plan"] and variants[0]["plan"] else {}
+
+    return CompareResponse(baseline=baseline, variants=variants, diff=diff, diff_matrix=_diff_matrix(ordered))
+
+
+@router.post("/projects/{project_id}/compare-providers")
+async def compare_providers(project_id: str, payload: CompareRequest | None = None, background: bool = False,
+                            current_user: Optional[dict] = Depends(get_current_user_optional)):
+    payload = payload or CompareRequest()
+    for v in payload.variants or []:
+        if v.model and not is_allowed_model(v.model):
+            logger.warning(f"Rejected unsupported model '{v.model}'. Allowed: {sorted(ALLOWED_MODELS)}")
+            raise HTTPException(status_code=400, detail=f"Unsupported model. Allowed: {sorted(ALLOWED_MODELS)}")
 
-    diff = _diff_plans(baseline["plan"], variants[0]["plan"]) if variants else {}
+    if background:
+        if not await db.projects.find_one({"_id": project_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Project not found")
+        job_id = await enqueue_job("compare", {"project_id": project_id, "request": payload.dict()},
+                                   user_id=(current_user or {}).get("sub"))
+        return _accepted(JobAccepted(job_id=job_id, type="compare", project_id=project_id))
 
-    return CompareResponse(baseline=baseline, variants=variants, diff=diff)
\ No newline at end of file
+    return await run_compare(project_id, payload)
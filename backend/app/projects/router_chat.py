@@ -1,11 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 from pydantic import BaseModel
 import uuid
 from ..auth.utils import get_current_user_optional
 from ..core.db import db
 from .services import doc_to_project
+from .artifacts import get_version, load_artifacts
+from .chat_store import append_message, fetch_messages, get_message, latest_seq
 
 router = APIRouter()
 
@@ -19,13 +21,29 @@ class AppendChatRequest(BaseModel):
     role: str = "user"
 
 @router.get("/projects/{project_id}/chat")
-async def get_chat_history(project_id: str):
-    """Get chat history for a project - no auth required for reading"""
-    chat_doc = await db.chats.find_one({"_id": project_id})
-    if not chat_doc:
-        return {"messages": []}
-    
-    return {"messages": chat_doc.get("messages", [])}
+async def get_chat_history(
+    project_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    since_seq: Optional[int] = None,
+):
+    """Get chat history for a project - no auth required for reading
+
+    Returns the newest ``limit`` messages (oldest first). Page back with
+    ``before=<seq of the first message>``; poll for new messages with
+    ``since_seq=<latest_seq from the last response>`` (``after`` is the same
+    cursor). ``has_more`` says whether messages remain in that direction.
+    """
+    if before is not None and (after is not None or since_seq is not None):
+        raise HTTPException(status_code=400, detail="Use either before or after/since_seq")
+    after = after if after is not None else since_seq
+    messages, has_more = await fetch_messages(project_id, before=before, after=after, limit=limit)
+    return {
+        "messages": messages,
+        "has_more": has_more,
+        "latest_seq": await latest_seq(project_id),
+    }
 
 @router.post("/projects/{project_id}/chat")
 async def append_chat_message(
@@ -35,7 +53,7 @@ async def append_chat_message(
 ):
     """Append message to chat history - auth optional"""
     # Verify project exists
-    project_doc = await db.projects.find_one({"_id": project_id})
+    project_doc = await db.projects.find_one({"_id": project_id}, {"_id": 1})
     if not project_doc:
         raise HTTPException(status_code=404, detail="Project not found")
     
@@ -46,14 +64,25 @@ async def append_chat_message(
         "user_id": current_user.get("sub") if current_user else None
     }
     
-    # Upsert chat document
-    await db.chats.update_one(
-        {"_id": project_id},
-        {
-            "$push": {"messages": message},
-            "$set": {"updated_at": datetime.utcnow()}
-        },
-        upsert=True
-    )
+    message = await append_message(project_id, message)
     
-    return {"success": True, "message": message}
\ No newline at end of file
+    return {"success": True, "message": message}
+
+@router.get("/projects/{project_id}/chat/{message_id}/artifacts")
+async def get_message_artifacts(project_id: str, message_id: str, paths: Optional[str] = None):
+    """Resolve a message's ``artifact_ref`` to the artifacts it produced; ``paths`` is a comma-separated subset"""
+    message = await get_message(project_id, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
+    ref = message.get("artifact_ref")
+    if ref:
+        artifacts = await get_version(project_id, ref["version_id"])
+        if artifacts is None:
+            raise HTTPException(status_code=404, detail="Artifact version not found")
+    elif message.get("artifacts"):
+        # Not yet backfilled: the artifacts are still inline
+        artifacts = message["artifacts"]
+    else:
+        raise HTTPException(status_code=404, detail="Message has no artifacts")
+    wanted = [p.strip() for p in paths.split(",") if p.strip()] if paths else None
+    return await load_artifacts(artifacts, wanted)
@@ -1,84 +1,365 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import Optional, Dict, Any
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, JSONResponse
+from typing import Optional, Dict, Any, List, Set
 from datetime import datetime
 from pydantic import BaseModel
+import asyncio
+import json
+import logging
 import uuid
 from ..auth.utils import get_current_user  # Requires auth
 from ..core.db import db
-from ..llm.generator import generate_code_from_llm, stub_generate_code
+from ..core.writebehind import write_behind
+from ..llm.generator import generate_code_from_llm, stream_code_from_llm, stub_generate_code, generation_target
+from ..llm.context import build_chat_context
+from ..llm.patcher import PatchError, patch_code_from_llm
+from ..llm.pipeline import generate_with_pipeline
+from ..llm.metrics import collect_metrics, current_run
+from ..llm.breaker import CircuitOpenError, breaker_state, is_available
+from ..llm.constants import ALTERNATE_PROVIDERS
+from ..core.config import LLM_BREAKER_ALTERNATE
+from ..jobs.models import JobAccepted
+from ..jobs.queue import enqueue_job
 from .services import doc_to_project
+from .artifacts import artifact_ref, load_artifacts, save_artifacts
+from .chat_store import append_message
 
 router = APIRouter()
+logger = logging.getLogger("webmatic")
 
 class GenerateRequest(BaseModel):
     provider: str = "claude"  # "claude" | "gpt"
     prompt: str
+    cache: bool = True  # serve identical requests from the LLM cache
+    incremental: bool = False  # patch the current artifacts instead of regenerating them
+    pipeline: bool = False  # manifest first, then each file in parallel
 
-@router.post("/projects/{project_id}/generate")
-async def generate_code(
-    project_id: str,
-    request: GenerateRequest,
-    current_user: dict = Depends(get_current_user)  # Auth required
-):
-    """Generate code and preview for a project - requires authentication"""
-    
-    # Get project
+async def _load_generation_context(project_id: str):
     project_doc = await db.projects.find_one({"_id": project_id})
     if not project_doc:
         raise HTTPException(status_code=404, detail="Project not found")
-    
+
     project = doc_to_project(project_doc)
-    
-    # Get chat history for context
-    chat_doc = await db.chats.find_one({"_id": project_id})
-    messages = chat_doc.get("messages", []) if chat_doc else []
-    
-    # Try LLM, fallback to stub
-    mode = "ai"
-    error = None
-    try:
-        out = await generate_code_from_llm(project.description, messages, request.provider)
-        mode = "ai"
-    except Exception as e:
-        out = stub_generate_code(project.description, messages)
-        mode = "stub"
-        error = str(e)
-    
-    # Create artifacts object
-    artifacts = {
-        "files": out.get("files", []),
-        "html_preview": out.get("html_preview", ""),
+
+    # Get chat history for context: recent messages plus a rolling summary of older ones
+    messages, summary = await build_chat_context(project_id)
+    return project, messages, summary
+
+async def _persist_generation(
+    project_id: str,
+    out: Dict[str, Any],
+    mode: str,
+    error: Optional[str],
+    provider: str,
+    current_user: dict,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    # Store the bodies by content hash; the project keeps only the summary
+    summary, artifacts = await save_artifacts(project_id, out.get("files", []), out.get("html_preview", ""), {
         "mode": mode,
         "error": error,
         "generated_at": datetime.utcnow(),
-        "provider": request.provider,
+        "provider": provider,
         "user_id": current_user.get("sub")
-    }
-    
+    })
+
     # Update project with artifacts
     await db.projects.update_one(
         {"_id": project_id},
         {
             "$set": {
-                "artifacts": artifacts,
+                "artifacts": summary,
                 "updated_at": datetime.utcnow()
             }
         }
     )
-    
-    # Add assistant response to chat
+
+    # Add assistant response to chat; it references the version rather than embedding it
     if mode == "ai" and out.get("files"):
         assistant_message = {
-            "role": "assistant", 
+            "role": "assistant",
             "content": f"Generated {len(out['files'])} file(s) and preview",
             "timestamp": datetime.utcnow(),
-            "artifacts": artifacts
+            "artifact_ref": artifact_ref(summary)
         }
-        
-        await db.chats.update_one(
-            {"_id": project_id},
-            {"$push": {"messages": assistant_message}},
-            upsert=True
+
+        await append_message(project_id, assistant_message)
+
+    # Record a run for history
+    meta = dict(meta or {})
+    meta.setdefault("parse_path", out.get("parse_path"))
+    meta.setdefault("cache", out.get("cache"))
+    if out.get("hedge"):
+        meta.setdefault("hedge", out["hedge"])
+    run = current_run()
+    if run is not None:
+        meta.setdefault("metrics", run.summary())
+    run_doc = {
+        "_id": str(uuid.uuid4()),
+        "project_id": project_id,
+        "kind": "generate",
+        "provider": provider,
+        "model": generation_target(provider)[1] if mode == "ai" else None,
+        "mode": mode,
+        "status": "success",
+        "error": error,
+        "file_count": len(artifacts["files"]),
+        "meta": meta,
+        "created_at": datetime.utcnow(),
+    }
+    await write_behind.put("runs", run_doc)
+
+    return artifacts
+
+def _breaker_info(provider: str) -> Dict[str, Any]:
+    target = generation_target(provider)
+    return {"name": f"{target[0]}/{target[1]}", "state": breaker_state(*target)}
+
+async def _generate_with_fallback(description: str, messages: List[Dict[str, Any]], summary: str, provider: str, use_cache: bool,
+                                  project_id: Optional[str] = None):
+    """Return ``(out, mode, error, provider_used, meta)``.
+
+    An open breaker skips straight to the alternate provider (when its own
+    breaker allows) or to the stub; other LLM errors fall back to the stub.
+    """
+    meta: Dict[str, Any] = {}
+    try:
+        out = await generate_code_from_llm(
+            description, messages, provider, use_cache=use_cache, summary=summary, project_id=project_id,
         )
-    
-    return artifacts
\ No newline at end of file
+        meta["breaker"] = _breaker_info(provider)
+        return out, "ai", None, provider, meta
+    except CircuitOpenError as e:
+        error = str(e)
+        meta["breaker"] = {**_breaker_info(provider), "state": "open"}
+        alternate = ALTERNATE_PROVIDERS.get((provider or "auto").lower()) if LLM_BREAKER_ALTERNATE else None
+        if alternate and is_available(*generation_target(alternate)):
+            try:
+                out = await generate_code_from_llm(
+                    description, messages, alternate, use_cache=use_cache, summary=summary, project_id=project_id,
+                )
+                meta["fallback_from"] = provider
+                return out, "ai", None, alternate, meta
+            except Exception as alt_error:
+                error = str(alt_error)
+    except Exception as e:
+        error = str(e)
+        meta["breaker"] = _breaker_info(provider)
+    return stub_generate_code(description, messages), "stub", error, provider, meta
+
+async def _patch_with_llm(project, messages: List[Dict[str, Any]], summary: str, provider: str, prompt: str, use_cache: bool):
+    """Return ``(out, info)``; ``out`` is None when a full regeneration is needed."""
+    request = (prompt or "").strip() or next(
+        (m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""
+    )
+    if not request:
+        return None, {"applied": False, "error": "no change request"}
+    current = await load_artifacts(project.artifacts.dict())
+    files = [{"path": f["path"], "content": f["content"] or ""} for f in current["files"]]
+    try:
+        out = await patch_code_from_llm(
+            project.description, messages, files, current.get("html_preview") or "",
+            request, provider, use_cache=use_cache, summary=summary, project_id=project.id,
+        )
+    except CircuitOpenError:
+        # The full path handles open breakers (alternate provider or stub)
+        return None, {"applied": False, "error": "circuit open"}
+    except (PatchError, RuntimeError) as e:
+        logger.info(f"Incremental generation for {project.id} fell back to full: {e}")
+        return None, {"applied": False, "error": str(e)}
+    return out, {"applied": True, **out.pop("patch", {})}
+
+async def run_generation(
+    project_id: str,
+    provider: str,
+    current_user: dict,
+    use_cache: bool = True,
+    incremental: bool = False,
+    prompt: str = "",
+    pipeline: bool = False,
+) -> Dict[str, Any]:
+    """Generate and persist artifacts; shared by the endpoint and the job worker
+
+    With ``incremental`` the current artifacts are patched; a full
+    regeneration runs only if there is nothing to patch or the patches do
+    not apply. With ``pipeline`` a full regeneration goes through the
+    manifest-then-files pipeline, falling back to a single completion.
+    Every LLM call made along the way is recorded in the run's ``metrics``.
+    """
+    with collect_metrics():
+        return await _run_generation(project_id, provider, current_user, use_cache, incremental, prompt, pipeline)
+
+async def _run_generation(
+    project_id: str,
+    provider: str,
+    current_user: dict,
+    use_cache: bool,
+    incremental: bool,
+    prompt: str,
+    pipeline: bool,
+) -> Dict[str, Any]:
+    project, messages, summary = await _load_generation_context(project_id)
+
+    patch_info = None
+    if incremental and project.artifacts and project.artifacts.files:
+        out, patch_info = await _patch_with_llm(project, messages, summary, provider, prompt, use_cache)
+        if out is not None:
+            meta = {"breaker": _breaker_info(provider), "incremental": patch_info}
+            return await _persist_generation(project_id, out, "ai", None, provider, current_user, meta)
+
+    pipeline_info = None
+    if pipeline:
+        try:
+            out = await generate_with_pipeline(
+                project.description, messages, provider, use_cache=use_cache, summary=summary, project_id=project_id,
+            )
+        except Exception as e:
+            # Includes an open breaker; the single-completion path handles that
+            logger.info(f"Pipeline generation for {project_id} fell back to a single completion: {e}")
+            pipeline_info = {"applied": False, "error": str(e)}
+        else:
+            meta = {"breaker": _breaker_info(provider), "pipeline": {"applied": True, **out.pop("pipeline", {})}}
+            if patch_info is not None:
+                meta["incremental"] = patch_info
+            return await _persist_generation(project_id, out, "ai", None, provider, current_user, meta)
+
+    # Try LLM, fallback to alternate provider or stub
+    out, mode, error, used, meta = await _generate_with_fallback(
+        project.description, messages, summary, provider, use_cache, project_id,
+    )
+    if patch_info is not None:
+        meta["incremental"] = patch_info
+    if pipeline_info is not None:
+        meta["pipeline"] = pipeline_info
+
+    return await _persist_generation(project_id, out, mode, error, used, current_user, meta)
+
+@router.post("/projects/{project_id}/generate")
+async def generate_code(
+    project_id: str,
+    request: GenerateRequest,
+    background: bool = False,
+    current_user: dict = Depends(get_current_user)  # Auth required
+):
+    """Generate code and preview for a project - requires authentication"""
+    if background:
+        if not await db.projects.find_one({"_id": project_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Project not found")
+        job_id = await enqueue_job("generate", {
+            "project_id": project_id,
+            "provider": request.provider,
+            "use_cache": request.cache,
+            "incremental": request.incremental,
+            "pipeline": request.pipeline,
+            "prompt": request.prompt,
+            "user": {"sub": current_user.get("sub")},
+        }, user_id=current_user.get("sub"))
+        job = JobAccepted(job_id=job_id, type="generate", project_id=project_id)
+        return JSONResponse(status_code=202, content=job.dict())
+
+    return await run_generation(
+        project_id, request.provider, current_user,
+        use_cache=request.cache, incremental=request.incremental, prompt=request.prompt,
+        pipeline=request.pipeline,
+    )
+
+# Streamed generations run detached from their response; referenced here until done
+_detached: Set[asyncio.Task] = set()
+
+def _detach(coro) -> asyncio.Task:
+    task = asyncio.ensure_future(coro)
+    _detached.add(task)
+    task.add_done_callback(_detached.discard)
+    return task
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@router.post("/projects/{project_id}/generate/stream")
+async def generate_code_stream(
+    project_id: str,
+    request: GenerateRequest,
+    current_user: dict = Depends(get_current_user)  # Auth required
+):
+    """Stream code generation as Server-Sent Events - requires authentication
+
+    Events: ``delta`` (raw model text), ``file`` (each completed file),
+    ``html_preview``, and ``done`` with the persisted artifacts. On LLM
+    failure ``reset`` (when AI files or a preview were already sent: discard
+    them) and the stub output as ``file``/``html_preview`` events follow,
+    mirroring the non-streaming fallback. The generation runs detached from
+    the response, so it is persisted even if the client disconnects.
+    """
+    project, messages, summary = await _load_generation_context(project_id)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        emit = queue.put_nowait
+        try:
+            with collect_metrics():
+                emit(("start", {"project_id": project_id, "provider": request.provider}))
+                out: Dict[str, Any] = {}
+                mode = "ai"
+                error = None
+                sent_files: List[Dict[str, Any]] = []
+                sent_preview = False
+                try:
+                    async for ev in stream_code_from_llm(
+                        project.description, messages, request.provider,
+                        use_cache=request.cache, summary=summary, project_id=project_id,
+                    ):
+                        kind = ev["type"]
+                        if kind == "delta":
+                            emit(("delta", {"text": ev["text"]}))
+                        elif kind == "file":
+                            sent_files.append(ev["file"])
+                            emit(("file", ev["file"]))
+                        elif kind == "html_preview":
+                            sent_preview = True
+                            emit(("html_preview", {"html_preview": ev["html_preview"]}))
+                        elif kind == "result":
+                            out = {k: v for k, v in ev.items() if k != "type"}
+                except Exception as e:
+                    out = stub_generate_code(project.description, messages)
+                    mode = "stub"
+                    error = str(e)
+                    emit(("error", {"error": error, "fallback": "stub"}))
+                    if sent_files or sent_preview:
+                        # The stub replaces the AI output streamed so far
+                        emit(("reset", {"reason": "fallback"}))
+                    for f in out["files"]:
+                        emit(("file", f))
+                    emit(("html_preview", {"html_preview": out["html_preview"]}))
+                else:
+                    # Files recovered only by the final parse (e.g. truncated output)
+                    for f in out.get("files", []):
+                        if f not in sent_files:
+                            emit(("file", f))
+                    if not sent_preview and out.get("html_preview"):
+                        emit(("html_preview", {"html_preview": out["html_preview"]}))
+
+                meta = {"breaker": _breaker_info(request.provider), "cache": out.get("cache"), "parse_path": out.get("parse_path")}
+                artifacts = await _persist_generation(project_id, out, mode, error, request.provider, current_user, meta)
+                emit(("done", artifacts))
+        except Exception as e:
+            logger.error(f"Streamed generation for {project_id} failed: {e}")
+            emit(("error", {"error": str(e)}))
+        finally:
+            emit(None)
+
+    _detach(produce())
+
+    async def events():
+        # Cancelled when the client disconnects; the generation carries on
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            yield _sse(*item)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,7 +1,12 @@
 from typing import Dict, Any, List, Tuple
-from .models import Project, Plan, Artifacts, ArtifactFile
+from .models import Project, ProjectListItem, Plan, Artifacts, ArtifactFile
 from datetime import datetime
-from ..llm.planner import plan_from_llm
+from ..llm.planner import hedged_plan_from_llm, plan_cache_key, plan_target
+from ..llm.cache import llm_cache
+from ..llm.breaker import CircuitOpenError, breaker_state, is_available
+from ..llm.constants import ALTERNATE_PROVIDERS
+from ..llm.metrics import collect_metrics
+from ..core.config import LLM_BREAKER_ALTERNATE
 
 def stub_generate_plan(description: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     """Stub plan generation for fallback"""
@@ -13,19 +18,81 @@ def stub_generate_plan(description: str) -> Tuple[Dict[str, Any], Dict[str, Any]
     meta = {"mode": "stub", "provider": "stub"}
     return plan_dict, meta
 
-async def compute_plan(description: str, provider: str = "auto", model: str = None, prompt: str = None) -> Tuple[Plan, Dict[str, Any]]:
-    """Generate a plan for the project"""
+async def _llm_plan(description: str, provider: str, model: str, use_cache: bool) -> Tuple[Plan, Dict[str, Any]]:
+    hedge: Dict[str, Any] = {}
+
+    async def _plan() -> Dict[str, Any]:
+        plan, info = await hedged_plan_from_llm(description, provider, model)
+        hedge.update(info)
+        return plan.dict()
+
+    def _cacheable(_: Dict[str, Any]) -> bool:
+        # Only the requested provider's answer is cached under its key
+        return hedge.get("winner", provider) == provider
+
+    key = plan_cache_key(description, provider, model)
+    plan_dict, source = await llm_cache.get_or_compute("plan", key, _plan, use_cache, _cacheable)
+    meta = {"mode": "ai", "provider": provider, "cache": source}
+    if hedge:
+        meta["hedge"] = hedge
+    return Plan(**plan_dict), meta
+
+async def compute_plan(description: str, provider: str = "auto", model: str = None, prompt: str = None, use_cache: bool = True) -> Tuple[Plan, Dict[str, Any]]:
+    """Generate a plan for the project; identical requests are served from the LLM cache.
+
+    When the provider's circuit breaker is open the alternate provider is
+    tried (if its breaker is not open too), otherwise the stub is returned
+    immediately instead of waiting for the provider to time out. The LLM
+    calls made are summarized in ``meta["metrics"]``.
+    """
+    with collect_metrics() as run:
+        plan, meta = await _compute_plan(description, provider, model, use_cache)
+    meta["metrics"] = run.summary()
+    return plan, meta
+
+async def _compute_plan(description: str, provider: str, model: str, use_cache: bool) -> Tuple[Plan, Dict[str, Any]]:
+    breaker = {"name": "/".join(str(x or "default") for x in plan_target(provider, model))}
     try:
-        plan = await plan_from_llm(description, provider, model)
-        meta = {"mode": "ai", "provider": provider}
+        plan, meta = await _llm_plan(description, provider, model, use_cache)
+        breaker["state"] = breaker_state(*plan_target(provider, model))
+        meta["breaker"] = breaker
         return plan, meta
+    except CircuitOpenError as e:
+        error = e
+        breaker["state"] = "open"
+        alternate = ALTERNATE_PROVIDERS.get((provider or "auto").lower()) if LLM_BREAKER_ALTERNATE else None
+        if alternate and is_available(*plan_target(alternate, None)):
+            try:
+                plan, meta = await _llm_plan(description, alternate, None, use_cache)
+                meta["fallback_from"] = provider
+                meta["breaker"] = breaker
+                return plan, meta
+            except Exception as alt_error:
+                error = alt_error
     except Exception as e:
-        # Fallback to stub
-        plan_dict, meta = stub_generate_plan(description)
-        plan = Plan(**plan_dict)
-        meta["error"] = str(e)
-        meta["mode"] = "stub"
-        return plan, meta
+        error = e
+        breaker["state"] = breaker_state(*plan_target(provider, model))
+
+    # Fallback to stub
+    plan_dict, meta = stub_generate_plan(description)
+    plan = Plan(**plan_dict)
+    meta["error"] = str(error)
+    meta["mode"] = "stub"
+    meta["breaker"] = breaker
+    return plan, meta
+
+def _artifacts_from_doc(artifacts_dict: Dict[str, Any]) -> Artifacts:
+    # Convert files to proper structure if needed
+    if "files" in artifacts_dict and isinstance(artifacts_dict["files"], list):
+        files = []
+        for f in artifacts_dict["files"]:
+            if isinstance(f, dict) and "path" in f and ("content" in f or "hash" in f):
+                files.append(ArtifactFile(**f))
+            else:
+                # Handle malformed file objects
+                files.append(ArtifactFile(path=str(f.get("path", "unknown")), content=str(f.get("content", ""))))
+        artifacts_dict["files"] = files
+    return Artifacts(**artifacts_dict)
 
 def doc_to_project(doc: Dict[str, Any]) -> Project:
     """Convert MongoDB document to Project model"""
@@ -35,19 +102,7 @@ def doc_to_project(doc: Dict[str, Any]) -> Project:
     
     # Ensure artifacts is properly structured
     if "artifacts" in doc and doc["artifacts"]:
-        artifacts_dict = doc["artifacts"]
-        # Convert files to proper structure if needed
-        if "files" in artifacts_dict and isinstance(artifacts_dict["files"], list):
-            files = []
-            for f in artifacts_dict["files"]:
-                if isinstance(f, dict) and "path" in f and "content" in f:
-                    files.append(ArtifactFile(**f))
-                else:
-                    # Handle malformed file objects
-                    files.append(ArtifactFile(path=str(f.get("path", "unknown")), content=str(f.get("content", ""))))
-            artifacts_dict["files"] = files
-        
-        doc["artifacts"] = Artifacts(**artifacts_dict)
+        doc["artifacts"] = _artifacts_from_doc(doc["artifacts"])
     
     # Handle plan structure
     if "plan" in doc and doc["plan"]:
@@ -55,6 +110,14 @@ def doc_to_project(doc: Dict[str, Any]) -> Project:
     
     return Project(**doc)
 
+def doc_to_list_item(doc: Dict[str, Any]) -> ProjectListItem:
+    """Convert a projected MongoDB document to a list item; absent fields stay unset"""
+    doc["id"] = doc.pop("_id")
+    if doc.get("artifacts"):
+        doc["artifacts"] = _artifacts_from_doc(doc["artifacts"])
+    fields = {k: v for k, v in doc.items() if k in ProjectListItem.model_fields}
+    return ProjectListItem(**fields)
+
 def project_to_doc(project: Project) -> Dict[str, Any]:
     """Convert Project model to MongoDB document"""
     doc = project.dict()
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from ..core.config import SPECULATIVE_PLAN_CONCURRENCY, SPECULATIVE_PLAN_PROVIDER, SPECULATIVE_PLAN_TTL
+from ..core.db import db
+from .models import Plan
+from .services import compute_plan
+
+logger = logging.getLogger("webmatic")
+
+
+class _Pending:
+    __slots__ = ("task", "description", "provider", "model", "started", "finished")
+
+    def __init__(self, task: "asyncio.Task", description: str, provider: str, model: Optional[str]) -> None:
+        self.task = task
+        self.description = description
+        self.provider = provider
+        self.model = model
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+
+def _llm_calls(meta: Dict[str, Any]) -> int:
+    return int((meta.get("metrics") or {}).get("llm_calls") or 0)
+
+
+class PlanSpeculator:
+    """Computes a project's plan in the background right after it is created.
+
+    The result is kept in memory and stored on the project document as
+    ``pending_plan``, so a scaffold handled by another process can adopt it
+    too. ``take`` adopts it when description, provider and model still match
+    (waiting for it if it is still running) and otherwise cancels or drops
+    it; the caller then computes the plan as usual. Stub results are never
+    adopted. ``stats`` reports the hit rate and the LLM calls wasted on
+    speculations that were not used.
+    """
+
+    def __init__(self, concurrency: int = SPECULATIVE_PLAN_CONCURRENCY, ttl: float = SPECULATIVE_PLAN_TTL) -> None:
+        self.concurrency = max(0, concurrency)
+        self.ttl = ttl
+        self._pending: Dict[str, _Pending] = {}
+        self.counters = {
+            "started": 0, "skipped": 0, "adopted": 0, "adopted_in_flight": 0, "mismatched": 0,
+            "failed": 0, "discarded": 0, "wasted_llm_calls": 0, "saved_s": 0.0,
+        }
+
+    def _running(self) -> int:
+        return sum(1 for p in self._pending.values() if not p.task.done())
+
+    def start(self, project_id: str, description: str, provider: str = SPECULATIVE_PLAN_PROVIDER,
+              model: Optional[str] = None) -> bool:
+        """Start planning ``project_id`` in the background; False when at capacity."""
+        self._expire()
+        if self._running() >= self.concurrency:
+            self.counters["skipped"] += 1
+            return False
+        self.discard(project_id)
+        task = asyncio.ensure_future(self._speculate(project_id, description, provider, model))
+        self._pending[project_id] = _Pending(task, description, provider, model)
+        self.counters["started"] += 1
+        return True
+
+    async def _speculate(self, project_id: str, description: str, provider: str,
+                         model: Optional[str]) -> Tuple[Plan, Dict[str, Any]]:
+        plan, meta = await compute_plan(description, provider, model)
+        pending = self._pending.get(project_id)
+        if pending is not None and pending.task is asyncio.current_task():
+            pending.finished = time.monotonic()
+        if meta.get("mode") == "ai":
+            try:
+                await db.projects.update_one(
+                    {"_id": project_id, "description": description, "status": "created"},
+                    {"$set": {"pending_plan": {
+                        "plan": plan.dict(),
+                        "meta": meta,
+                        "description": description,
+                        "provider": provider,
+                        "model": model,
+                        "created_at": datetime.utcnow(),
+                    }}},
+                )
+            except Exception as e:
+                logger.warning(f"Failed to store speculative plan for {project_id}: {e}")
+        return plan, meta
+
+    async def take(self, project_id: str, doc: Dict[str, Any], provider: str, model: Optional[str],
+                   use_cache: bool = True) -> Tuple[Optional[Tuple[Plan, Dict[str, Any]]], Optional[Dict[str, Any]]]:
+        """Return ``(result, info)``; ``result`` is the adoptable ``(plan, meta)`` or None.
+
+        ``info`` describes what happened to the speculation for the run's
+        meta; it is None when there was none to consider.
+        """
+        description = doc.get("description", "")
+        stored = doc.get("pending_plan")
+        pending = self._pending.pop(project_id, None)
+        if stored:
+            await db.projects.update_one({"_id": project_id}, {"$unset": {"pending_plan": ""}})
+        if pending is None and not stored:
+            return None, None
+
+        wanted = (description, provider, model)
+        if pending is not None:
+            if not use_cache or (pending.description, pending.provider, pending.model) != wanted:
+                return None, self._drop(pending, "mismatch" if use_cache else "cache disabled")
+            in_flight = not pending.task.done()
+            waited = time.monotonic()
+            try:
+                plan, meta = await asyncio.shield(pending.task)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["failed"] += 1
+                return None, {"adopted": False, "reason": f"failed: {e}"}
+            waited = time.monotonic() - waited
+            if meta.get("mode") != "ai":
+                self.counters["failed"] += 1
+                self.counters["wasted_llm_calls"] += _llm_calls(meta)
+                return None, {"adopted": False, "reason": "stub"}
+            elapsed = (pending.finished or time.monotonic()) - pending.started
+            return self._adopt(plan, meta, {
+                "adopted": True, "in_flight": in_flight, "waited_s": round(waited, 3),
+                "saved_s": round(max(0.0, elapsed - waited), 3),
+            })
+
+        fresh = stored.get("created_at") and datetime.utcnow() - stored["created_at"] <= timedelta(seconds=self.ttl)
+        if not use_cache or not fresh or (stored.get("description"), stored.get("provider"), stored.get("model")) != wanted:
+            self.counters["mismatched"] += 1
+            self.counters["wasted_llm_calls"] += _llm_calls(stored.get("meta") or {})
+            return None, {"adopted": False, "reason": "mismatch" if fresh else "expired"}
+        return self._adopt(Plan(**stored["plan"]), dict(stored.get("meta") or {}), {"adopted": True, "in_flight": False})
+
+    def _adopt(self, plan: Plan, meta: Dict[str, Any], info: Dict[str, Any]) -> Tuple[Tuple[Plan, Dict[str, Any]], Dict[str, Any]]:
+        self.counters["adopted"] += 1
+        if info.get("in_flight"):
+            self.counters["adopted_in_flight"] += 1
+        self.counters["saved_s"] += info.get("saved_s", 0.0)
+        return (plan, meta), info
+
+    def _drop(self, pending: _Pending, reason: str, counter: str = "mismatched") -> Dict[str, Any]:
+        self.counters[counter] += 1
+        if pending.task.done():
+            if not pending.task.cancelled() and pending.task.exception() is None:
+                self.counters["wasted_llm_calls"] += _llm_calls(pending.task.result()[1])
+        else:
+            # Calls already sent are lost either way; cancelling frees the limiter slot
+            pending.task.cancel()
+            self.counters["wasted_llm_calls"] += 1
+        return {"adopted": False, "reason": reason}
+
+    def discard(self, project_id: str) -> None:
+        """Forget the project's speculation (description changed, project deleted)."""
+        pending = self._pending.pop(project_id, None)
+        if pending is not None:
+            self._drop(pending, "discarded", "discarded")
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for project_id, pending in list(self._pending.items()):
+            if pending.task.done() and now - pending.started > self.ttl:
+                self.discard(project_id)
+
+    async def close(self) -> None:
+        tasks = [p.task for p in self._pending.values() if not p.task.done()]
+        self._pending.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        decided = self.counters["adopted"] + self.counters["mismatched"] + self.counters["failed"]
+        return {
+            "pending": len(self._pending),
+            "running": self._running(),
+            **self.counters,
+            "saved_s": round(self.counters["saved_s"], 3),
+            "hit_rate": round(self.counters["adopted"] / decided, 3) if decided else None,
+        }
+
+
+plan_speculator = PlanSpeculator()
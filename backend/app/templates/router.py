@@ -1,23 +1,36 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import uuid
 from pydantic import BaseModel
 import logging
 
+from ..auth.utils import get_current_user_optional
 from ..core.db import db
+from ..core.uow import UnitOfWork
+from ..core.writebehind import write_behind
 from .models import TemplateManifest
 from ..projects.models import Project
 from ..projects.services import compute_plan, doc_to_project
 from ..llm.constants import is_allowed_model, ALLOWED_MODELS
+from ..jobs.models import JobAccepted
+from ..jobs.queue import enqueue_job
 
 router = APIRouter()
 logger = logging.getLogger("webmatic")
 
 
+_templates_seeded = False
+
+
 async def _seed_templates_if_needed():
+    global _templates_seeded
+    if _templates_seeded:
+        return
     count = await db.templates.estimated_document_count()
     if count and count > 0:
+        _templates_seeded = True
         return
     seeds: List[Dict[str, Any]] = [
         {
@@ -146,10 +159,55 @@ class CreateFromTemplatePayloadDict(BaseModel):
     overrides: Optional[Dict[str, Any]] = None
     provider: Optional[str] = "auto"
     model: Optional[str] = None
+    cache: bool = True  # serve identical requests from the LLM cache
+
+
+async def plan_template_project(project_id: str, provider: Optional[str] = "auto", model: Optional[str] = None,
+                                use_cache: bool = True, doc: Optional[Dict[str, Any]] = None) -> Project:
+    """Plan a freshly created template project; shared by the endpoint and the job worker
+
+    Pass ``doc`` when the caller already holds the project document to skip reading it.
+    """
+    d = doc if doc is not None else await db.projects.find_one({"_id": project_id}, {"description": 1})
+    if not d:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    # Compute plan using provider and model
+    plan, meta = await compute_plan(d.get("description", ""), provider, model, use_cache=use_cache)
+
+    # Run record
+    run_doc = {
+        "_id": str(uuid.uuid4()),
+        "project_id": project_id,
+        "provider": meta.get("provider"),
+        "model": meta.get("model"),
+        "mode": meta.get("mode"),
+        "status": "success",
+        "error": meta.get("error"),
+        "plan_counts": {
+            "frontend": len(plan.frontend or []),
+            "backend": len(plan.backend or []),
+            "database": len(plan.database or []),
+        },
+        "meta": meta,
+        "created_at": datetime.utcnow(),
+    }
+
+    # Update project with plan; the post-image is the fresh project
+    d = await UnitOfWork().update_returning(
+        "projects",
+        {"_id": project_id},
+        {"$set": {"plan": plan.dict(), "status": "planned", "updated_at": datetime.utcnow()}},
+    ).commit()
+    if not d:
+        raise HTTPException(status_code=404, detail="Project not found")
+    await write_behind.put("runs", run_doc)
+    return doc_to_project(d)
 
 
 @router.post("/projects/from-template", response_model=Project)
-async def create_project_from_template(payload: CreateFromTemplatePayloadDict):
+async def create_project_from_template(payload: CreateFromTemplatePayloadDict, background: bool = False,
+                                      current_user: Optional[dict] = Depends(get_current_user_optional)):
     await _seed_templates_if_needed()
     t = await db.templates.find_one({"_id": payload.template_id})
     if not t:
@@ -176,33 +234,12 @@ async def create_project_from_template(payload: CreateFromTemplatePayloadDict):
     doc["_id"] = project.id
     await db.projects.insert_one(doc)
 
-    # Compute plan using provider and model
-    plan, meta = await compute_plan(project.description, payload.provider, payload.model)
-
-    # Update project with plan
-    await db.projects.update_one(
-        {"_id": project.id},
-        {"$set": {"plan": plan.dict(), "status": "planned", "updated_at": datetime.utcnow()}},
-    )
-
-    # Insert run record
-    run_doc = {
-        "_id": str(uuid.uuid4()),
-        "project_id": project.id,
-        "provider": meta.get("provider"),
-        "model": meta.get("model"),
-        "mode": meta.get("mode"),
-        "status": "success",
-        "error": meta.get("error"),
-        "plan_counts": {
-            "frontend": len(plan.frontend or []),
-            "backend": len(plan.backend or []),
-            "database": len(plan.database or []),
-        },
-        "created_at": datetime.utcnow(),
-    }
-    await db.runs.insert_one(run_doc)
+    if background:
+        # The project exists right away; planning happens in a worker
+        job_id = await enqueue_job("from_template", {
+            "project_id": project.id, "provider": payload.provider, "model": payload.model, "use_cache": payload.cache,
+        }, user_id=(current_user or {}).get("sub"))
+        job = JobAccepted(job_id=job_id, type="from_template", project_id=project.id)
+        return JSONResponse(status_code=202, content=job.dict())
 
-    # Return fresh project
-    d = await db.projects.find_one({"_id": project.id})
-    return doc_to_project(d)
\ No newline at end of file
+    return await plan_template_project(project.id, payload.provider, payload.model, payload.cache, doc=doc)
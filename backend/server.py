@@ -1,15 +1,30 @@
 from fastapi import FastAPI, APIRouter
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from contextlib import asynccontextmanager
 import uvicorn
 import os
 import logging
-from app.core.db import init_db_client, close_db_client
+from app.core.db import init_db_client, close_db_client, count_round_trips, note_route_round_trips, round_trip_stats
+from app.core.writebehind import write_behind
+from app.core.migrations import explain_hot_queries, log_query_plans, migration_status, run_migrations
 from app.auth.router import router as auth_router
 from app.projects.router import router as projects_router
 from app.projects.router_chat import router as chat_router
 from app.projects.router_generate import router as generate_router
 from app.templates.router import router as templates_router
+from app.jobs.router import router as jobs_router
+from app.jobs.worker import JobWorker
+from app.core.config import DB_EXPLAIN_ON_STARTUP, DB_MIGRATE_ON_STARTUP, DB_ROUND_TRIP_BUDGET, JOB_WORKERS
+from app.llm.cache import llm_cache
+from app.llm.singleflight import llm_flights
+from app.llm.limiter import limiter_stats
+from app.llm.breaker import breaker_stats
+from app.llm.hedge import hedge_stats
+from app.llm.metrics import llm_metrics
+from app.llm.client import session_pool_stats
+from app.projects.speculation import plan_speculator
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,9 +35,22 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up...")
     init_db_client()
+    if DB_MIGRATE_ON_STARTUP:
+        await run_migrations()
+    if DB_EXPLAIN_ON_STARTUP:
+        await log_query_plans()
+    await write_behind.start()
+    worker = JobWorker(concurrency=JOB_WORKERS) if JOB_WORKERS > 0 else None
+    if worker:
+        await worker.start()
     yield
     # Shutdown
     logger.info("Shutting down...")
+    if worker:
+        await worker.stop()
+    await plan_speculator.close()
+    # After everything that records runs has stopped
+    await write_behind.close()
     close_db_client()
 
 app = FastAPI(title="Webmatic API", lifespan=lifespan)
@@ -34,8 +62,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-DB-Round-Trips"],
 )
 
+class DbRoundTripMiddleware:
+    """Count database commands per request.
+
+    Plain ASGI rather than ``@app.middleware("http")`` so streamed (SSE)
+    responses pass through unbuffered. The X-DB-Round-Trips header carries
+    the count when the headers go out; the per-route totals and the budget
+    warning cover the whole request, streamed body included.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with count_round_trips() as trips:
+            async def send_with_count(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).append("X-DB-Round-Trips", str(trips.total))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_count)
+            finally:
+                # The router stores the matched route in the scope
+                key = f"{scope['method']} {getattr(scope.get('route'), 'path', 'unmatched')}"
+                note_route_round_trips(key, trips.total)
+                if DB_ROUND_TRIP_BUDGET and trips.total > DB_ROUND_TRIP_BUDGET:
+                    logger.warning(f"{key} made {trips.total} DB round-trips (budget {DB_ROUND_TRIP_BUDGET}): {trips.by_command}")
+
+app.add_middleware(DbRoundTripMiddleware)
+
 # API Router
 api_router = APIRouter(prefix="/api")
 
@@ -45,12 +107,38 @@ api_router.include_router(projects_router, tags=["projects"])
 api_router.include_router(chat_router, tags=["chat"])
 api_router.include_router(generate_router, tags=["generate"])
 api_router.include_router(templates_router, tags=["templates"])
+api_router.include_router(jobs_router, tags=["jobs"])
 
 app.include_router(api_router)
 
 @app.get("/api/health")
 async def health():
-    return {"ok": True, "db": "test_database"}
+    return {
+        "ok": True,
+        "db": "test_database",
+        "llm_cache": llm_cache.stats(),
+        "llm_inflight": llm_flights.stats(),
+        "llm_limits": limiter_stats(),
+        "llm_breakers": breaker_stats(),
+        "llm_hedging": hedge_stats(),
+        "llm_sessions": session_pool_stats(),
+        "plan_speculation": plan_speculator.stats(),
+    }
+
+@app.get("/api/health/db")
+async def db_health():
+    """Applied/pending migrations, the index plan of each hot query and DB round-trips per route"""
+    return {
+        "migrations": await migration_status(),
+        "query_plans": await explain_hot_queries(),
+        "round_trips": round_trip_stats(),
+        "write_behind": write_behind.stats(),
+    }
+
+@app.get("/api/metrics/llm")
+async def llm_call_metrics():
+    """Histograms of LLM call latency, TTFT, queue wait, tokens and response size since startup"""
+    return llm_metrics.snapshot()
 
 if __name__ == "__main__":
     uvicorn.run(
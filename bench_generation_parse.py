@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single-pass streaming JSON parser vs. the legacy regex + line-repair
+extraction previously used by generate_code_from_llm.
+
+Usage:
+    python bench_generation_parse.py [PAYLOAD_DIR] [--repeat N] [--cassette PATH]
+
+PAYLOAD_DIR may contain captured raw provider responses (*.txt / *.json);
+each one is benchmarked as-is. --cassette replays generation responses
+recorded with LLM_CASSETTE_MODE=record, feeding the streaming parser the
+recorded chunk boundaries. Without it, production-shaped responses are
+synthesized (pretty-printed JSON, markdown fences, ~3000 char HTML duplicated
+in files and html_preview) and truncated at several points, the way
+max_tokens=3000 cuts them off.
+"""
+
+import gzip
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+from app.llm.jsonstream import ArtifactStreamParser, parse_generation  # noqa: E402
+
+
+def legacy_parse(content: str):
+    """Verbatim copy of the pre-parser extraction logic from generator.py."""
+    json_match = None
+    patterns = [
+        r"```(?:json)?\s*(\{[\s\S]*?\})\s*```",
+        r"```(?:json)?\s*(\{[\s\S]*?)\s*```",
+        r"\{[\s\S]*\}",
+    ]
+    for pattern in patterns:
+        m = re.search(pattern, content, re.IGNORECASE | re.DOTALL)
+        if m:
+            if len(m.groups()) > 0:
+                json_match = m.group(1)
+            else:
+                json_match = m.group(0)
+            break
+    if json_match:
+        content = json_match.strip()
+    else:
+        raise RuntimeError("No JSON found")
+    try:
+        data = json.loads(content)
+        files = data.get("files", [])
+        if not isinstance(files, list):
+            files = []
+        return {"files": files, "html_preview": data.get("html_preview", "")}
+    except json.JSONDecodeError as e:
+        lines = content.split('\n')
+        for i in range(len(lines) - 1, -1, -1):
+            test_content = '\n'.join(lines[:i+1])
+            if '"' in test_content and not test_content.rstrip().endswith('"'):
+                test_content = test_content.rstrip() + '"'
+            if '{' in test_content and not test_content.rstrip().endswith('}'):
+                test_content = test_content.rstrip() + '}'
+            try:
+                data = json.loads(test_content)
+                files = data.get("files", [])
+                if not isinstance(files, list):
+                    files = []
+                return {"files": files, "html_preview": data.get("html_preview", "")}
+            except Exception:
+                continue
+        html_match = re.search(r'"html_preview":\s*"([^"]*(?:\\.[^"]*)*)"', content, re.DOTALL)
+        if html_match:
+            html_content = html_match.group(1).replace('\\"', '"').replace('\\n', '\n')
+            return {"files": [{"path": "index.html", "content": html_content}], "html_preview": html_content}
+        raise RuntimeError(f"Failed to parse LLM JSON response: {e}")
+
+
+def _sample_html(sections: int) -> str:
+    css = "\n".join(
+        f"    .s{i} {{ padding: {8 + i}px; color: #0f172a; border-bottom: 1px solid #e2e8f0; }}"
+        for i in range(sections)
+    )
+    body = "\n".join(
+        f'  <section class="s{i}"><h2>Feature {i}</h2><p>Describe "capability" {i} here.</p>'
+        f'<button onclick="alert(\'{i}\')">Try</button></section>'
+        for i in range(sections)
+    )
+    return (
+        "<!doctype html>\n<html>\n<head>\n  <meta charset=\"utf-8\" />\n  <style>\n"
+        f"{css}\n  </style>\n</head>\n<body>\n{body}\n</body>\n</html>"
+    )
+
+
+def synthesize_payloads():
+    payloads = []
+    for sections in (10, 25, 60):
+        html = _sample_html(sections)
+        obj = {
+            "files": [
+                {"path": "index.html", "content": html},
+                {"path": "app.js", "content": "document.querySelectorAll('button').forEach(b => b.addEventListener('click', () => {}));"},
+            ],
+            "html_preview": html,
+        }
+        pretty = json.dumps(obj, indent=2)
+        fenced = f"Here is your app:\n```json\n{pretty}\n```"
+        payloads.append((f"complete/{sections}", pretty))
+        payloads.append((f"fenced/{sections}", fenced))
+        # Providers regularly emit literal newlines inside JSON strings
+        raw_nl = pretty.replace("\\n", "\n")
+        payloads.append((f"raw_newlines/{sections}", raw_nl))
+        payloads.append((f"raw_newlines_cut80/{sections}", raw_nl[:int(len(raw_nl) * 0.8)]))
+        for frac in (0.35, 0.6, 0.9):
+            cut = int(len(pretty) * frac)
+            payloads.append((f"truncated{int(frac * 100)}/{sections}", pretty[:cut]))
+            payloads.append((f"fenced_truncated{int(frac * 100)}/{sections}", fenced[:cut]))
+    return payloads
+
+
+def load_payloads(directory: Path):
+    out = []
+    for p in sorted(directory.iterdir()):
+        if p.suffix in (".txt", ".json"):
+            out.append((p.name, p.read_text(encoding="utf-8")))
+    return out
+
+
+def load_cassette(path: Path):
+    """Generation responses from a cassette, with their recorded chunks."""
+    out = []
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for i, line in enumerate(fh):
+            entry = json.loads(line) if line.strip() else None
+            if not entry or entry.get("call") != "message" or entry.get("error"):
+                continue
+            chunks = [text for _, text in entry.get("chunks", [])]
+            name = f"{'stream' if entry.get('streamed') else 'send'}{i}/{entry.get('model')}"
+            out.append((name, "".join(chunks), chunks))
+    return out
+
+
+def _time(fn, content: str, repeat: int):
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            result = fn(content)
+        except Exception as e:
+            result = e
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def _streamed(content: str, chunks=None):
+    parser = ArtifactStreamParser()
+    if chunks is None:
+        chunks = [content[i:i + 16] for i in range(0, len(content), 16)]  # ~4 tokens per provider delta
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.finish(), parser.recovery
+
+
+def _describe(result) -> str:
+    if isinstance(result, Exception):
+        return "error"
+    out = result[0] if isinstance(result, tuple) else result
+    n_files = len(out.get("files", []))
+    return f"{n_files} files, preview {len(out.get('html_preview') or '')} chars"
+
+
+def main(argv):
+    repeat = 20
+    if "--repeat" in argv:
+        repeat = int(argv[argv.index("--repeat") + 1])
+    cassette = None
+    if "--cassette" in argv:
+        cassette = argv[argv.index("--cassette") + 1]
+        argv = [a for a in argv if a not in ("--cassette", cassette)]
+    dirs = [a for a in argv if not a.startswith("--") and not a.isdigit()]
+    if cassette:
+        payloads = load_cassette(Path(cassette))
+    else:
+        payloads = [(name, content, None) for name, content in (load_payloads(Path(dirs[0])) if dirs else synthesize_payloads())]
+
+    print(f"{'payload':<28}{'bytes':>8}{'legacy ms':>12}{'parser ms':>12}{'stream ms':>12}  path / result")
+    total_legacy = total_new = 0.0
+    for name, content, chunks in payloads:
+        legacy_ms, legacy_res = _time(legacy_parse, content, repeat)
+        new_ms, new_res = _time(parse_generation, content, repeat)
+        stream_ms, _ = _time(lambda c: _streamed(c, chunks), content, repeat)
+        total_legacy += legacy_ms
+        total_new += new_ms
+        path = new_res[1] if isinstance(new_res, tuple) else "error"
+        print(
+            f"{name:<28}{len(content):>8}{legacy_ms:>12.3f}{new_ms:>12.3f}{stream_ms:>12.3f}"
+            f"  {path}: {_describe(new_res)} | legacy: {_describe(legacy_res)}"
+        )
+    print(f"\ntotal legacy {total_legacy:.2f} ms, parser {total_new:.2f} ms "
+          f"({total_legacy / max(total_new, 1e-9):.1f}x)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
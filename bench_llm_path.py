@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Load test: drive generate_code_from_llm end to end against the mock LLM.
+
+Usage:
+    python bench_llm_path.py [--requests N] [--concurrency N] [--profile SPEC]
+                             [--provider claude|gpt|auto] [--stream] [--projects N]
+
+SPEC is a mock preset (fast, realistic, flaky, slow) or a JSON profile, see
+backend/app/llm/mock.py. The LLM cache is disabled so every request reaches
+the (mock) provider; limiter, breaker, hedging and parser all run for real.
+Reports latency percentiles, throughput, parse paths / errors and the
+limiter, breaker and mock counters. With --projects N requests are spread
+over N projects, so repeat calls reuse pooled sessions and their prompt
+prefix (see the session pool stats).
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+async def run(args):
+    from app.llm.breaker import breaker_stats
+    from app.llm.client import session_pool_stats
+    from app.llm.generator import generate_code_from_llm, stream_code_from_llm
+    from app.llm.limiter import limiter_stats
+    from app.llm.mock import MockLlmChat
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, first_events, outcomes = [], [], Counter()
+
+    async def one(i):
+        async with semaphore:
+            n = i % args.projects if args.projects else i
+            description, project_id = f"Benchmark app {n}", f"bench-{n}"
+            start = time.perf_counter()
+            try:
+                if args.stream:
+                    first = None
+                    async for ev in stream_code_from_llm(description, [], args.provider, use_cache=False, project_id=project_id):
+                        if first is None:
+                            first = time.perf_counter() - start
+                        out = ev
+                    first_events.append(first)
+                else:
+                    out = await generate_code_from_llm(description, [], args.provider, use_cache=False, project_id=project_id)
+                outcomes[out.get("parse_path") or "ok"] += 1
+            except Exception as e:
+                outcomes[f"error: {str(e)[:60]}"] += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(args.requests)])
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {elapsed:.2f}s "
+          f"({args.requests / elapsed:.2f} req/s)")
+    print("latency s: " + ", ".join(f"p{p}={_percentile(latencies, p):.3f}" for p in (50, 90, 95, 99)))
+    if first_events:
+        print("first event s: " + ", ".join(f"p{p}={_percentile(first_events, p):.3f}" for p in (50, 95)))
+    for outcome, n in outcomes.most_common():
+        print(f"  {n:>5}  {outcome}")
+    print("mock:", MockLlmChat.stats())
+    print("limits:", limiter_stats())
+    print("breakers:", breaker_stats())
+    print("sessions:", session_pool_stats())
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--profile", default="realistic")
+    parser.add_argument("--provider", default="claude")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--projects", type=int, default=0, help="spread requests over N projects (0: one each)")
+    args = parser.parse_args(argv)
+
+    os.environ["LLM_BACKEND"] = "mock"
+    os.environ["LLM_MOCK_PROFILE"] = args.profile
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    # config.py insists on these; no database is touched with the cache off
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "webmatic_bench")
+    sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
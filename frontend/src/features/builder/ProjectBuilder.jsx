@@ -42,6 +42,8 @@ export default function ProjectBuilder() {
   // Chat state - separate from project artifacts
   const [chat, setChat] = useState([]);
   const [chatLoading, setChatLoading] = useState(false);
+  const [chatHasMore, setChatHasMore] = useState(false);
+  const [olderLoading, setOlderLoading] = useState(false);
   
   // UI state
   const [msg, setMsg] = useState("");
@@ -108,6 +110,7 @@ export default function ProjectBuilder() {
       setChatLoading(true);
       const data = await ChatAPI.getChat(id);
       setChat(data.messages || []);
+      setChatHasMore(!!data.has_more);
     } catch (e) {
       console.error("Failed to load chat:", e);
       // Don't toast this error - it's not critical
@@ -116,6 +119,23 @@ export default function ProjectBuilder() {
     }
   }, [id]);
 
+  // Page back through older messages, keyed on the oldest loaded message's seq
+  const loadOlderChat = useCallback(async () => {
+    const before = chat[0]?.seq;
+    if (!before || olderLoading) return;
+    try {
+      setOlderLoading(true);
+      const data = await ChatAPI.getChat(id, { before });
+      setChat(prev => [...(data.messages || []), ...prev]);
+      setChatHasMore(!!data.has_more);
+    } catch (e) {
+      console.error("Failed to load earlier messages:", e);
+      toast.error("Failed to load earlier messages");
+    } finally {
+      setOlderLoading(false);
+    }
+  }, [id, chat, olderLoading]);
+
   // Load projects list for Home tab
   const loadProjects = useCallback(async () => {
     try {
@@ -381,14 +401,23 @@ export default function ProjectBuilder() {
                           ) : chat.length === 0 ? (
                             <div className="text-xs text-slate-400">Start chatting to generate your project.</div>
                           ) : (
-                            chat.map((m, i) => (
-                              <div key={i} className={`text-sm ${m.role === "user" ? "text-slate-800" : "text-slate-600"}`}>
-                                <div className={`${m.role === "user" ? "font-medium" : "italic"}`}>
-                                  {m.role === "user" ? "You" : "Assistant"}:
+                            <>
+                              {chatHasMore && (
+                                <div className="text-center">
+                                  <Button variant="ghost" size="sm" onClick={loadOlderChat} disabled={olderLoading}>
+                                    {olderLoading ? "Loading..." : "Load earlier messages"}
+                                  </Button>
                                 </div>
-                                <div className="mt-1">{m.content}</div>
-                              </div>
-                            ))
+                              )}
+                              {chat.map((m, i) => (
+                                <div key={m.id || i} className={`text-sm ${m.role === "user" ? "text-slate-800" : "text-slate-600"}`}>
+                                  <div className={`${m.role === "user" ? "font-medium" : "italic"}`}>
+                                    {m.role === "user" ? "You" : "Assistant"}:
+                                  </div>
+                                  <div className="mt-1">{m.content}</div>
+                                </div>
+                              ))}
+                            </>
                           )}
                           
                           {generating && (
@@ -6,15 +6,25 @@ export const ProjectsAPI = {
     return data;
   },
   async list() {
-    const { data } = await api.get(`/projects`);
-    return data;
+    // The list is paged; follow X-Next-Cursor until the last page
+    const projects = [];
+    let cursor;
+    do {
+      const params = { limit: 200 };
+      if (cursor) params.cursor = cursor;
+      const { data, headers } = await api.get(`/projects`, { params });
+      projects.push(...data);
+      cursor = headers["x-next-cursor"];
+    } while (cursor);
+    return projects;
   },
   async create(payload) {
     const { data } = await api.post(`/projects`, payload);
     return data;
   },
   async get(id) {
-    const { data } = await api.get(`/projects/${id}`);
+    // Artifact bodies are stored separately and only loaded on request
+    const { data } = await api.get(`/projects/${id}`, { params: { include: "artifacts" } });
     return data;
   },
   async update(id, payload) {
@@ -42,8 +52,9 @@ export const ProjectsAPI = {
 };
 
 export const ChatAPI = {
-  async getChat(id) {
-    const { data } = await api.get(`/projects/${id}/chat`);
+  async getChat(id, params = {}) {
+    // Newest page by default; pass { before: seq } to page back through older messages
+    const { data } = await api.get(`/projects/${id}/chat`, { params });
     return data;
   },
   async appendMessage(id, content, role = "user") {
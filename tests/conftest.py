@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# Unit tests import the backend package directly; nothing here talks to MongoDB
+# (the Motor client connects lazily) or to an LLM provider.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "webmatic_test")
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.llm.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, call_provider, get_breaker
+from app.llm.limiter import RateLimitedError, get_limiter
+
+
+class _RateLimited(Exception):
+    status_code = 429
+    retry_after = 0
+
+
+def _breaker(**kwargs):
+    options = {"window": 10, "min_calls": 4, "failure_rate": 0.5, "slow_seconds": 5.0, "open_seconds": 60.0}
+    options.update(kwargs)
+    return CircuitBreaker("test/model", **options)
+
+
+def test_opens_at_failure_rate_after_min_calls():
+    breaker = _breaker()
+    for ok in (True, False, True):
+        breaker.record(ok, 0.1)
+    assert breaker.state == CLOSED  # below min_calls
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.counters["rejected"] == 1
+
+
+def test_slow_calls_count_as_failures():
+    breaker = _breaker(slow_seconds=1.0)
+    for _ in range(4):
+        breaker.record(True, 2.0)
+    assert breaker.state == OPEN
+    assert breaker.counters["slow"] == 4
+    assert breaker.counters["failures"] == 0
+
+
+def test_half_open_allows_one_probe():
+    breaker = _breaker(open_seconds=0.0)
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # probe already in flight
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = _breaker(open_seconds=0.0)
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.counters["opened"] == 2
+
+
+def test_cancelled_probe_is_released():
+    breaker = _breaker(open_seconds=0.0)
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_rate_limits_are_not_provider_failures():
+    breaker = get_breaker("test-429", "m")
+    breaker.min_calls = 1
+
+    async def throttled():
+        raise _RateLimited("429 Too Many Requests")
+
+    with pytest.raises(RateLimitedError):
+        asyncio.run(call_provider("test-429", "m", 10, throttled))
+    assert breaker.state == CLOSED
+    assert breaker.counters["failures"] == 0
+
+
+def test_queue_wait_is_not_provider_latency():
+    breaker = get_breaker("test-queue", "m")
+    breaker.slow_seconds = 0.25
+    breaker.min_calls = 1
+    limiter = get_limiter("test-queue", "m")
+    limiter.max_concurrency, limiter.limit = 1, 1.0
+
+    async def call():
+        await asyncio.sleep(0.15)
+        return "ok"
+
+    async def main():
+        # The second call queues behind the first: 0.3s end to end, 0.15s at the provider
+        return await asyncio.gather(*[call_provider("test-queue", "m", 10, call) for _ in range(2)])
+
+    assert asyncio.run(main()) == ["ok", "ok"]
+    assert breaker.counters["slow"] == 0
+    assert breaker.state == CLOSED
+
+
+def test_open_breaker_rejects_without_queueing():
+    breaker = get_breaker("test-open", "m")
+    breaker.min_calls = 1
+    breaker.record(False, 0.1)
+
+    async def never():
+        raise AssertionError("provider called while the breaker is open")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call_provider("test-open", "m", 10, never))
+    assert get_limiter("test-open", "m").counters["acquired"] == 0
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from app.llm.jsonstream import (
+    PATH_EMBEDDED,
+    PATH_FENCED,
+    PATH_MALFORMED,
+    PATH_PARTIAL,
+    PATH_STRICT,
+    PATH_TRUNCATED,
+    ArtifactStreamParser,
+    find_json_object,
+    parse_generation,
+)
+
+RESPONSE = json.dumps({
+    "files": [
+        {"path": "index.html", "content": "<html><body>{\"x\": 1}</body></html>"},
+        {"path": "app.js", "content": "console.log('}');"},
+    ],
+    "html_preview": "<html>preview</html>",
+})
+
+
+def _feed_in_chunks(text, size):
+    parser = ArtifactStreamParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return parser, events
+
+
+@pytest.mark.parametrize("size", [1, 3, 17, len(RESPONSE)])
+def test_events_do_not_depend_on_chunk_boundaries(size):
+    parser, events = _feed_in_chunks(RESPONSE, size)
+    assert [kind for kind, _ in events] == ["file", "file", "html_preview"]
+    assert events[1][1] == {"path": "app.js", "content": "console.log('}');"}
+    assert parser.complete
+    assert parser.finish()["html_preview"] == "<html>preview</html>"
+    assert parser.recovery == PATH_STRICT
+
+
+def test_truncated_response_keeps_completed_files():
+    cut = RESPONSE.index("app.js") - 10
+    parser, _ = _feed_in_chunks(RESPONSE[:cut], 5)
+    out = parser.finish()
+    assert [f["path"] for f in out["files"]] == ["index.html"]
+    assert out["html_preview"].startswith("<html><body>")
+    assert parser.recovery == PATH_TRUNCATED
+
+
+def test_truncated_inside_string_salvages_partial_file():
+    cut = RESPONSE.index("console.log") + 8
+    parser, _ = _feed_in_chunks(RESPONSE[:cut], 4)
+    out = parser.finish()
+    assert out["files"][-1] == {"path": "app.js", "content": "console."}
+    assert parser.recovery == PATH_PARTIAL
+
+
+def test_no_json_raises():
+    parser = ArtifactStreamParser()
+    parser.feed("Sorry, I can't help with that.")
+    with pytest.raises(ValueError):
+        parser.finish()
+
+
+@pytest.mark.parametrize("text, path", [
+    (RESPONSE, PATH_STRICT),
+    ("```json\n" + RESPONSE + "\n```", PATH_FENCED),
+    ("Here you go:\n" + RESPONSE + "\nEnjoy!", PATH_EMBEDDED),
+])
+def test_parse_generation_reports_path(text, path):
+    out, recovery = parse_generation(text)
+    assert recovery == path
+    assert len(out["files"]) == 2
+
+
+def test_parse_generation_falls_back_to_scanner():
+    # The root object closes but is invalid; completed files are still recovered
+    broken = RESPONSE.replace('"html_preview": ', '"html_preview" ')
+    out, recovery = parse_generation(broken)
+    assert recovery == PATH_MALFORMED
+    assert [f["path"] for f in out["files"]] == ["index.html", "app.js"]
+
+
+PROSE_BRACES = "Here is your app {with notes}:\n```json\n" + RESPONSE + "\n```\nDone {really}."
+
+
+def test_parse_generation_skips_braces_in_prose():
+    out, recovery = parse_generation(PROSE_BRACES)
+    assert recovery == PATH_FENCED
+    assert [f["path"] for f in out["files"]] == ["index.html", "app.js"]
+
+
+@pytest.mark.parametrize("size", [1, 7, len(PROSE_BRACES)])
+def test_stream_restarts_after_prose_root(size):
+    parser, events = _feed_in_chunks(PROSE_BRACES, size)
+    assert [kind for kind, _ in events] == ["file", "file", "html_preview"]
+    assert parser.finish()["html_preview"] == "<html>preview</html>"
+    assert parser.recovery == PATH_FENCED
+
+
+def test_unclosed_prose_brace_is_recovered_on_finish():
+    parser, _ = _feed_in_chunks("Use {curly braces for this:\n" + RESPONSE, 9)
+    assert len(parser.finish()["files"]) == 2
+    assert parser.recovery == PATH_EMBEDDED
+
+
+def test_find_json_object_prefers_fence_and_wanted_keys():
+    text = 'Plan {"files": "not this"} then\n```\n{"patches": [{"path": "a"}]}\n```'
+    data, start, end = find_json_object(text, ("patches",))
+    assert data == {"patches": [{"path": "a"}]}
+    assert text[start:end] == '{"patches": [{"path": "a"}]}'
+    assert find_json_object("no json {here}", ("patches",)) is None
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from app.llm.limiter import ProviderLimiter, RateLimitedError, _TokenBucket, call_with_limits, rate_limit_info
+
+
+class _RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, message="Too Many Requests", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def test_token_bucket_delay_and_refill():
+    bucket = _TokenBucket(60)  # one per second
+    bucket.level = 0.0
+    assert bucket.delay_for(2) == pytest.approx(2.0)
+    bucket.refill(bucket.updated + 1.5)
+    assert bucket.level == pytest.approx(1.5)
+    bucket.refill(bucket.updated + 3600)
+    assert bucket.level == bucket.capacity
+
+
+def test_token_bucket_caps_oversized_requests():
+    bucket = _TokenBucket(100)
+    bucket.level = 0.0
+    # Larger than the bucket: wait for a full bucket rather than forever
+    assert bucket.delay_for(1000) == pytest.approx(60.0)
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (_RateLimited(retry_after=3), (True, 3.0)),
+    (RuntimeError("Error code: 429 - rate limit exceeded, retry after 7s"), (True, 7.0)),
+    (RuntimeError("too many requests"), (True, None)),
+    (RuntimeError("500 internal error"), (False, None)),
+])
+def test_rate_limit_info(exc, expected):
+    assert rate_limit_info(exc) == expected
+
+
+def test_aimd_window_halves_on_429_and_grows_back():
+    async def main():
+        limiter = ProviderLimiter("test/aimd", max_concurrency=8, rpm=10_000, tpm=10_000_000)
+        await limiter.acquire(1)
+        await limiter.release(rate_limited=True, retry_after=0)
+        assert limiter.limit == 4.0
+        await limiter.acquire(1)
+        await limiter.release(rate_limited=True, retry_after=0)
+        assert limiter.limit == 2.0
+        await limiter.acquire(1)
+        await limiter.release()
+        assert limiter.limit == 2.5  # about one slot per window of successes
+        for _ in range(50):
+            await limiter.acquire(1)
+            await limiter.release()
+        assert limiter.limit == 8.0  # capped at max_concurrency
+        assert limiter.counters["rate_limited"] == 2
+
+    asyncio.run(main())
+
+
+def test_concurrency_window_is_enforced():
+    async def main():
+        limiter = ProviderLimiter("test/window", max_concurrency=2, rpm=10_000, tpm=10_000_000)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            await limiter.acquire(1)
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            await limiter.release()
+
+        await asyncio.gather(*[call() for _ in range(6)])
+        return peak
+
+    assert asyncio.run(main()) == 2
+
+
+def test_retry_after_pauses_every_caller():
+    async def main():
+        limiter = ProviderLimiter("test/pause", max_concurrency=4, rpm=10_000, tpm=10_000_000)
+        await limiter.acquire(1)
+        await limiter.release(rate_limited=True, retry_after=0.2)
+        return await limiter.acquire(1)
+
+    assert asyncio.run(main()) >= 0.15
+
+
+def test_call_with_limits_retries_then_gives_up():
+    calls = 0
+
+    async def throttled():
+        nonlocal calls
+        calls += 1
+        raise _RateLimited(retry_after=0)
+
+    with pytest.raises(RateLimitedError):
+        asyncio.run(call_with_limits("test-retry", "m", 1, throttled, max_retries=2))
+    assert calls == 3
+
+
+def test_call_with_limits_recovers_after_429():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise _RateLimited(retry_after=0)
+        return "ok"
+
+    assert asyncio.run(call_with_limits("test-recover", "m", 1, flaky)) == "ok"
+    assert len(attempts) == 2
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+# The router imports the LLM client, which needs the provider SDK
+pytest.importorskip("emergentintegrations")
+
+from app.projects.router import _HEAVY_LIST_FIELDS, _decode_cursor, _encode_cursor, _list_projection
+
+
+def test_cursor_round_trip():
+    doc = {"_id": "b1c2", "created_at": datetime(2024, 5, 1, 12, 30, 15, 123456)}
+    cursor = _encode_cursor(doc)
+    assert "=" not in cursor
+    assert _decode_cursor(cursor) == {"created_at": doc["created_at"], "_id": "b1c2"}
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "eyJ0IjoxfQ", "e30"])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        _decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_default_projection_excludes_heavy_fields():
+    assert _list_projection(None) == _HEAVY_LIST_FIELDS
+
+
+def test_requested_fields_keep_cursor_keys():
+    assert _list_projection("name, id") == {"_id": 1, "created_at": 1, "name": 1}
+
+
+def test_unknown_field_is_400():
+    with pytest.raises(HTTPException) as exc:
+        _list_projection("name,secret")
+    assert exc.value.status_code == 400
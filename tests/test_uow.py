@@ -0,0 +1,70 @@
+import asyncio
+
+import app.core.uow as uow_module
+from app.core.uow import UnitOfWork
+
+
+class _Collection:
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    async def find_one_and_update(self, filter, update, **kwargs):
+        self.log.append((self.name, "find_one_and_update"))
+        await asyncio.sleep(0.01)
+        return {"_id": filter["_id"], "ok": True}
+
+    async def bulk_write(self, ops, ordered=True, session=None):
+        self.log.append((self.name, [type(op).__name__ for op in ops]))
+
+
+class _Database:
+    def __init__(self):
+        self.log = []
+        self.commands = 0
+
+    def __getitem__(self, name):
+        return _Collection(name, self.log)
+
+    async def command(self, name):
+        self.commands += 1
+        return {}  # standalone: no setName
+
+
+def test_standalone_commit_applies_writes_in_queued_order(monkeypatch):
+    monkeypatch.setattr(uow_module, "_transactions", None)
+    monkeypatch.setattr(uow_module, "DB_TRANSACTIONS", "auto")
+    database = _Database()
+    uow = (
+        UnitOfWork(database)
+        .delete("chat_messages", {"project_id": "p"})
+        .delete("chat_messages", {"project_id": "q"})
+        .update_returning("projects", {"_id": "p"}, {"$set": {"x": 1}})
+        .insert("runs", {"_id": "r"})
+        .delete("chat_messages", {"project_id": "r"})
+    )
+    post_image = asyncio.run(uow.commit())
+    assert post_image == {"_id": "p", "ok": True}
+    assert database.log == [
+        ("chat_messages", ["DeleteMany", "DeleteMany"]),
+        ("projects", "find_one_and_update"),
+        ("runs", ["InsertOne"]),
+        ("chat_messages", ["DeleteMany"]),
+    ]
+
+
+def test_several_ops_on_one_collection_need_a_transaction(monkeypatch):
+    monkeypatch.setattr(uow_module, "_transactions", None)
+    monkeypatch.setattr(uow_module, "DB_TRANSACTIONS", "auto")
+    database = _Database()
+    uow = UnitOfWork(database).insert("runs", {"_id": 1}).insert("runs", {"_id": 2})
+    asyncio.run(uow.commit())
+    assert database.commands == 1
+    assert database.log == [("runs", ["InsertOne", "InsertOne"])]
+
+
+def test_single_write_skips_transaction_check():
+    database = _Database()
+    database.command = None  # would fail if called
+    assert asyncio.run(UnitOfWork(database).delete("runs", {"project_id": "p"}).commit()) is None
+    assert database.log == [("runs", ["DeleteMany"])]
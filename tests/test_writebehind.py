@@ -0,0 +1,133 @@
+import asyncio
+
+from app.core.writebehind import WriteBehind
+
+
+class _Collection:
+    def __init__(self):
+        self.docs = []
+        self.batches = []
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append(len(docs))
+        self.docs.extend(docs)
+
+
+class _Database:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, _Collection())
+
+
+def _buffer(**kwargs):
+    database = _Database()
+    options = {"batch_size": 100, "interval": 60.0, "block_seconds": 0.0, "enabled": True}
+    return WriteBehind(database=database, **{**options, **kwargs}), database
+
+
+def test_put_before_start_inserts_directly():
+    async def scenario():
+        wb, database = _buffer()
+        assert await wb.put("runs", {"_id": 1})
+        return wb, database
+
+    wb, database = asyncio.run(scenario())
+    assert database["runs"].docs == [{"_id": 1}]
+    assert wb.counters["direct"] == 1
+
+
+def test_full_batch_is_written_without_waiting_for_interval():
+    async def scenario():
+        wb, database = _buffer(batch_size=3)
+        await wb.start()
+        for i in range(3):
+            await wb.put("runs", {"_id": i})
+        for _ in range(10):
+            await asyncio.sleep(0)
+        written = list(database["runs"].docs)
+        await wb.close()
+        return written, database
+
+    written, database = asyncio.run(scenario())
+    assert [d["_id"] for d in written] == [0, 1, 2]
+    assert database["runs"].batches == [3]
+
+
+def test_partial_batch_is_written_after_interval():
+    async def scenario():
+        wb, database = _buffer(interval=0.05)
+        await wb.start()
+        await wb.put("runs", {"_id": 1})
+        await wb.put("events", {"_id": 2})
+        await asyncio.sleep(0.2)
+        written = (len(database["runs"].docs), len(database["events"].docs))
+        await wb.close()
+        return written
+
+    assert asyncio.run(scenario()) == (1, 1)
+
+
+def test_flush_writes_everything_queued_so_far():
+    async def scenario():
+        wb, database = _buffer()
+        await wb.start()
+        for i in range(5):
+            await wb.put("runs", {"_id": i})
+        await wb.flush()
+        written = len(database["runs"].docs)
+        pending = wb.stats()["buffered"]
+        await wb.close()
+        return written, pending
+
+    assert asyncio.run(scenario()) == (5, 0)
+
+
+def test_flush_with_nothing_pending_returns_at_once():
+    async def scenario():
+        wb, _ = _buffer()
+        await wb.flush()  # not started
+        await wb.start()
+        await asyncio.wait_for(wb.flush(), 0.1)
+        await wb.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_drains_buffer_and_later_puts_go_direct():
+    async def scenario():
+        wb, database = _buffer()
+        await wb.start()
+        for i in range(7):
+            await wb.put("runs", {"_id": i})
+        await wb.close()
+        drained = len(database["runs"].docs)
+        await wb.put("runs", {"_id": 7})
+        return wb, drained, database
+
+    wb, drained, database = asyncio.run(scenario())
+    assert drained == 7
+    assert len(database["runs"].docs) == 8
+    assert wb.counters["written"] == 7
+    assert wb.counters["direct"] == 1
+    assert not wb.stats()["running"]
+
+
+def test_put_drops_when_buffer_is_full():
+    async def scenario():
+        wb, database = _buffer(max_items=1)
+        await wb.start()
+        # The flusher cannot run between these two puts, so the second finds the queue full
+        first = await wb.put("runs", {"_id": 1})
+        second = await wb.put("runs", {"_id": 2})
+        await wb.close()
+        return wb, first, second, database
+
+    wb, first, second, database = asyncio.run(scenario())
+    assert (first, second) == (True, False)
+    assert wb.counters["dropped"] == 1
+    assert [d["_id"] for d in database["runs"].docs] == [1]